@@ -1,16 +1,25 @@
 import streamlit as st
-from src.agent.langgraph_agent import ask, visualize_graph, get_graph_mermaid_png
+from src.agent.langgraph_agent import ask_stream, visualize_graph, get_graph_mermaid_png, warmup
+from src.models.conversation import Conversation
 from dotenv import load_dotenv
 load_dotenv()
 
 st.set_page_config(page_title="Product Chatbot", page_icon="🤖")
 
+# Build the LLM clients, vector store and graphs once per server process, not on the first question
+@st.cache_resource(show_spinner="Loading the product index...")
+def warm_agent():
+    return warmup()
+
+warm_agent()
+
 st.title("🛒 KingArthurMix Product Chatbot")
 st.write("Ask me anything about products, prices, or recipes!")
 
 # Session state to store chat history and thinking state
 if "messages" not in st.session_state:
-    st.session_state["messages"] = []
+    # Bounded history that tracks the last product context as messages are added
+    st.session_state["messages"] = Conversation()
 if "thinking" not in st.session_state:
     st.session_state["thinking"] = False
 if "example_prompt" not in st.session_state:
@@ -58,7 +67,7 @@ with st.sidebar:
         unsafe_allow_html=True
     )
     if st.button("🧹 Clear Chat History", key="clear_sidebar", disabled=sidebar_disabled()):
-        st.session_state["messages"] = []
+        st.session_state["messages"] = Conversation()
         st.session_state["example_prompt"] = None
         st.rerun()
     # Overlay to block sidebar interaction when thinking
@@ -96,15 +105,25 @@ if prompt and not st.session_state["thinking"]:
         st.markdown(prompt)
     print(f"User: {prompt}")  # Print user message to console
 
-    # Get answer from backend with full chat history
+    # Stream the answer from the backend with full chat history
     with st.chat_message("assistant"):
+        placeholder = st.empty()
+        partial_answer = ""
+        answer = ""
         with st.spinner("Thinking..."):
-            # Pass the current chat history to the backend
-            answer, updated_history = ask(prompt, st.session_state["messages"])
-            st.markdown(answer)
-            print(f"AI: {answer}")  # Print AI message to console
-            # Update the session state with the new history from backend
-            st.session_state["messages"] = updated_history
+            # Pass the current chat history to the backend and render tokens as they arrive
+            for event in ask_stream(prompt, st.session_state["messages"]):
+                if event["type"] == "token":
+                    partial_answer += event["content"]
+                    placeholder.markdown(partial_answer + "▌")
+                elif event["type"] == "reset":
+                    partial_answer = ""
+                elif event["type"] == "final":
+                    answer = event["content"]
+                    # Update the session state with the new history from backend
+                    st.session_state["messages"] = event["chat_history"]
+        placeholder.markdown(answer)
+        print(f"AI: {answer}")  # Print AI message to console
     st.session_state["thinking"] = False
     st.rerun()
 
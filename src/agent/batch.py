@@ -0,0 +1,39 @@
+import json
+import time
+import argparse
+
+
+def read_queries(path):
+    """Questions from a .jsonl file (a "query" field per line) or a text file (one per line)."""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            queries.append(json.loads(line)["query"] if path.endswith(".jsonl") else line)
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions with ask_batch(), e.g. for evaluation or cache warming.")
+    parser.add_argument("queries", help=".jsonl with a \"query\" field per line, or a text file with one question per line")
+    parser.add_argument("--output", help="Write one {query, answer, error} JSON object per line to this file")
+    parser.add_argument("--concurrency", type=int, default=None, help="Graphs run at once (default BATCH_CONCURRENCY)")
+    args = parser.parse_args()
+
+    from src.agent.langgraph_agent import ask_batch
+    queries = read_queries(args.queries)
+    start = time.perf_counter()
+    results = ask_batch(queries, args.concurrency)
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for result in results if result["error"])
+    print(f"{len(results)} questions in {elapsed:.1f}s ({len(results) / elapsed:.2f}/s), {errors} failed")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
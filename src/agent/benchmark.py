@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+
+from src.agent.batch import read_queries
+from src.config import Config
+
+# Offline benchmark of ask(): the LLM and embeddings are the deterministic stand-ins in
+# src/utils/offline_models.py, and the catalog is products.json copied scale times, so runs
+# measure the graph, SQL and retrieval paths only and can be compared across commits.
+
+PRODUCTS_PATH = os.path.join(Config.PROJECT_ROOT, "src", "db", "products.json")
+SCRIPT_PATH = os.path.join(Config.PROJECT_ROOT, "src", "tools", "data", "benchmark_script.jsonl")
+CORPUS_PATH = os.path.join(Config.PROJECT_ROOT, "src", "tools", "data", "router_eval_queries.jsonl")
+
+# The example questions of the app's sidebar
+EXAMPLE_QUESTIONS = [
+    "What is the cheapest cookie product?",
+    "How many Pizza Crust Mix left?",
+    "Show me gluten-free products.",
+    "What is the highest rated gluten-free product?",
+    "How much does the Lemon Bar Mix cost?",
+]
+
+# Caches are off so that every repeat runs the full path. Prompt examples are selected in the
+# configured mode, with the hashing embeddings standing in for the embedding model.
+BENCHMARK_ENV = {
+    "ANSWER_CACHE_ENABLED": "0",
+    "SQL_TEMPLATE_CACHE_ENABLED": "0",
+    "SQL_CACHE_SIZE": "0",
+    "TELEMETRY_ENABLED": "1",
+    "LOG_LEVEL": "WARNING",
+}
+
+TURN_FIELDS = ("llm_calls", "prompt_tokens", "completion_tokens", "sql_queries", "sql_seconds", "faiss_searches", "faiss_seconds")
+
+
+def synthetic_product(product: Dict[str, Any], copy: int) -> Dict[str, Any]:
+    """Copy number copy of a catalog product (copy 0 is the original): its own name, url, price and stock."""
+    if copy == 0:
+        return product
+    factor = 0.75 + (copy * 37 % 51) / 100
+    variant = dict(product, name=f"{product.get('name', '')} - Batch {copy}", url=f"{product.get('url', '')}?batch={copy}")
+    for field in ("price", "origin_price"):
+        if isinstance(product.get(field), (int, float)):
+            variant[field] = round(product[field] * factor, 2)
+    if isinstance(product.get("max_quantity"), int):
+        variant["max_quantity"] = (product["max_quantity"] + copy) % 25
+    return variant
+
+
+def write_catalog(path: str, scale: int, source: str = PRODUCTS_PATH):
+    """Writes products.json with every product of source repeated scale times, one product at a time."""
+    with open(source, encoding="utf-8") as f:
+        products = json.load(f)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for copy in range(scale):
+            for position, product in enumerate(products):
+                f.write(",\n" if copy or position else "")
+                f.write(json.dumps(synthetic_product(product, copy)))
+        f.write("\n]\n")
+
+
+def build_catalog(directory: str, scale: int, dim: int, batch_size: int, workers: int, rebuild: bool = False):
+    """products.db and faiss_mix for a scale, built by setup_db with hashing embeddings (reused unless rebuild)."""
+    if not rebuild and os.path.exists(os.path.join(directory, "products.db")) and os.path.exists(os.path.join(directory, "faiss_mix")):
+        return 0.0
+    from src.db import setup_db
+    from src.utils.offline_models import HashingEmbeddings
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    write_catalog(os.path.join(directory, setup_db.PRODUCTS_JSON), scale)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        conn = sqlite3.connect(setup_db.DB_FILE)
+        conn.execute('PRAGMA journal_mode=WAL')
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        columns = setup_db.stage_products(cursor, setup_db.PRODUCTS_JSON, batch_size)
+        setup_db.full_rebuild(conn, columns, HashingEmbeddings(dim), batch_size, workers)
+        conn.close()
+    finally:
+        os.chdir(cwd)
+    return time.perf_counter() - start
+
+
+def peak_rss_mb() -> float:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def run_questions(directory: str, question_sets: Dict[str, List[str]], dim: int, repeat: int, llm_latency: float,
+                  verbose: bool = False) -> Dict[str, Any]:
+    """Answers every question repeat times against one catalog. Runs in its own process so peak RSS is per catalog."""
+    if not verbose:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            return run_questions(directory, question_sets, dim, repeat, llm_latency, verbose=True)
+    os.environ.update(BENCHMARK_ENV)
+    os.environ["DB_PATH"] = os.path.join(directory, "products.db")
+    os.environ["VECTORSTORE_PATH"] = os.path.join(directory, "faiss_mix")
+    from src import nodes
+    from src.agent import langgraph_agent
+    from src.models.conversation import Conversation
+    from src.tools.query_processor import IntelligentQueryProcessor
+    from src.utils import telemetry
+    from src.utils.offline_models import HashingEmbeddings, ScriptedChatModel, load_script
+    from src.utils.prompt_registry import count_tokens
+
+    llm = ScriptedChatModel(script=load_script(SCRIPT_PATH), latency=llm_latency)
+    nodes.override("llm", llm)
+    nodes.override("embeddings", HashingEmbeddings(dim))
+    nodes.override("query_processor", IntelligentQueryProcessor(llm=llm))
+    start = time.perf_counter()
+    langgraph_agent.warmup()
+    count_tokens("")  # resolves the tokenizer before the first timed turn
+    warmup_seconds = time.perf_counter() - start
+
+    turns = []
+    for name, questions in question_sets.items():
+        for _ in range(repeat):
+            for query in questions:
+                start = time.perf_counter()
+                langgraph_agent.ask(query, Conversation())
+                seconds = time.perf_counter() - start
+                trace = telemetry.metrics.traces[-1]
+                turns.append(dict({"set": name, "query": query, "seconds": seconds, "route": trace["route"]},
+                                  **{field: trace[field] for field in TURN_FIELDS}))
+    return {"warmup_seconds": warmup_seconds, "peak_rss_mb": peak_rss_mb(), "turns": turns}
+
+
+def summarize(scale: int, turns: List[Dict[str, Any]], peak_rss: float) -> Dict[str, Any]:
+    seconds = [turn["seconds"] for turn in turns]
+    mean = lambda field: float(np.mean([turn[field] for turn in turns]))
+    return {
+        "scale": scale,
+        "set": turns[0]["set"],
+        "turns": len(turns),
+        "p50_ms": float(np.percentile(seconds, 50)) * 1000,
+        "p95_ms": float(np.percentile(seconds, 95)) * 1000,
+        "mean_ms": float(np.mean(seconds)) * 1000,
+        "llm_calls_per_turn": mean("llm_calls"),
+        "prompt_tokens_per_turn": mean("prompt_tokens"),
+        "sql_ms_per_turn": mean("sql_seconds") * 1000,
+        "faiss_ms_per_turn": mean("faiss_seconds") * 1000,
+        "peak_rss_mb": peak_rss,
+    }
+
+
+def regressions(summary: List[Dict], baseline: List[Dict], tolerance: float, min_ms: float) -> List[str]:
+    """Scale/set pairs whose p50 latency or prompt tokens per turn grew by more than tolerance (a fraction)."""
+    previous = {(row["scale"], row["set"]): row for row in baseline}
+    found = []
+    for row in summary:
+        before = previous.get((row["scale"], row["set"]))
+        if before is None:
+            continue
+        if row["p50_ms"] - before["p50_ms"] > max(before["p50_ms"] * tolerance, min_ms):
+            found.append(f"{row['scale']}x {row['set']} p50: {before['p50_ms']:.1f}ms -> {row['p50_ms']:.1f}ms")
+        if row["prompt_tokens_per_turn"] > before["prompt_tokens_per_turn"] * (1 + tolerance):
+            found.append(f"{row['scale']}x {row['set']} prompt tokens: {before['prompt_tokens_per_turn']:.0f} -> {row['prompt_tokens_per_turn']:.0f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ask() benchmark with a scripted LLM and hashing embeddings on synthetic catalogs.")
+    parser.add_argument("--scales", default="1,100", help="Comma-separated catalog sizes as multiples of products.json (e.g. 1,100,10000)")
+    parser.add_argument("--queries", default=CORPUS_PATH, help="Query corpus (.jsonl with a \"query\" field, or one question per line)")
+    parser.add_argument("--workdir", default=os.path.join(Config.PROJECT_ROOT, "benchmark_catalogs"), help="Where the synthetic catalogs are built and kept")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild catalogs that already exist in --workdir")
+    parser.add_argument("--dim", type=int, default=256, help="Hashing embedding dimension")
+    parser.add_argument("--repeat", type=int, default=3, help="Times each question is asked")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds added to every scripted LLM call, e.g. to model API round trips")
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Chunking processes while building catalogs")
+    parser.add_argument("--verbose", action="store_true", help="Show the agent's output while the questions run")
+    parser.add_argument("--output", help="Write the summary and every turn as JSON to this file")
+    parser.add_argument("--baseline", help="JSON written by an earlier --output run; exit with status 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed growth against the baseline, as a fraction")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="p50 slowdowns below this many milliseconds are ignored")
+    args = parser.parse_args()
+
+    question_sets = {"sidebar": EXAMPLE_QUESTIONS, "corpus": read_queries(args.queries)}
+    summary, turns = [], []
+    print(f"{'scale':>6} {'set':<8} {'turns':>5} {'p50 ms':>8} {'p95 ms':>8} {'LLM/turn':>9} {'prompt tok':>10} "
+          f"{'SQL ms':>7} {'FAISS ms':>8} {'RSS MB':>7}")
+    for scale in (int(s) for s in args.scales.split(",")):
+        directory = os.path.join(args.workdir, f"scale-{scale}")
+        build_seconds = build_catalog(directory, scale, args.dim, args.batch_size, args.workers, args.rebuild)
+        if build_seconds:
+            print(f"Built the {scale}x catalog in {build_seconds:.1f}s")
+        # A fresh process per catalog: no state carries over and peak RSS is this catalog's
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            result = pool.submit(run_questions, directory, question_sets, args.dim, args.repeat, args.llm_latency,
+                                 args.verbose).result()
+        for name in question_sets:
+            set_turns = [dict(turn, scale=scale) for turn in result["turns"] if turn["set"] == name]
+            row = dict(summarize(scale, set_turns, result["peak_rss_mb"]), warmup_seconds=result["warmup_seconds"])
+            summary.append(row)
+            turns.extend(set_turns)
+            print(f"{scale:>6} {name:<8} {row['turns']:>5} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['llm_calls_per_turn']:>9.2f} "
+                  f"{row['prompt_tokens_per_turn']:>10.0f} {row['sql_ms_per_turn']:>7.1f} {row['faiss_ms_per_turn']:>8.2f} {row['peak_rss_mb']:>7.0f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "turns": turns}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(summary, json.load(f)["summary"], args.tolerance, args.min_ms)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
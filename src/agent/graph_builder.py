@@ -1,21 +1,98 @@
-from langgraph.graph import StateGraph, END
+from src.config import Config
 from src.models.agent_state import AgentState
+from src.utils.telemetry import traced_node
 from src.nodes import (
     reasoning_node,
     reasoning_router,
+    parallel_reasoning_router,
+    plan_router,
+    planning_node,
+    aplanning_node,
     data_retrieval_node,
     knowledge_search_node,
     response_synthesis_node,
-    general_chat_node
+    general_chat_node,
+    areasoning_node,
+    adata_retrieval_node,
+    aknowledge_search_node,
+    aresponse_synthesis_node,
+    ageneral_chat_node
 )
 
-def build_graph():
+import inspect
+import os
+
+GRAPH_MODES = ("sequential", "parallel", "plan")
+
+# State keys each retrieval branch owns in the parallel mode
+STRUCTURED_BRANCH_KEYS = ("structured_results", "structured_complete", "last_node")
+SEMANTIC_BRANCH_KEYS = ("semantic_results", "semantic_complete", "last_node")
+
+def get_graph_mode():
+    return os.environ.get('GRAPH_MODE', Config.GRAPH_MODE)
+
+def branch_node(node, keys):
+    """
+    Wraps a node so that it only returns the state keys it owns. Concurrent branches that
+    returned the full state would write every key in the same step and conflict.
+    """
+    if inspect.iscoroutinefunction(node):
+        async def async_branch(state):
+            result = await node(state)
+            return {key: result[key] for key in keys if key in result}
+        async_branch.__name__ = node.__name__
+        return async_branch
+
+    def branch(state):
+        result = node(state)
+        return {key: result[key] for key in keys if key in result}
+    branch.__name__ = node.__name__
+    return branch
+
+def build_graph(use_async=False, mode=None):
+    """
+    Builds and compiles the agent graph. With use_async=True the nodes are the async
+    implementations, and the compiled graph must be run with ainvoke()/astream().
+
+    mode selects the topology (defaults to Config.GRAPH_MODE):
+      - "sequential": every retrieval and answer routes back through reasoning.
+      - "parallel": reasoning fans out to all needed retrievals at once; the branches run
+        concurrently and join at response_synthesis, which ends the turn.
+      - "plan": a planning node picks the retrievals and synthesis once, and the plan runs
+        without further reasoning calls (see src/utils/turn_budget.py for the budget).
+    """
+    mode = mode or get_graph_mode()
+    if mode not in GRAPH_MODES:
+        raise ValueError(f"Unknown graph mode: {mode}. Expected one of {GRAPH_MODES}")
+    # Imported here so that importing this module does not load langgraph
+    from langgraph.graph import StateGraph, END
     graph = StateGraph(AgentState)
-    graph.add_node("reasoning", reasoning_node)
-    graph.add_node("data_retrieval", data_retrieval_node)
-    graph.add_node("knowledge_search", knowledge_search_node)
-    graph.add_node("response_synthesis", response_synthesis_node)
-    graph.add_node("general_chat", general_chat_node)
+    if use_async:
+        nodes = {
+            "reasoning": areasoning_node,
+            "data_retrieval": adata_retrieval_node,
+            "knowledge_search": aknowledge_search_node,
+            "response_synthesis": aresponse_synthesis_node,
+            "general_chat": ageneral_chat_node,
+        }
+    else:
+        nodes = {
+            "reasoning": reasoning_node,
+            "data_retrieval": data_retrieval_node,
+            "knowledge_search": knowledge_search_node,
+            "response_synthesis": response_synthesis_node,
+            "general_chat": general_chat_node,
+        }
+    if mode == "plan":
+        nodes["planning"] = aplanning_node if use_async else planning_node
+    # Each node run becomes a span of the current turn's trace
+    nodes = {name: traced_node(name, node) for name, node in nodes.items()}
+    if mode == "parallel":
+        return build_parallel_graph(graph, nodes)
+    if mode == "plan":
+        return build_plan_graph(graph, nodes)
+    for name, node in nodes.items():
+        graph.add_node(name, node)
     graph.set_entry_point("reasoning")
     graph.add_conditional_edges(
         "reasoning",
@@ -33,4 +110,51 @@ def build_graph():
     graph.add_edge("response_synthesis", "reasoning")
     graph.add_edge("general_chat", "reasoning")
     
-    return graph.compile() 
\ No newline at end of file
+    return graph.compile()
+
+def build_parallel_graph(graph, nodes):
+    from langgraph.graph import END
+    graph.add_node("reasoning", nodes["reasoning"])
+    graph.add_node("data_retrieval", branch_node(nodes["data_retrieval"], STRUCTURED_BRANCH_KEYS))
+    graph.add_node("knowledge_search", branch_node(nodes["knowledge_search"], SEMANTIC_BRANCH_KEYS))
+    graph.add_node("response_synthesis", nodes["response_synthesis"])
+    graph.add_node("general_chat", nodes["general_chat"])
+    graph.set_entry_point("reasoning")
+    graph.add_conditional_edges(
+        "reasoning",
+        parallel_reasoning_router,
+        {
+            "data_retrieval": "data_retrieval",
+            "knowledge_search": "knowledge_search",
+            "response_synthesis": "response_synthesis",
+            "general_chat": "general_chat",
+            "end": END
+        }
+    )
+    # Both branches finish in the same step, so response_synthesis runs once after the join
+    graph.add_edge("data_retrieval", "response_synthesis")
+    graph.add_edge("knowledge_search", "response_synthesis")
+    graph.add_edge("response_synthesis", END)
+    graph.add_edge("general_chat", END)
+
+    return graph.compile()
+
+def build_plan_graph(graph, nodes):
+    from langgraph.graph import END
+    graph.add_node("planning", nodes["planning"])
+    graph.add_node("data_retrieval", branch_node(nodes["data_retrieval"], STRUCTURED_BRANCH_KEYS))
+    graph.add_node("knowledge_search", branch_node(nodes["knowledge_search"], SEMANTIC_BRANCH_KEYS))
+    graph.add_node("response_synthesis", nodes["response_synthesis"])
+    graph.add_node("general_chat", nodes["general_chat"])
+    graph.set_entry_point("planning")
+    graph.add_conditional_edges(
+        "planning",
+        plan_router,
+        ["data_retrieval", "knowledge_search", "response_synthesis", "general_chat"]
+    )
+    graph.add_edge("data_retrieval", "response_synthesis")
+    graph.add_edge("knowledge_search", "response_synthesis")
+    graph.add_edge("response_synthesis", END)
+    graph.add_edge("general_chat", END)
+
+    return graph.compile()
@@ -1,47 +1,124 @@
 from src.models.agent_state import AgentState
-from src.agent.graph_builder import build_graph
+from src.models.conversation import Conversation, is_product_message
+from src.agent.graph_builder import build_graph, get_graph_mode
+from src.config import Config
+from src import nodes
+from src.nodes.knowledge_search_node import SEARCH_K
+from src.tools.product_resolver import is_followup
+from src.utils.answer_cache import SemanticAnswerCache
+from src.utils.embedding_cache import normalize_text
+from src.utils.turn_budget import TurnBudget, active_budget
+from src.utils import telemetry
+import asyncio
 import json  
+import os
+import threading
+import time
 
-app = build_graph()
+logger = telemetry.get_logger("agent")
+
+# The compiled graphs and the answer cache are built on first use (see warmup())
+_apps = {}
+_answer_cache = None
+_lock = threading.Lock()
+
+def get_app(use_async=False):
+    """The compiled graph for the current GRAPH_MODE, built on first use."""
+    key = (use_async, get_graph_mode())
+    if key not in _apps:
+        with _lock:
+            if key not in _apps:
+                _apps[key] = build_graph(use_async=use_async)
+    return _apps[key]
+
+def get_answer_cache():
+    global _answer_cache
+    if _answer_cache is None:
+        with _lock:
+            if _answer_cache is None:
+                # Same data version as the SQL result cache and the retriever's generation check
+                _answer_cache = SemanticAnswerCache(nodes.get_embeddings().embed_query,
+                                                    data_version=nodes.get_query_processor().sql_service.data_version)
+    return _answer_cache
+
+def __getattr__(name):
+    # Module attributes kept from when these were built at import time
+    if name == "app":
+        return get_app()
+    if name == "async_app":
+        return get_app(use_async=True)
+    if name == "answer_cache":
+        return get_answer_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def warmup():
+    """
+    Builds every shared resource, both compiled graphs and the answer cache so the first
+    question does not pay for them. Returns the initialisation seconds per component.
+    """
+    timings = nodes.warmup()
+    for name, build in (("graph", get_app), ("async_graph", lambda: get_app(use_async=True)), ("answer_cache", get_answer_cache)):
+        start = time.perf_counter()
+        build()
+        timings[name] = time.perf_counter() - start
+    return timings
+
+def answer_cache_enabled():
+    return str(os.environ.get('ANSWER_CACHE_ENABLED', Config.ANSWER_CACHE_ENABLED)).lower() not in ("0", "false", "no")
+
+def is_possible_followup(query, last_product_query):
+    # Answers to follow-ups depend on the conversation, so they must never be served from or stored in the cache
+    return is_followup(query, last_product_query)
 
 def visualize_graph():  
-    ascii_diagram = app.get_graph().draw_ascii()  
-    mermaid_code = app.get_graph().draw_mermaid()  
+    graph = get_app().get_graph()
+    ascii_diagram = graph.draw_ascii()  
+    mermaid_code = graph.draw_mermaid()  
     return ascii_diagram, mermaid_code  
 
 def get_graph_mermaid_png():  
     try:  
-        return app.get_graph().draw_mermaid_png()  
+        return get_app().get_graph().draw_mermaid_png()  
     except Exception:  
         return None  
 
 def get_last_product_context(chat_history):
+    """Last product question and answer; O(1) for a Conversation, a backwards scan for a plain list."""
+    if isinstance(chat_history, Conversation):
+        return chat_history.last_product_context()
     last_query = ""
     last_answer = ""
     for i in range(len(chat_history) - 1, -1, -1):
         msg = chat_history[i]
-        if msg.get("role") == "assistant":
-            content = msg.get("content", "").lower()
-            msg_type = msg.get("type", "").lower()
-            is_product_response = (
-                msg_type == "product" or 
-                any(keyword in content for keyword in ["product", "price", "$", "cost", "expensive", "cheap", "item"])
-            )
-            if is_product_response:
-                last_answer = msg.get("content", "")
-                for j in range(i - 1, -1, -1):
-                    if chat_history[j].get("role") == "user":
-                        last_query = chat_history[j].get("content", "")
-                        break
-                break
-    print(f"Found last product context - Query: '{last_query}', Answer: '{last_answer[:50]}...'")
+        if msg.get("role") == "assistant" and is_product_message(msg):
+            last_answer = msg.get("content", "")
+            for j in range(i - 1, -1, -1):
+                if chat_history[j].get("role") == "user":
+                    last_query = chat_history[j].get("content", "")
+                    break
+            break
+    logger.debug("Found last product context - Query: '%s', Answer: '%s...'", last_query, last_answer[:50])
     return last_query, last_answer
 
-def ask(query: str, chat_history = None):
-    if chat_history is None:
-        chat_history = []
+def start_turn(query: str, chat_history):
+    """
+    Shared set-up for ask() and ask_stream(). Returns a dict holding either a cached answer
+    or the initial graph state, plus what finish_turn() needs to store the answer afterwards.
+    """
     last_product_query, last_product_answer = get_last_product_context(chat_history)
-    initial_state = {
+    turn = {"cached": None, "use_cache": False, "query_vector": None, "state": None, "budget": None}
+    turn["use_cache"] = answer_cache_enabled() and not is_possible_followup(query, last_product_query)
+    if turn["use_cache"]:
+        try:
+            turn["cached"], turn["query_vector"] = get_answer_cache().lookup(query)
+            telemetry.cache_lookup("answer", bool(turn["cached"]))
+        except Exception as e:
+            logger.warning("Answer cache lookup failed: %s", e)
+            turn["use_cache"] = False
+        if turn["cached"]:
+            logger.info("Answer cache hit for: '%s'", query)
+            return turn
+    turn["state"] = {
         "query": query,
         "query_type": "",
         "needs_structured_data": False,
@@ -49,7 +126,9 @@ def ask(query: str, chat_history = None):
         "structured_results": "",
         "semantic_results": "",
         "final_answer": "",
-        "chat_history": chat_history,
+        # Nodes only need the recent window; a Conversation keeps it bounded
+        "chat_history": chat_history.to_list() if isinstance(chat_history, Conversation) else chat_history,
+        "conversation_summary": chat_history.summary if isinstance(chat_history, Conversation) else "",
         "last_product_query": last_product_query,
         "last_product_answer": last_product_answer,
         "is_product_question": False,
@@ -59,8 +138,26 @@ def ask(query: str, chat_history = None):
         "structured_complete": False,
         "semantic_complete": False
     }
-    result = app.invoke(initial_state)
+    if get_graph_mode() == "plan":
+        turn["budget"] = TurnBudget()
+    return turn
+
+def run_config(turn):
+    # The budget and LLM telemetry are callbacks so that every LLM call made inside the graph is seen
+    callbacks = [turn["budget"]] if turn["budget"] else []
+    if telemetry.telemetry_enabled():
+        callbacks.append(telemetry.llm_telemetry)
+    return {"callbacks": callbacks} if callbacks else {}
+
+def finish_turn(query: str, chat_history, turn, result=None):
+    """Appends the exchange to chat_history, fills the answer cache and returns the final answer."""
     chat_history.append({"role": "user", "content": query})
+    if turn["budget"]:
+        logger.info("Turn budget used: %s", turn["budget"].summary())
+    if turn["cached"]:
+        answer, message_type = turn["cached"]
+        chat_history.append({"role": "assistant", "content": answer, "type": message_type})
+        return answer
     message_type = "product" if (result.get("is_product_question", False) or result.get("is_product_followup", False)) else "non-product"
     if result.get("is_non_product", False):
         message_type = "non-product"
@@ -69,4 +166,113 @@ def ask(query: str, chat_history = None):
         "content": result.get("final_answer", "Sorry, I couldn't process your question."),
         "type": message_type
     })
-    return result.get("final_answer", "Sorry, I couldn't process your question."), chat_history        
\ No newline at end of file
+    if turn["use_cache"] and result.get("final_answer") and not result.get("is_product_followup", False):
+        get_answer_cache().store(query, result["final_answer"], message_type, vector=turn["query_vector"])
+    return result.get("final_answer", "Sorry, I couldn't process your question.")
+
+def ask(query: str, chat_history = None):
+    """
+    chat_history: a Conversation (bounded, and updated in O(1) per message) or a plain list of
+    messages, which is scanned every turn and grows without limit; a new Conversation by default.
+    """
+    if chat_history is None:
+        chat_history = Conversation()
+    with telemetry.turn(query):
+        turn = start_turn(query, chat_history)
+        result = None
+        if turn["state"]:
+            with active_budget(turn["budget"]):
+                result = get_app().invoke(turn["state"], config=run_config(turn))
+        answer = finish_turn(query, chat_history, turn, result)
+    return answer, chat_history
+
+async def aask(query: str, chat_history = None):
+    """
+    Async variant of ask() for serving many conversations from one event loop. Nodes use the
+    async LLM/embedding clients, and SQL, FAISS and answer-cache work runs in worker threads.
+    """
+    if chat_history is None:
+        chat_history = Conversation()
+    with telemetry.turn(query):
+        turn = await asyncio.to_thread(start_turn, query, chat_history)
+        result = None
+        if turn["state"]:
+            with active_budget(turn["budget"]):
+                result = await get_app(use_async=True).ainvoke(turn["state"], config=run_config(turn))
+        answer = await asyncio.to_thread(finish_turn, query, chat_history, turn, result)
+    return answer, chat_history
+
+def ask_stream(query: str, chat_history = None):
+    """
+    Streaming variant of ask(). Yields event dicts as the answer is produced:
+      {"type": "token", "content": str}   - next piece of answer text
+      {"type": "reset"}                   - a newer answer draft started; discard the partial text so far
+      {"type": "final", "content": str, "chat_history": Conversation or list}  - the final answer and updated history
+    Only LLM calls tagged with Config.STREAM_ANSWER_TAG (synthesis, general chat and result
+    formatting) are streamed; routing and SQL generation calls are not.
+    """
+    if chat_history is None:
+        chat_history = Conversation()
+    with telemetry.turn(query):
+        turn = start_turn(query, chat_history)
+        result = None
+        if turn["state"]:
+            current_message_id = None
+            with active_budget(turn["budget"]):
+                for mode, payload in get_app().stream(turn["state"], config=run_config(turn), stream_mode=["messages", "values"]):
+                    if mode == "values":
+                        result = payload
+                        continue
+                    chunk, metadata = payload
+                    if Config.STREAM_ANSWER_TAG not in metadata.get("tags", []) or not chunk.content:
+                        continue
+                    if chunk.id != current_message_id:
+                        if current_message_id is not None:
+                            yield {"type": "reset"}
+                        current_message_id = chunk.id
+                    yield {"type": "token", "content": chunk.content}
+        answer = finish_turn(query, chat_history, turn, result)
+    yield {"type": "final", "content": answer, "chat_history": chat_history}
+
+async def aask_batch(queries, concurrency=None):
+    """
+    Answers many independent questions, each as a new conversation, e.g. for evaluation or
+    cache-warming jobs. Questions with the same normalised text run once. Before any graph
+    runs, the uncached questions are embedded in batched calls and their unfiltered vector
+    searches run as one FAISS matrix search; then at most `concurrency` graphs run at a time
+    (BATCH_CONCURRENCY by default). Returns one {"query", "answer", "error"} dict per question,
+    in order; a failing question sets its "error" and does not affect the others.
+    """
+    concurrency = int(os.environ.get('BATCH_CONCURRENCY', concurrency or Config.BATCH_CONCURRENCY))
+    unique = {}
+    for query in queries:
+        unique.setdefault(normalize_text(query), query)
+    embeddings = nodes.get_embeddings()
+    retriever = nodes.get_retriever()
+    if hasattr(embeddings, "aprefill"):
+        embedded = await embeddings.aprefill(list(unique.values()))
+        searched = await asyncio.to_thread(retriever.prefetch, list(unique.values()), SEARCH_K)
+        logger.info("Batch of %s questions (%s unique): %s embedded in batches, %s vector searches prefetched",
+                    len(queries), len(unique), embedded, searched)
+    else:
+        logger.info("EMBEDDING_CACHE_ENABLED is off: each question in the batch is embedded and searched on its own")
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(query):
+        async with semaphore:
+            try:
+                answer, _ = await aask(query)
+                return {"answer": answer, "error": None}
+            except Exception as e:
+                logger.warning("Batch question failed: %r: %s", query, e)
+                return {"answer": None, "error": f"{type(e).__name__}: {e}"}
+
+    try:
+        outcomes = dict(zip(unique, await asyncio.gather(*(run(query) for query in unique.values()))))
+    finally:
+        retriever.clear_prefetched()
+    return [dict(query=query, **outcomes[normalize_text(query)]) for query in queries]
+
+def ask_batch(queries, concurrency=None):
+    """Synchronous wrapper around aask_batch() (not for use inside a running event loop)."""
+    return asyncio.run(aask_batch(queries, concurrency))
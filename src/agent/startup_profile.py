@@ -0,0 +1,81 @@
+import sys
+import json
+import time
+import argparse
+import importlib
+from typing import Dict, List
+
+# Run as its own process (python -m src.agent.startup_profile) so every import below is cold.
+# Only the standard library is imported before the measurements start.
+
+# What importing the agent costs, then the heavy libraries it should only load on first use
+AGENT_MODULES = ("src.config", "src.nodes", "src.agent.graph_builder", "src.agent.langgraph_agent")
+DEFERRED_MODULES = ("langchain", "langchain_community", "langchain_openai", "faiss", "langgraph.graph")
+
+
+def time_import(name: str) -> float:
+    start = time.perf_counter()
+    importlib.import_module(name)
+    return time.perf_counter() - start
+
+
+def profile(warmup: bool = True) -> List[Dict]:
+    """Rows of {"phase", "component", "seconds"}: cold imports, then initialisation per component."""
+    rows = []
+    for name in AGENT_MODULES:
+        rows.append({"phase": "import", "component": name, "seconds": time_import(name)})
+    loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+    if loaded:
+        print(f"Loaded by importing the agent (should be deferred): {', '.join(loaded)}")
+    for name in DEFERRED_MODULES:
+        if name not in sys.modules:
+            rows.append({"phase": "import", "component": name, "seconds": time_import(name)})
+    if warmup:
+        from src.agent.langgraph_agent import warmup as warmup_agent
+        for name, seconds in warmup_agent().items():
+            rows.append({"phase": "init", "component": name, "seconds": seconds})
+    return rows
+
+
+def regressions(rows: List[Dict], baseline: List[Dict], tolerance: float, min_seconds: float) -> List[str]:
+    """Components slower than the baseline by more than tolerance (a fraction) and min_seconds."""
+    previous = {(row["phase"], row["component"]): row["seconds"] for row in baseline}
+    found = []
+    for row in rows:
+        before = previous.get((row["phase"], row["component"]))
+        if before is not None and row["seconds"] - before > max(before * tolerance, min_seconds):
+            found.append(f"{row['phase']} {row['component']}: {before:.3f}s -> {row['seconds']:.3f}s")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import and initialisation time per component of the agent stack.")
+    parser.add_argument("--no-warmup", action="store_true", help="Only time imports (no clients, vector store or graphs are built)")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON written by an earlier --output run; exit with status 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline, as a fraction")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="Slowdowns below this many seconds are ignored")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = profile(warmup=not args.no_warmup)
+    total = time.perf_counter() - start
+
+    print(f"{'phase':<7} {'component':<28} {'seconds':>8}")
+    for row in rows:
+        print(f"{row['phase']:<7} {row['component']:<28} {row['seconds']:>8.3f}")
+    print(f"{'total':<7} {'':<28} {total:>8.3f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(rows, json.load(f), args.tolerance, args.min_seconds)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,13 +16,132 @@ class Config:
     # Embedding Model
     EMBEDDING_MODEL = "text-embedding-3-small"
 
-    # Vectorstore path (directory containing index.faiss and index.pkl)
+    # Vectorstore path (directory containing index.faiss and docstore.sqlite)
     VECTORSTORE_PATH = os.path.join(PROJECT_ROOT, "src", "db", "faiss_mix")
+    # Memory-map index.faiss so worker processes share one copy of the vectors in the page cache
+    VECTORSTORE_MMAP = True
+    # Vector stores saved before docstore.sqlite keep their chunks in a pickled index.pkl, which
+    # is only loaded when this is turned on explicitly: unpickling runs code from the file.
+    # Convert them once instead with: python -m src.db.chunk_store <dir>
+    VECTORSTORE_ALLOW_PICKLE = False
 
     # Prompt directory
     PROMPTS_DIR = os.path.join(PROJECT_ROOT, "src", "prompts")
 
+    # FAISS index type for the vector store: "flat" (exact), "hnsw" or "ivfpq" (approximate, for
+    # large catalogs). Build parameters apply when setup_db.py builds the index; search parameters
+    # are applied when the index is loaded (its type is detected from the file).
+    # Measure recall/latency/memory with: python -m src.db.faiss_benchmark
+    FAISS_INDEX_TYPE = "flat"
+    FAISS_HNSW_M = 32                 # graph neighbours per node
+    FAISS_HNSW_EF_CONSTRUCTION = 80
+    FAISS_HNSW_EF_SEARCH = 64         # search breadth; higher = better recall, slower
+    FAISS_IVF_NLIST = 0               # coarse clusters; 0 = 4 * sqrt(number of vectors)
+    FAISS_IVF_NPROBE = 16             # clusters visited per search
+    FAISS_PQ_M = 64                   # PQ sub-quantizers; must divide the embedding dimension
+    FAISS_PQ_NBITS = 8
+
+    # Semantic search: "hybrid" (BM25 over products_fts fused with vector search by reciprocal
+    # rank), "vector" (FAISS only) or "lexical" (BM25 only, no embedding calls). In hybrid mode a
+    # query whose terms all match in at most LEXICAL_CONFIDENT_MAX_HITS products is answered
+    # from the full-text index alone.
+    SEARCH_MODE = "hybrid"
+    RRF_K = 60
+    LEXICAL_CONFIDENT_MAX_HITS = 3
+    # Restrict semantic search to chunks whose diet/category/type/baking category and price match
+    # the terms and price range in the query (bitsets built when the vector store loads)
+    METADATA_FILTER_ENABLED = True
+
     # Dotenv path (absolute path to .env in project root)
     DOTENV_PATH = os.path.join(PROJECT_ROOT, ".env")
 
+    # Semantic answer cache in front of ask()
+    ANSWER_CACHE_ENABLED = True
+    ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95  # cosine similarity needed to reuse a cached answer
+    ANSWER_CACHE_MAX_ENTRIES = 512
+    ANSWER_CACHE_TTL_SECONDS = 3600
+
+    # Query embedding cache: in-process LRU in front of a memory-mapped store on disk shared by
+    # all worker processes (one directory per embedding model)
+    EMBEDDING_CACHE_ENABLED = True
+    EMBEDDING_CACHE_SIZE = 1024
+    EMBEDDING_CACHE_DIR = os.path.join(PROJECT_ROOT, "src", "db", "embedding_cache")
+
+    # Conversation (chat history passed to ask()/ask_stream()): messages kept per session (0 keeps
+    # all) and, optionally, a summary of the questions of dropped turns for the reasoning prompt
+    CONVERSATION_MAX_MESSAGES = 40
+    CONVERSATION_SUMMARY_ENABLED = False
+    CONVERSATION_SUMMARY_MAX_CHARS = 600
+
+    # ask_batch(): graphs run at most this many at a time
+    BATCH_CONCURRENCY = 8
+
+    # Graph topology: "sequential" (retrievals loop back through reasoning),
+    # "parallel" (needed retrievals run as concurrent branches that join before synthesis) or
+    # "plan" (one planning pass, then a budgeted execution of the plan)
+    GRAPH_MODE = "sequential"
+
+    # Upper bound on reasoning passes per turn in the sequential mode
+    MAX_REASONING_ITERATIONS = 4
+
+    # Per-turn budget in the "plan" mode: planning runs once, the plan executes without further
+    # reasoning, and steps that would exceed the budget degrade to LLM-free fallbacks
+    TURN_MAX_LLM_CALLS = 4
+    TURN_MAX_SECONDS = 30
+
+    # Local fast-path intent classifier for the first reasoning step of a turn
+    # (tune the threshold with: python -m src.tools.intent_classifier --eval <queries.jsonl>)
+    FAST_INTENT_ENABLED = True
+    FAST_INTENT_THRESHOLD = 0.8
+
+    # Entries in SQLService's result cache (0 disables it)
+    SQL_CACHE_SIZE = 256
+
+    # Pooled read-only SQLite connections, shared by all threads (at most SQLITE_POOL_SIZE open)
+    SQLITE_POOL_SIZE = 8
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # bytes of the database file to memory-map
+    SQLITE_CACHE_SIZE_KB = 64 * 1024      # page cache per connection
+    SQLITE_STATEMENT_CACHE = 256          # prepared statements kept per connection
+
+    # Parameterised NL->SQL templates reused instead of calling the LLM for queries of the same shape
+    SQL_TEMPLATE_CACHE_ENABLED = True
+    SQL_TEMPLATE_CACHE_PATH = os.path.join(PROJECT_ROOT, "src", "db", "sql_template_cache.json")
+    SQL_TEMPLATE_CACHE_MAX_ENTRIES = 2000
+
+    # Product-name resolver: candidate names sent to the SQL prompt, and the fuzzy score needed
+    # to resolve a follow-up's "it"/"this" from the previous question
+    PRODUCT_RESOLVER_TOP_K = 15
+    PRODUCT_RESOLVER_MIN_SCORE = 0.5
+
+    # Few-shot rules/examples for the SQL and formatting prompts: only the k entries of
+    # src/prompts/examples/<prompt>.jsonl most similar to the query are included
+    # ("embedding" uses on-disk cached example embeddings, "lexical" uses word overlap only;
+    # compare prompt sizes with: python -m src.utils.example_selector)
+    PROMPT_EXAMPLES_MODE = "embedding"
+    PROMPT_EXAMPLES_DIR = os.path.join(PROJECT_ROOT, "src", "prompts", "examples")
+    PROMPT_EXAMPLES_CACHE_DIR = os.path.join(PROJECT_ROOT, "src", "prompts", "examples", ".embeddings")
+    SQL_PROMPT_EXAMPLES_K = 4
+    FORMAT_PROMPT_EXAMPLES_K = 3
+
+    # Deterministic formatting of simple SQL results without the LLM. Rules are tried in order:
+    # "count", "single_value", "single_price", "stock_list" (up to FAST_FORMAT_MAX_LIST_ROWS rows).
+    # Compare against the LLM formatter with: python -m src.tools.format_golden
+    FAST_FORMAT_RULES = ["count", "single_value", "single_price", "stock_list"]
+    FAST_FORMAT_MAX_LIST_ROWS = 5
+
+    # Tag on LLM calls whose tokens are user-facing answer text and are streamed by ask_stream()
+    STREAM_ANSWER_TAG = "stream_answer"
+
+    # Telemetry: per-turn traces (node latencies, route, LLM calls and tokens, SQL/FAISS time,
+    # cache hits) and aggregated histograms, exported with src.utils.telemetry.export_json() /
+    # export_prometheus(). The optional paths receive each turn's trace as a JSON line and the
+    # Prometheus text-format metrics, rewritten after each turn
+    TELEMETRY_ENABLED = True
+    TELEMETRY_MAX_TRACES = 200
+    TELEMETRY_TRACE_PATH = None
+    TELEMETRY_METRICS_PATH = None
+
+    # Level of the "agent" loggers (DEBUG shows full SQL results and formatted responses)
+    LOG_LEVEL = "INFO"
+
     # Add more config as needed 
\ No newline at end of file
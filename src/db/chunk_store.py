@@ -0,0 +1,163 @@
+import os
+import json
+import sqlite3
+import argparse
+import threading
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+from src.config import Config
+
+DOCSTORE_FILE = "docstore.sqlite"
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Chunk texts and metadata of a vector store, one row per FAISS id in a SQLite file next to
+    index.faiss. Readers open it read-only and memory-mapped and fetch only the rows of the hits,
+    so worker processes share the OS page cache instead of each unpickling every chunk. Documents
+    are keyed by str(FAISS id), which makes index_to_docstore_id a view of the same rows.
+
+    Published generations are never modified; setup_db.py writes a new file (writable=True),
+    starting from a copy of the previous generation's for --incremental.
+    """
+
+    def __init__(self, path: str, writable: bool = False):
+        self.path = path
+        self.writable = writable
+        self._local = threading.local()
+        self._write_conn = None
+        if writable:
+            self._write_conn = sqlite3.connect(path, check_same_thread=False)
+            self._write_conn.execute("CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT NOT NULL)")
+        elif not os.path.exists(path):
+            raise FileNotFoundError(f"No docstore at {path}")
+        self.index_to_docstore_id = ChunkIdMapping(self)
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._write_conn is not None:
+            return self._write_conn
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # immutable: the file never changes once published, so SQLite skips locking entirely
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size = {int(os.environ.get('SQLITE_MMAP_SIZE', Config.SQLITE_MMAP_SIZE))}")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _document(page_content: str, metadata: str) -> Document:
+        return Document(page_content=page_content, metadata=json.loads(metadata))
+
+    def search(self, search: str) -> Union[str, Document]:
+        row = None
+        if str(search).isdigit():
+            row = self._conn().execute("SELECT page_content, metadata FROM chunks WHERE id = ?", (int(search),)).fetchone()
+        return self._document(*row) if row else f"ID {search} not found."
+
+    def documents(self, ids: List[int]) -> Dict[int, Document]:
+        """Documents by FAISS id in one query; ids that are not stored are left out."""
+        ids = [int(id_) for id_ in ids]
+        rows = self._conn().execute(
+            f"SELECT id, page_content, metadata FROM chunks WHERE id IN ({', '.join(['?'] * len(ids))})", ids).fetchall() if ids else []
+        return {id_: self._document(page_content, metadata) for id_, page_content, metadata in rows}
+
+    def metadatas(self) -> Iterator[Tuple[int, dict]]:
+        """(FAISS id, metadata) of every chunk, in id order."""
+        for id_, metadata in self._conn().execute("SELECT id, metadata FROM chunks ORDER BY id"):
+            yield id_, json.loads(metadata)
+
+    def has(self, id_: int) -> bool:
+        return self._conn().execute("SELECT 1 FROM chunks WHERE id = ?", (int(id_),)).fetchone() is not None
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        if not self.writable:
+            raise ValueError(f"{self.path} is a published docstore and is opened read-only")
+        try:
+            self._write_conn.executemany(
+                "INSERT INTO chunks (id, page_content, metadata) VALUES (?, ?, ?)",
+                [(int(id_), doc.page_content, json.dumps(doc.metadata)) for id_, doc in texts.items()])
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"Tried to add ids that already exist: {e}")
+
+    def delete(self, ids: List) -> None:
+        if not self.writable:
+            raise ValueError(f"{self.path} is a published docstore and is opened read-only")
+        self._write_conn.executemany("DELETE FROM chunks WHERE id = ?", [(int(id_),) for id_ in ids])
+
+    def commit(self):
+        if self._write_conn is not None:
+            self._write_conn.commit()
+
+    def copy_to(self, path: str) -> "SQLiteDocstore":
+        """A writable copy of this docstore at path."""
+        if os.path.exists(path):
+            os.remove(path)
+        target = sqlite3.connect(path)
+        self._conn().backup(target)
+        target.close()
+        return SQLiteDocstore(path, writable=True)
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    @classmethod
+    def write(cls, path: str, documents: Iterable[Tuple[int, Document]], batch_size: int = 1000) -> "SQLiteDocstore":
+        """Writes (FAISS id, document) pairs to a new docstore file at path."""
+        docstore = cls(path, writable=True)
+        batch = {}
+        for id_, doc in documents:
+            batch[str(id_)] = doc
+            if len(batch) >= batch_size:
+                docstore.add(batch)
+                batch = {}
+        docstore.add(batch)
+        docstore.commit()
+        return docstore
+
+
+class ChunkIdMapping(MutableMapping):
+    """
+    The vector store's index_to_docstore_id over a SQLiteDocstore: FAISS id -> str(FAISS id) for
+    every stored chunk. Entries are added by adding documents; deleting one deletes its chunk.
+    """
+
+    def __init__(self, docstore: SQLiteDocstore):
+        self.docstore = docstore
+
+    def __getitem__(self, key) -> str:
+        if not self.docstore.has(key):
+            raise KeyError(key)
+        return str(int(key))
+
+    def __setitem__(self, key, value):
+        if str(value) != str(int(key)):
+            raise ValueError(f"Chunks in {self.docstore.path} are keyed by their FAISS id, got {key} -> {value}")
+        if not self.docstore.has(key):
+            raise KeyError(f"Add the document for FAISS id {key} to the docstore first")
+
+    def __delitem__(self, key):
+        if not self.docstore.has(key):
+            raise KeyError(key)
+        self.docstore.delete([key])
+
+    def __iter__(self) -> Iterator[int]:
+        return (row[0] for row in self.docstore._conn().execute("SELECT id FROM chunks ORDER BY id").fetchall())
+
+    def __len__(self) -> int:
+        return len(self.docstore)
+
+
+def main():
+    from src.db.faiss_index import convert_vectorstore
+    parser = argparse.ArgumentParser(description="Convert a vector store saved with index.pkl to index.faiss + docstore.sqlite (no pickle).")
+    parser.add_argument("path", nargs="?", default=Config.VECTORSTORE_PATH, help="Vector store directory")
+    args = parser.parse_args()
+    convert_vectorstore(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import json
+import time
+import argparse
+from typing import Any, Dict, List
+
+import faiss
+import numpy as np
+
+from src.db.faiss_index import INDEX_TYPES, build_index
+
+
+def synthetic_embeddings(count: int, dim: int, clusters: int, seed: int = 0, batch: int = 100_000) -> np.ndarray:
+    """Unit-norm vectors drawn around random cluster centres, roughly how product chunk embeddings group by product family."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = np.empty((count, dim), dtype=np.float32)
+    for start in range(0, count, batch):
+        end = min(start + batch, count)
+        labels = rng.integers(0, clusters, end - start)
+        chunk = centres[labels] + 0.6 * rng.standard_normal((end - start, dim)).astype(np.float32)
+        vectors[start:end] = chunk / np.linalg.norm(chunk, axis=1, keepdims=True)
+    return vectors
+
+
+def benchmark(count: int, dim: int, index_types: List[str], k: int = 5, queries: int = 500, seed: int = 0) -> List[Dict[str, Any]]:
+    clusters = max(8, int(np.sqrt(count)))
+    vectors = synthetic_embeddings(count, dim, clusters, seed)
+    query_vectors = synthetic_embeddings(queries, dim, clusters, seed)  # same centres, fresh samples
+    _, exact = faiss.knn(query_vectors, vectors, k)
+    rows = []
+    for index_type in index_types:
+        started = time.perf_counter()
+        index = build_index(vectors, index_type)
+        build_seconds = time.perf_counter() - started
+        latencies, found = [], []
+        for query in query_vectors:
+            started = time.perf_counter()
+            _, ids = index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            found.append(ids[0])
+        recall = np.mean([len(set(ids) & set(truth)) / k for ids, truth in zip(found, exact)])
+        rows.append({
+            "vectors": count,
+            "dim": dim,
+            "index": index_type,
+            f"recall@{k}": round(float(recall), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            "memory_mb": round(len(faiss.serialize_index(index)) / 2 ** 20, 1),
+            "build_s": round(build_seconds, 2),
+        })
+        del index
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k against exact search, p50/p99 single-query latency and index memory per FAISS index type.")
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated catalog sizes in chunks (e.g. 10000,100000,1000000)")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension (text-embedding-3-small is 1536)")
+    parser.add_argument("--index-types", default=",".join(INDEX_TYPES))
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    header = f"{'vectors':>9} {'index':<6} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p99 ms':>8} {'memory MB':>10} {'build s':>8}"
+    print(header)
+    for size in (int(s) for s in args.sizes.split(",")):
+        for row in benchmark(size, args.dim, args.index_types.split(","), k=args.k, queries=args.queries):
+            results.append(row)
+            print(f"{row['vectors']:>9} {row['index']:<6} {row[f'recall@{args.k}']:>9.3f} {row['p50_ms']:>8.3f} "
+                  f"{row['p99_ms']:>8.3f} {row['memory_mb']:>10.1f} {row['build_s']:>8.2f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import os
+import math
+import pickle
+from typing import Any, Dict, List
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from src.config import Config
+from src.db.chunk_store import DOCSTORE_FILE, SQLiteDocstore
+from src.utils.telemetry import get_logger
+
+logger = get_logger("faiss_index")
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+INDEX_FILE = "index.faiss"
+
+
+def index_params() -> Dict[str, Any]:
+    """Build and search parameters for the configured index type."""
+    return {
+        "index_type": os.environ.get('FAISS_INDEX_TYPE', Config.FAISS_INDEX_TYPE).lower(),
+        "hnsw_m": int(os.environ.get('FAISS_HNSW_M', Config.FAISS_HNSW_M)),
+        "hnsw_ef_construction": int(os.environ.get('FAISS_HNSW_EF_CONSTRUCTION', Config.FAISS_HNSW_EF_CONSTRUCTION)),
+        "hnsw_ef_search": int(os.environ.get('FAISS_HNSW_EF_SEARCH', Config.FAISS_HNSW_EF_SEARCH)),
+        "ivf_nlist": int(os.environ.get('FAISS_IVF_NLIST', Config.FAISS_IVF_NLIST)),
+        "ivf_nprobe": int(os.environ.get('FAISS_IVF_NPROBE', Config.FAISS_IVF_NPROBE)),
+        "pq_m": int(os.environ.get('FAISS_PQ_M', Config.FAISS_PQ_M)),
+        "pq_nbits": int(os.environ.get('FAISS_PQ_NBITS', Config.FAISS_PQ_NBITS)),
+    }
+
+
+def build_index(vectors: np.ndarray, index_type: str = None, ids: np.ndarray = None, **overrides) -> faiss.Index:
+    """
+    Builds (and trains, for IVF-PQ) an L2 index over vectors. IVF-PQ needs enough vectors to
+    train its coarse and PQ codebooks; with fewer it falls back to a flat index. With ids, the
+    index is wrapped in an IndexIDMap2 so vectors can later be removed and added by id.
+    """
+    params = dict(index_params(), **overrides)
+    index_type = (index_type or params["index_type"]).lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type {index_type!r}; expected one of {', '.join(INDEX_TYPES)}")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+
+    if index_type == "ivfpq":
+        # Training wants ~39 points per coarse centroid and at least 2^nbits points for the PQ codebooks
+        nlist = params["ivf_nlist"] or int(4 * math.sqrt(count))
+        nlist = min(nlist, count // 39)
+        pq_m = params["pq_m"]
+        if nlist < 1 or count < (1 << params["pq_nbits"]) or dim % pq_m:
+            logger.warning("Not enough vectors (%s) or pq_m=%s does not divide dim=%s: building a flat index instead of IVF-PQ", count, pq_m, dim)
+            index_type = "flat"
+        else:
+            index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, pq_m, params["pq_nbits"])
+            index.train(vectors)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"])
+        index.hnsw.efConstruction = params["hnsw_ef_construction"]
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    else:
+        index.add(vectors)
+    configure_search(index, **overrides)
+    return index
+
+
+def unwrap_index(index: faiss.Index) -> faiss.Index:
+    """The concrete index, looking through an IndexIDMap/IndexIDMap2 wrapper."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def describe_index(index: faiss.Index) -> str:
+    """"flat", "hnsw" or "ivfpq" for an index loaded from disk."""
+    index = unwrap_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexFlat):
+        return "flat"
+    return type(index).__name__
+
+
+def configure_search(index: faiss.Index, **overrides) -> str:
+    """Applies the configured search-time parameters for the index's type and returns the type."""
+    params = dict(index_params(), **overrides)
+    index_type = describe_index(index)
+    concrete = unwrap_index(index)
+    if index_type == "hnsw":
+        concrete.hnsw.efSearch = params["hnsw_ef_search"]
+    elif index_type == "ivfpq":
+        concrete.nprobe = params["ivf_nprobe"]
+    return index_type
+
+
+def search_parameters(index: faiss.Index, bits: np.ndarray, **overrides) -> faiss.SearchParameters:
+    """
+    Search parameters restricting a search to the positions set in bits (a packed little-endian
+    bitmap), with the configured efSearch/nprobe. HNSW's efSearch grows as the bitmap gets
+    sparser, since the graph walk has to pass more excluded nodes to collect k allowed ones.
+    """
+    params = dict(index_params(), **overrides)
+    selector = faiss.IDSelectorBitmap(len(bits), faiss.swig_ptr(bits))
+    index_type = describe_index(index)
+    if index_type == "hnsw":
+        allowed = max(1, int(np.unpackbits(bits, bitorder="little").sum()))
+        ef_search = min(1024, max(params["hnsw_ef_search"], params["hnsw_ef_search"] * index.ntotal // allowed))
+        search_params = faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+    elif index_type == "ivfpq":
+        search_params = faiss.SearchParametersIVF(sel=selector, nprobe=params["ivf_nprobe"])
+    else:
+        search_params = faiss.SearchParameters(sel=selector)
+    search_params.keep_alive = (selector, bits)  # the SWIG objects only hold raw pointers
+    return search_params
+
+
+class StreamingIndexBuilder:
+    """
+    Builds an id-keyed index (see build_index) from batches of vectors, so a large catalog never
+    has to be embedded in one piece. IVF-PQ buffers the first train_size vectors to train its
+    codebooks on, then adds the rest as they arrive; set expected_count (the eventual number of
+    vectors, if known) before then so nlist is sized for the whole catalog.
+    """
+
+    def __init__(self, index_type: str = None, train_size: int = 100_000, **overrides):
+        self.overrides = overrides
+        self.index_type = (index_type or index_params()["index_type"]).lower()
+        self.train_size = train_size
+        self.expected_count = None
+        self.index = None
+        self._vectors: List[np.ndarray] = []
+        self._ids: List[np.ndarray] = []
+        self._buffered = 0
+
+    def add(self, vectors: np.ndarray, ids: List[int]):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.index is not None:
+            self.index.add_with_ids(vectors, ids)
+            return
+        self._vectors.append(vectors)
+        self._ids.append(ids)
+        self._buffered += len(ids)
+        if self.index_type != "ivfpq" or self._buffered >= self.train_size:
+            self._build()
+
+    def _build(self):
+        overrides = dict(self.overrides)
+        if self.index_type == "ivfpq" and not index_params()["ivf_nlist"] and "ivf_nlist" not in overrides:
+            overrides["ivf_nlist"] = int(4 * math.sqrt(max(self.expected_count or 0, self._buffered)))
+        self.index = build_index(np.vstack(self._vectors), self.index_type, ids=np.concatenate(self._ids), **overrides)
+        self._vectors, self._ids = [], []
+
+    def finish(self) -> faiss.Index:
+        if self.index is None:
+            if not self._buffered:
+                raise ValueError("No vectors were added to the index")
+            self._build()
+        return self.index
+
+
+def embed_texts(texts: List[str], embeddings, batch_size: int = 512) -> np.ndarray:
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(texts[start:start + batch_size]))
+    return np.array(vectors, dtype=np.float32)
+
+
+def build_vectorstore(texts: List[str], embeddings, metadatas: List[dict] = None, index_type: str = None, batch_size: int = 512,
+                      vector_ids: List[int] = None) -> FAISS:
+    """
+    Embeds texts and wraps an index of the configured type in a LangChain FAISS vector store.
+    vector_ids (one int per text) key the index by id instead of position, for update_vectorstore().
+    """
+    metadatas = metadatas or [{} for _ in texts]
+    index = build_index(embed_texts(texts, embeddings, batch_size), index_type, ids=vector_ids)
+    vector_ids = list(vector_ids) if vector_ids is not None else list(range(len(texts)))
+    # Keyed by str(FAISS id), the same as a SQLiteDocstore, so saving the store keeps every key
+    ids = [str(id_) for id_ in vector_ids]
+    docstore = InMemoryDocstore({id_: Document(page_content=text, metadata=metadata) for id_, text, metadata in zip(ids, texts, metadatas)})
+    logger.info("Built %s FAISS index over %s chunks", describe_index(index), len(texts))
+    return FAISS(embeddings, index, docstore, dict(zip(vector_ids, ids)))
+
+
+def update_vectorstore(vectorstore: FAISS, remove_ids: List[int], add_ids: List[int], add_vectors: np.ndarray,
+                       add_documents: List[Document]) -> FAISS:
+    """
+    Removes and adds vectors by id in a store built with vector_ids. Flat and IVF-PQ indexes are
+    updated in place; HNSW cannot delete, so its graph is rebuilt from the stored vectors.
+    """
+    # downcast_index returns a non-owning proxy: only assign vectorstore.index a freshly built index
+    index = faiss.downcast_index(vectorstore.index)
+    if not isinstance(index, faiss.IndexIDMap2):
+        raise ValueError("This FAISS index is keyed by position; rebuild it with vector ids before updating it incrementally")
+    remove_ids = [int(id_) for id_ in remove_ids]
+    if remove_ids:
+        vectorstore.docstore.delete([vectorstore.index_to_docstore_id.pop(id_) for id_ in remove_ids])
+    add_ids = np.asarray(add_ids, dtype=np.int64)
+    add_vectors = np.ascontiguousarray(add_vectors, dtype=np.float32).reshape(len(add_ids), index.d)
+    if describe_index(index) == "hnsw":
+        keep_ids = np.array(sorted(vectorstore.index_to_docstore_id), dtype=np.int64)
+        kept = np.vstack([index.reconstruct(int(id_)) for id_ in keep_ids]) if len(keep_ids) else np.empty((0, index.d), dtype=np.float32)
+        vectorstore.index = build_index(np.vstack([kept, add_vectors]), "hnsw", ids=np.concatenate([keep_ids, add_ids]))
+    else:
+        if remove_ids:
+            index.remove_ids(np.array(remove_ids, dtype=np.int64))
+        if len(add_ids):
+            index.add_with_ids(add_vectors, add_ids)
+    docstore_ids = [str(id_) for id_ in add_ids.tolist()]
+    vectorstore.docstore.add(dict(zip(docstore_ids, add_documents)))
+    vectorstore.index_to_docstore_id.update(zip(add_ids.tolist(), docstore_ids))
+    return vectorstore
+
+
+def generation_path(path: str, generation: int) -> str:
+    """Directory of one published generation of the vector store at path (see setup_db.py --incremental)."""
+    return f"{path.rstrip(os.sep)}-{generation}"
+
+
+def read_index(path: str, mmap: bool = True) -> faiss.Index:
+    """
+    Reads index.faiss from a vector store directory. With mmap the vectors (and HNSW graph) stay
+    in the file and are paged in on demand, shared by every process that maps the same file;
+    such an index is read-only.
+    """
+    flags = (getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY) if mmap else 0
+    return faiss.read_index(os.path.join(path, INDEX_FILE), flags)
+
+
+def write_docstore(path: str, docstore, index_to_docstore_id: Dict[int, str]):
+    """Writes the documents of any docstore to a new docstore.sqlite at path, keyed by FAISS id."""
+    if os.path.exists(path):
+        os.remove(path)
+    SQLiteDocstore.write(path, ((vector_id, docstore.search(docstore_id))
+                                for vector_id, docstore_id in sorted(index_to_docstore_id.items())))
+
+
+def save_vectorstore(vectorstore: FAISS, path: str):
+    """
+    Saves the store as index.faiss plus docstore.sqlite (nothing is pickled). A SQLiteDocstore
+    already at path is committed in place; any other docstore is written out row by row.
+    """
+    os.makedirs(path, exist_ok=True)
+    faiss.write_index(vectorstore.index, os.path.join(path, INDEX_FILE))
+    docstore_path = os.path.join(path, DOCSTORE_FILE)
+    docstore = vectorstore.docstore
+    if isinstance(docstore, SQLiteDocstore) and os.path.abspath(docstore.path) == os.path.abspath(docstore_path):
+        docstore.commit()
+        return
+    write_docstore(docstore_path, docstore, vectorstore.index_to_docstore_id)
+
+
+def read_vectorstore(path: str, embeddings=None, mmap: bool = True) -> FAISS:
+    """
+    The vector store saved in directory path. Stores saved by save_vectorstore() open in constant
+    time; older ones with index.pkl are unpickled, if VECTORSTORE_ALLOW_PICKLE permits it.
+    """
+    if os.path.exists(os.path.join(path, DOCSTORE_FILE)):
+        docstore = SQLiteDocstore(os.path.join(path, DOCSTORE_FILE))
+        return FAISS(embeddings, read_index(path, mmap), docstore, docstore.index_to_docstore_id)
+    if str(os.environ.get('VECTORSTORE_ALLOW_PICKLE', Config.VECTORSTORE_ALLOW_PICKLE)).lower() in ("0", "false", "no"):
+        raise RuntimeError(f"{path} has no {DOCSTORE_FILE} and VECTORSTORE_ALLOW_PICKLE is off: convert it with "
+                           f"python -m src.db.chunk_store {path}, rebuild it with setup_db.py, or set "
+                           f"VECTORSTORE_ALLOW_PICKLE=1 to unpickle its index.pkl (only for stores you built yourself)")
+    logger.warning("Loading pickled docstore from %s; convert it with: python -m src.db.chunk_store %s", path, path)
+    return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+
+
+def convert_vectorstore(path: str):
+    """Rewrites a vector store saved with index.pkl as index.faiss + docstore.sqlite and removes index.pkl."""
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    write_docstore(os.path.join(path, DOCSTORE_FILE), docstore, index_to_docstore_id)
+    os.remove(os.path.join(path, "index.pkl"))
+    logger.info("Converted %s: %s chunks moved to %s", path, len(index_to_docstore_id), DOCSTORE_FILE)
+
+
+def load_vectorstore(path: str = None, embeddings=None, generation: int = None, mmap: bool = None) -> FAISS:
+    """
+    Loads a saved vector store (or one published generation of it), detects its index type and
+    applies that type's search parameters. The index is memory-mapped unless VECTORSTORE_MMAP is off.
+    """
+    path = os.environ.get('VECTORSTORE_PATH', path or Config.VECTORSTORE_PATH)
+    if generation is not None:
+        path = generation_path(path, generation)
+    if mmap is None:
+        mmap = str(os.environ.get('VECTORSTORE_MMAP', Config.VECTORSTORE_MMAP)).lower() not in ("0", "false", "no")
+    vectorstore = read_vectorstore(path, embeddings, mmap)
+    index_type = configure_search(vectorstore.index)
+    logger.info("Loaded %s FAISS index with %s vectors from %s", index_type, vectorstore.index.ntotal, path)
+    return vectorstore
@@ -1,24 +1,29 @@
+import os
+import sys
 import json
+import shutil
 import sqlite3
+import hashlib
+import argparse
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
 from dotenv import load_dotenv
 
-load_dotenv()
-
-# Load and process JSON data
-with open("products.json", "r") as f:
-    raw_data = json.load(f)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.db.faiss_index import (StreamingIndexBuilder, describe_index, embed_texts, update_vectorstore, generation_path,
+                                read_vectorstore, save_vectorstore)
+from src.db.chunk_store import DOCSTORE_FILE, SQLiteDocstore
 
-# Find all unique keys in products.json
-all_keys = set()
-for product in raw_data:
-    all_keys.update(product.keys())
+load_dotenv()
 
-# List of columns for the products table
-columns = list(all_keys)
+PRODUCTS_JSON = "products.json"
+DB_FILE = "products.db"
+VECTORSTORE_DIR = "faiss_mix"
 
 # SQLite type mapping (default to TEXT, but use INTEGER/REAL for known fields)
 type_map = {
@@ -30,62 +35,51 @@ type_map = {
     # Add more if you want to force types
 }
 
+# Columns that get a B-tree index
+indexed_columns = ["name", "category", "type", "price", "origin_price", "review_rating", "diet",
+                   "baking_category", "url", "flag", "discount_multiple_buy"]
+
+_JSON_SEPARATORS = re.compile(r"[\s,]*")
+
 def get_sql_type(key):
     return type_map.get(key, "TEXT")
 
-# Create SQLite database with dynamic schema
-conn = sqlite3.connect('products.db')
-cursor = conn.cursor()
+def fts_columns(columns):
+    return [col for col in ("name", "description", "ingredients", "diet", "category") if col in columns]
 
-# Drop existing table
-cursor.execute('DROP TABLE IF EXISTS products')
+def product_key(product):
+    """Stable identity of a product across catalog updates."""
+    return product.get('url') or product.get('name', '')
 
-# Build CREATE TABLE statement dynamically
-col_defs = []
-for col in columns:
-    sql_type = get_sql_type(col)
-    col_defs.append(f'"{col}" {sql_type}')
-col_defs_str = ',\n    '.join(col_defs)
-create_table_sql = f'''
-CREATE TABLE products (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    {col_defs_str}
-)
-'''
-cursor.execute(create_table_sql)
-
-# Create indexes for better performance
-if "name" in columns:
-    cursor.execute('CREATE INDEX idx_products_name ON products(name)')
-if "category" in columns:
-    cursor.execute('CREATE INDEX idx_products_category ON products(category)')
-if "type" in columns:
-    cursor.execute('CREATE INDEX idx_products_type ON products(type)')
-if "price" in columns:
-    cursor.execute('CREATE INDEX idx_products_price ON products(price)')
-if "origin_price" in columns:
-    cursor.execute('CREATE INDEX idx_products_origin_price ON products(origin_price)')
-if "review_rating" in columns:
-    cursor.execute('CREATE INDEX idx_products_review_rating ON products(review_rating)')
-if "diet" in columns:
-    cursor.execute('CREATE INDEX idx_products_diet ON products(diet)')
-if "baking_category" in columns:
-    cursor.execute('CREATE INDEX idx_products_baking_category ON products(baking_category)')
-if "url" in columns:
-    cursor.execute('CREATE INDEX idx_products_url ON products(url)')
-if "flag" in columns:
-    cursor.execute('CREATE INDEX idx_products_flag ON products(flag)')
-if "discount_multiple_buy" in columns:
-    cursor.execute('CREATE INDEX idx_products_discount_multiple_buy ON products(discount_multiple_buy)')
-
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-
-all_texts = []
-all_metadatas = []
-
-for idx, product in enumerate(raw_data):
-    # Prepare values for insertion
+def content_hash(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def iter_products(path, read_size=1 << 20):
+    """Yields the objects of a top-level JSON array one at a time, reading the file in read_size pieces."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(read_size)
+        pos = _JSON_SEPARATORS.match(buffer).end()
+        if buffer[pos:pos + 1] != "[":
+            raise ValueError(f"{path} must contain a JSON array of products")
+        pos += 1
+        while True:
+            pos = _JSON_SEPARATORS.match(buffer, pos).end()
+            if buffer.startswith("]", pos):
+                return
+            try:
+                product, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The next object runs past the buffer: drop what was consumed and read more
+                more = f.read(read_size)
+                if not more:
+                    raise
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            yield product
+            pos = end
+
+def row_values(product, columns):
     values = []
     for col in columns:
         value = product.get(col, None)
@@ -96,7 +90,7 @@ for idx, product in enumerate(raw_data):
         if value == "":
             value = None
         # Try to coerce types for known fields
-        if col == "review_count" and value is not None:
+        if col in ("review_count", "max_quantity") and value is not None:
             try:
                 value = int(value)
             except Exception:
@@ -106,11 +100,6 @@ for idx, product in enumerate(raw_data):
                 value = float(value)
             except Exception:
                 value = None
-        if col == "max_quantity" and value is not None:
-            try:
-                value = int(value)
-            except Exception:
-                value = None
         # Handle price fields - convert string prices to float
         if col in ["origin_price", "price"] and value is not None:
             try:
@@ -121,14 +110,20 @@ for idx, product in enumerate(raw_data):
             except Exception:
                 value = None
         values.append(value)
+    return values
 
-    # Insert into products table
-    placeholders = ', '.join(['?'] * len(columns))
-    column_names = ', '.join([f'"{col}"' for col in columns])
-    insert_sql = f'INSERT INTO products ({column_names}) VALUES ({placeholders})'
-    cursor.execute(insert_sql, values)
-    product_id = cursor.lastrowid
+def related_names(product):
+    related_products = product.get('related_products', [])
+    if isinstance(related_products, str):
+        try:
+            related_products = json.loads(related_products)
+        except Exception:
+            related_products = []
+    return [name for name in related_products if name] if isinstance(related_products, list) else []
 
+def product_chunks(product, product_id, products_by_name, text_splitter):
+    """(text, metadata) for every vector store chunk of a product, including its related-product chunks."""
+    chunks = []
     # Create comprehensive text for vector store
     # Use a selection of fields for the text chunk
     comprehensive_text = f"""
@@ -145,10 +140,8 @@ for idx, product in enumerate(raw_data):
     Review Count: {product.get('review_count', '')}
     URL: {product.get('url', '')}
     """
-    chunks = text_splitter.split_text(comprehensive_text)
-    for chunk in chunks:
-        all_texts.append(chunk)
-        all_metadatas.append({
+    for chunk in text_splitter.split_text(comprehensive_text):
+        chunks.append((chunk, {
             "product_id": product_id,
             "name": product.get('name', ''),
             "category": product.get('category', ''),
@@ -160,23 +153,15 @@ for idx, product in enumerate(raw_data):
             "review_rating": product.get('review_rating', ''),
             "review_count": product.get('review_count', ''),
             "url": product.get('url', '')
-        })
+        }))
 
     # Add related products to vector store
-    related_products = product.get('related_products', [])
-    if isinstance(related_products, str):
-        try:
-            related_products = json.loads(related_products)
-        except Exception:
-            related_products = []
-    if isinstance(related_products, list):
-        for related_name in related_products:
-            if not related_name:
-                continue
-            # Try to find the related product in the dataset
-            related_info = next((p for p in raw_data if p.get('name', '') == related_name), None)
-            if related_info:
-                related_text = f"""
+    for related_name in related_names(product):
+        # Try to find the related product in the dataset
+        related_info = products_by_name.get(related_name)
+        if related_info:
+            # Keep this indentation: the whitespace is part of the embedded text and its chunk boundaries
+            related_text = f"""
                 Product: {product.get('name', '')}
                 Related Product: {related_name}
                 Related Product Details:
@@ -187,29 +172,394 @@ for idx, product in enumerate(raw_data):
                 Description: {related_info.get('description', '')}
                 URL: {related_info.get('url', '')}
                 """
-            else:
-                related_text = f"Product: {product.get('name', '')} is related to: {related_name}"
-            related_chunks = text_splitter.split_text(related_text)
-            for chunk in related_chunks:
-                all_texts.append(chunk)
-                all_metadatas.append({
-                    "product_id": product_id,
-                    "name": product.get('name', ''),
-                    "related_product": related_name,
-                    "relation_type": "related_product"
-                })
-
-conn.commit()
-conn.close()
-
-# Create enhanced vector store
-vectorstore = FAISS.from_texts(
-    texts=all_texts, 
-    embedding=embeddings, 
-    metadatas=all_metadatas
+        else:
+            related_text = f"Product: {product.get('name', '')} is related to: {related_name}"
+        for chunk in text_splitter.split_text(related_text):
+            chunks.append((chunk, {
+                "product_id": product_id,
+                "name": product.get('name', ''),
+                "related_product": related_name,
+                "relation_type": "related_product"
+            }))
+    return chunks
+
+_text_splitter = None
+
+def chunk_batch(batch):
+    """Process pool worker: chunks for each (product_id, product, related products by name) in batch."""
+    global _text_splitter
+    if _text_splitter is None:
+        _text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+    return [product_chunks(product, product_id, related, _text_splitter) for product_id, product, related in batch]
+
+def stage_products(cursor, path, batch_size):
+    """
+    Streams products.json into a temporary table, one JSON document per product, and returns the
+    union of product keys (the products table's columns). Later passes read products back from
+    this table in batches and look related products up by name through its index.
+    """
+    cursor.execute("DROP TABLE IF EXISTS temp.staging")
+    cursor.execute("CREATE TEMP TABLE staging (id INTEGER PRIMARY KEY, product_key TEXT, name TEXT, product_id INTEGER, data TEXT)")
+    keys, batch = set(), []
+    for product in iter_products(path):
+        keys.update(product.keys())
+        batch.append((product_key(product), product.get('name', ''), json.dumps(product)))
+        if len(batch) >= batch_size:
+            cursor.executemany("INSERT INTO staging (product_key, name, data) VALUES (?, ?, ?)", batch)
+            batch = []
+    cursor.executemany("INSERT INTO staging (product_key, name, data) VALUES (?, ?, ?)", batch)
+    cursor.execute("CREATE INDEX temp.idx_staging_name ON staging(name)")
+    cursor.execute("CREATE INDEX temp.idx_staging_product_key ON staging(product_key)")
+    return sorted(keys)
+
+def staged_batches(cursor, batch_size):
+    """(staging id, product_id, product, indexed content hash or None) rows, batch_size at a time."""
+    last_id = 0
+    while True:
+        rows = cursor.execute('''
+            SELECT s.id, s.product_id, s.data, ip.content_hash FROM staging s
+            LEFT JOIN index_products ip ON ip.product_key = s.product_key
+            WHERE s.id > ? ORDER BY s.id LIMIT ?''', (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        yield [(staging_id, product_id, json.loads(data), hash_) for staging_id, product_id, data, hash_ in rows]
+        last_id = rows[-1][0]
+
+def related_records(cursor, products):
+    """First staged product of each name the products relate to."""
+    names = sorted({name for product in products for name in related_names(product)})
+    records = {}
+    for start in range(0, len(names), 900):
+        part = names[start:start + 900]
+        for name, data in cursor.execute(f'''
+                SELECT name, data FROM staging WHERE id IN (
+                    SELECT MIN(id) FROM staging WHERE name IN ({', '.join(['?'] * len(part))}) GROUP BY name)''', part):
+            records[name] = json.loads(data)
+    return records
+
+def chunked_batches(cursor, batch_size, workers):
+    """
+    Yields (batch, chunks per product) over the staged products. Chunking runs in a process pool
+    with at most 2 * workers batches in flight, so memory stays bounded however large the catalog.
+    """
+    def payloads():
+        for batch in staged_batches(cursor, batch_size):
+            related = related_records(cursor, [product for _, _, product, _ in batch])
+            payload = [(product_id, product, {name: related[name] for name in related_names(product) if name in related})
+                       for _, product_id, product, _ in batch]
+            yield batch, payload
+    if workers <= 1:
+        for batch, payload in payloads():
+            yield batch, chunk_batch(payload)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch, payload in payloads():
+            pending.append((batch, pool.submit(chunk_batch, payload)))
+            if len(pending) >= 2 * workers:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+
+def create_tables(cursor, columns):
+    # Build CREATE TABLE statement dynamically
+    col_defs = []
+    for col in columns:
+        sql_type = get_sql_type(col)
+        col_defs.append(f'"{col}" {sql_type}')
+    col_defs_str = ',\n    '.join(col_defs)
+    cursor.execute(f'''
+CREATE TABLE products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    {col_defs_str}
 )
-vectorstore.save_local("faiss_mix")
+''')
+
+    # Full-text index (BM25) for exact-term searches such as ingredients or "gluten-free"
+    cursor.execute(f'''
+CREATE VIRTUAL TABLE products_fts USING fts5(
+    {', '.join(fts_columns(columns))},
+    content='products', content_rowid='id', tokenize='porter unicode61'
+)
+''')
+
+    # What is in the database and vector store, for --incremental: per product a hash of its
+    # products.json record and of its chunks, one row per chunk (its id is the chunk's FAISS id)
+    # and the published vector store generation
+    cursor.execute('CREATE TABLE index_products (product_key TEXT PRIMARY KEY, product_id INTEGER NOT NULL, row_hash TEXT NOT NULL, content_hash TEXT NOT NULL)')
+    cursor.execute('CREATE TABLE index_chunks (id INTEGER PRIMARY KEY AUTOINCREMENT, product_key TEXT NOT NULL, text_hash TEXT NOT NULL, docstore_id TEXT NOT NULL)')
+    cursor.execute('CREATE TABLE index_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+def create_indexes(cursor, columns):
+    # Created after the bulk load: one sorted build per index instead of a B-tree update per row
+    for col in indexed_columns:
+        if col in columns:
+            cursor.execute(f'CREATE INDEX idx_products_{col} ON products({col})')
+    cursor.execute('CREATE INDEX idx_index_chunks_product_key ON index_chunks(product_key)')
+
+def fts_rows(columns, rows):
+    """(rowid, *FTS column values) for (product_id, row values) pairs."""
+    positions = [columns.index(col) for col in fts_columns(columns)]
+    return [[product_id] + [values[i] for i in positions] for product_id, values in rows]
+
+def fts_write(cursor, columns, rows, delete=False):
+    """Adds (or, with delete, removes) products rows' text in the external-content FTS table."""
+    names = ', '.join(['rowid'] + fts_columns(columns))
+    placeholders = ', '.join(['?'] * (len(fts_columns(columns)) + 1))
+    if delete:
+        cursor.executemany(f"INSERT INTO products_fts(products_fts, {names}) VALUES ('delete', {placeholders})", fts_rows(columns, rows))
+    else:
+        cursor.executemany(f"INSERT INTO products_fts({names}) VALUES ({placeholders})", fts_rows(columns, rows))
+
+def next_id(cursor, table):
+    return cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+
+def generation_dir(generation):
+    """An empty directory for a new generation; its docstore.sqlite is written while the chunks stream in."""
+    target = generation_path(VECTORSTORE_DIR, generation)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.makedirs(target)
+    return target
+
+def publish(cursor, vectorstore, target, generation):
+    """
+    Saves the vector store into its generation directory and records the generation in the same
+    transaction as the row changes, so the app switches DB and index together once it commits.
+    """
+    save_vectorstore(vectorstore, target)
+    cursor.execute("INSERT OR REPLACE INTO index_meta (name, value) VALUES ('generation', ?)", (generation,))
+
+def point_current(target, generation):
+    """Atomically repoints faiss_mix (a symlink) at target and removes generations older than the previous one."""
+    if os.path.isdir(VECTORSTORE_DIR) and not os.path.islink(VECTORSTORE_DIR):
+        shutil.rmtree(VECTORSTORE_DIR)
+    tmp_link = f"{VECTORSTORE_DIR}.tmp"
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.basename(target), tmp_link)
+    os.replace(tmp_link, VECTORSTORE_DIR)
+    for name in os.listdir("."):
+        match = re.fullmatch(re.escape(VECTORSTORE_DIR) + r"-(\d+)", name)
+        if match and int(match.group(1)) < generation - 1:
+            shutil.rmtree(name)
+
+def current_generation(cursor):
+    if not cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'index_meta'").fetchone():
+        return None
+    row = cursor.execute("SELECT value FROM index_meta WHERE name = 'generation'").fetchone()
+    return row[0] if row else None
+
+def full_rebuild(conn, columns, embeddings, batch_size, workers):
+    cursor = conn.cursor()
+    generation = (current_generation(cursor) or 0) + 1
+
+    # Drop existing tables
+    for table in ('products_fts', 'products', 'index_products', 'index_chunks', 'index_meta'):
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+    create_tables(cursor, columns)
+
+    # Bulk insert into products table; product ids are the staging ids
+    placeholders = ', '.join(['?'] * (len(columns) + 1))
+    column_names = ', '.join(['id'] + [f'"{col}"' for col in columns])
+    for batch in staged_batches(cursor, batch_size):
+        cursor.executemany(f'INSERT INTO products ({column_names}) VALUES ({placeholders})',
+                           [[staging_id] + row_values(product, columns) for staging_id, _, product, _ in batch])
+    cursor.execute("UPDATE staging SET product_id = id")
+    product_count = cursor.execute("SELECT COUNT(*) FROM staging").fetchone()[0]
+    create_indexes(cursor, columns)
+    cursor.execute("INSERT INTO products_fts(products_fts) VALUES('rebuild')")
+
+    # Chunk in the process pool, then embed and add to the index in bounded batches; chunk texts
+    # go straight to the new generation's docstore.sqlite, keyed by chunk id
+    builder = StreamingIndexBuilder()
+    target = generation_dir(generation)
+    docstore = SQLiteDocstore(os.path.join(target, DOCSTORE_FILE), writable=True)
+    pending, chunk_id, products_done = [], 1, 0
+
+    def flush():
+        vectors = embed_texts([text for _, _, text, _ in pending], embeddings, batch_size)
+        builder.expected_count = int(product_count * chunk_id / max(products_done, 1))
+        builder.add(vectors, [id_ for id_, _, _, _ in pending])
+        docstore.add({str(id_): Document(page_content=text, metadata=metadata) for id_, _, text, metadata in pending})
+        cursor.executemany("INSERT INTO index_chunks (id, product_key, text_hash, docstore_id) VALUES (?, ?, ?, ?)",
+                           [(id_, key, content_hash(text), str(id_)) for id_, key, text, _ in pending])
+        pending.clear()
+
+    for batch, chunk_lists in chunked_batches(cursor, batch_size, workers):
+        state_rows = []
+        for (_, product_id, product, _), chunks in zip(batch, chunk_lists):
+            key = product_key(product)
+            state_rows.append((key, product_id, content_hash(product), content_hash(product, chunks)))
+            for text, metadata in chunks:
+                pending.append((chunk_id, key, text, metadata))
+                chunk_id += 1
+        cursor.executemany('INSERT OR REPLACE INTO index_products VALUES (?, ?, ?, ?)', state_rows)
+        products_done += len(batch)
+        if len(pending) >= batch_size:
+            flush()
+    if pending:
+        flush()
+
+    # Create enhanced vector store (index type from Config.FAISS_INDEX_TYPE), keyed by chunk id
+    index = builder.finish()
+    print(f"Built {describe_index(index)} FAISS index over {index.ntotal} chunks")
+    vectorstore = FAISS(embeddings, index, docstore, docstore.index_to_docstore_id)
+    publish(cursor, vectorstore, target, generation)
+    conn.commit()
+    point_current(target, generation)
+
+    print("Database and vector store created with columns matching products.json!")
+    print(f"Total products processed: {product_count}")
+    print("Price-related indexes created for price and origin_price fields")
+
+def incremental_update(conn, columns, embeddings, batch_size, workers):
+    """
+    Upserts only changed product rows, embeds only the new or changed chunks of products whose
+    content hash changed and removes or adds vectors by chunk id.
+    """
+    cursor = conn.cursor()
+    generation = current_generation(cursor)
+    # Loaded into memory (not mapped) since the index is modified; the chunks are edited in a
+    # copy of the current docstore that becomes the next generation's
+    vectorstore = read_vectorstore(generation_path(VECTORSTORE_DIR, generation), embeddings, mmap=False)
+    target = generation_dir(generation + 1)
+    vectorstore.docstore = vectorstore.docstore.copy_to(os.path.join(target, DOCSTORE_FILE))
+    vectorstore.index_to_docstore_id = vectorstore.docstore.index_to_docstore_id
+    column_names = ', '.join([f'"{col}"' for col in columns])
+    assignments = ', '.join([f'"{col}" = ?' for col in columns])
+
+    # Rows: update changed products in place, insert new ones with fresh ids
+    product_id, upserted = next_id(cursor, "products"), 0
+    last_id = 0
+    while True:
+        batch = cursor.execute('''
+            SELECT s.id, s.product_key, s.data, ip.product_id, ip.row_hash FROM staging s
+            LEFT JOIN index_products ip ON ip.product_key = s.product_key
+            WHERE s.id > ? ORDER BY s.id LIMIT ?''', (last_id, batch_size)).fetchall()
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        inserts, updates, ids, hashes = [], [], [], []
+        for staging_id, key, data, existing_id, row_hash in batch:
+            product = json.loads(data)
+            hash_ = content_hash(product)
+            if existing_id is None:
+                inserts.append((product_id, row_values(product, columns)))
+                ids.append((product_id, staging_id))
+                # An empty chunk hash makes the chunk pass below index the new product
+                hashes.append((key, product_id, hash_, ''))
+                product_id += 1
+                continue
+            ids.append((existing_id, staging_id))
+            if row_hash != hash_:
+                updates.append((existing_id, row_values(product, columns)))
+                cursor.execute('UPDATE index_products SET row_hash = ? WHERE product_key = ?', (hash_, key))
+        old_rows = []
+        for start in range(0, len(updates), 900):
+            part = [id_ for id_, _ in updates[start:start + 900]]
+            old_rows += [(row[0], list(row[1:])) for row in cursor.execute(
+                f'SELECT id, {column_names} FROM products WHERE id IN ({", ".join(["?"] * len(part))})', part)]
+        fts_write(cursor, columns, old_rows, delete=True)
+        cursor.executemany(f'UPDATE products SET {assignments} WHERE id = ?', [values + [id_] for id_, values in updates])
+        cursor.executemany(f'INSERT INTO products (id, {column_names}) VALUES ({", ".join(["?"] * (len(columns) + 1))})',
+                           [[id_] + values for id_, values in inserts])
+        fts_write(cursor, columns, updates + inserts)
+        cursor.executemany('INSERT OR REPLACE INTO index_products VALUES (?, ?, ?, ?)', hashes)
+        cursor.executemany("UPDATE staging SET product_id = ? WHERE id = ?", ids)
+        upserted += len(inserts) + len(updates)
+
+    # Products no longer in products.json
+    remove_ids = []
+    removed = cursor.execute('''
+        SELECT product_key, product_id FROM index_products
+        WHERE product_key NOT IN (SELECT product_key FROM staging)''').fetchall()
+    for key, removed_id in removed:
+        old_values = cursor.execute(f'SELECT {column_names} FROM products WHERE id = ?', (removed_id,)).fetchone()
+        if old_values:
+            fts_write(cursor, columns, [(removed_id, list(old_values))], delete=True)
+        cursor.execute('DELETE FROM products WHERE id = ?', (removed_id,))
+        cursor.execute('DELETE FROM index_products WHERE product_key = ?', (key,))
+        remove_ids.extend(row[0] for row in cursor.execute("SELECT id FROM index_chunks WHERE product_key = ?", (key,)).fetchall())
+
+    # Chunks: keep the vector of every unchanged chunk text, embed the rest
+    new_chunks, changed = [], 0
+    for batch, chunk_lists in chunked_batches(cursor, batch_size, workers):
+        for (_, product_id, product, indexed_hash), chunks in zip(batch, chunk_lists):
+            hash_ = content_hash(product, chunks)
+            if hash_ == indexed_hash:
+                continue
+            changed += 1
+            key = product_key(product)
+            cursor.execute('UPDATE index_products SET content_hash = ? WHERE product_key = ?', (hash_, key))
+            old_chunks = {}
+            for chunk_id, text_hash, docstore_id in cursor.execute("SELECT id, text_hash, docstore_id FROM index_chunks WHERE product_key = ?", (key,)).fetchall():
+                old_chunks.setdefault(text_hash, []).append((chunk_id, docstore_id))
+            for text, metadata in chunks:
+                reusable = old_chunks.get(content_hash(text))
+                if reusable:
+                    # Same text, so the same vector; only the metadata (e.g. price) is refreshed
+                    _, docstore_id = reusable.pop()
+                    vectorstore.docstore.delete([docstore_id])
+                    vectorstore.docstore.add({docstore_id: Document(page_content=text, metadata=metadata)})
+                else:
+                    new_chunks.append((key, text, metadata))
+            for leftovers in old_chunks.values():
+                remove_ids.extend(chunk_id for chunk_id, _ in leftovers)
+
+    if not upserted and not removed and not changed:
+        conn.rollback()
+        shutil.rmtree(target)
+        print("No product changes: index and database left as they are")
+        return
+
+    # Embed only the new or changed chunks, in batches
+    chunk_id = next_id(cursor, "index_chunks")
+    add_ids = list(range(chunk_id, chunk_id + len(new_chunks)))
+    vectors = embed_texts([text for _, text, _ in new_chunks], embeddings, batch_size)
+    update_vectorstore(vectorstore, remove_ids, add_ids, vectors,
+                       [Document(page_content=text, metadata=metadata) for _, text, metadata in new_chunks])
+    cursor.executemany("DELETE FROM index_chunks WHERE id = ?", [(id_,) for id_ in remove_ids])
+    cursor.executemany("INSERT INTO index_chunks (id, product_key, text_hash, docstore_id) VALUES (?, ?, ?, ?)",
+                       [(id_, key, content_hash(text), vectorstore.index_to_docstore_id[id_]) for id_, (key, text, _) in zip(add_ids, new_chunks)])
+
+    publish(cursor, vectorstore, target, generation + 1)
+    conn.commit()
+    point_current(target, generation + 1)
+    print(f"Incremental update: {upserted} product row(s) upserted, {len(removed)} removed, {changed} re-chunked, "
+          f"{len(new_chunks)} chunk(s) embedded, {len(remove_ids)} vector(s) removed; now generation {generation + 1}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build products.db and the FAISS vector store from products.json.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only upsert changed products and re-embed their new or changed chunks")
+    parser.add_argument("--batch-size", type=int, default=512, help="Products per insert/chunking batch and chunks per embedding request")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Chunking processes (1 = chunk in this process)")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(DB_FILE)
+    # WAL lets the app's read-only connections keep reading while the database is being updated
+    conn.execute('PRAGMA journal_mode=WAL')
+    cursor = conn.cursor()
+    # One transaction for the whole run: the app keeps reading the previous catalog until it commits
+    cursor.execute("BEGIN IMMEDIATE")
+    columns = stage_products(cursor, PRODUCTS_JSON, args.batch_size)
+    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+    existing_columns = sorted(row[1] for row in cursor.execute("PRAGMA table_info(products)") if row[1] != 'id')
+    state_columns = {row[1] for row in cursor.execute("PRAGMA table_info(index_products)")}
+    generation = current_generation(cursor)
+    # Generations saved before docstore.sqlite (pickled index.pkl, uuid docstore ids) are rebuilt once
+    has_docstore = generation is not None and os.path.exists(os.path.join(generation_path(VECTORSTORE_DIR, generation), DOCSTORE_FILE))
+    if args.incremental and has_docstore and existing_columns == columns and 'row_hash' in state_columns:
+        incremental_update(conn, columns, embeddings, args.batch_size, args.workers)
+    else:
+        if args.incremental:
+            print("No incremental index state, the vector store predates docstore.sqlite, or products.json columns changed: "
+                  "running a full rebuild")
+        full_rebuild(conn, columns, embeddings, args.batch_size, args.workers)
+    conn.close()
 
-print("Database and vector store created with columns matching products.json!")
-print(f"Total products processed: {len(raw_data)}")
-print("Price-related indexes created for price and origin_price fields")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,184 @@
 import sqlite3
 import os
-from typing import List, Tuple
+import re
+import threading
+import queue
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Sequence, Tuple
 from src.config import Config
+from src.utils import telemetry
+
+logger = telemetry.get_logger("sql_service")
+
+# Quoted string literals and identifiers, which must survive SQL normalisation unchanged
+_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+
+def normalize_sql(sql: str) -> str:
+    """Cache key for a statement: whitespace collapsed and case folded outside quoted literals, trailing ';' dropped."""
+    parts = _QUOTED.split(sql.strip().rstrip(";").strip())
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            normalized.append(part)
+        else:
+            normalized.append(re.sub(r"\s+", " ", part).lower())
+    return "".join(normalized).strip()
 
 class SQLService:
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, cache_size: int = None, pool_size: int = None):
         db_path = os.environ.get('DB_PATH', db_path or Config.DB_PATH)
         abs_db_path = os.path.abspath(db_path)
-        print(f"Using database at: {abs_db_path}")  # <-- This prints the absolute path
+        logger.info("Using database at: %s", abs_db_path)
         self.db_path = abs_db_path
+        # LRU cache of read results keyed on normalised SQL, dropped whenever the database file changes
+        self.cache_size = int(os.environ.get('SQL_CACHE_SIZE', cache_size if cache_size is not None else Config.SQL_CACHE_SIZE))
+        self._cache = OrderedDict()
+        self._cache_version = None
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+        self.cache_invalidations = 0
+        # Fixed pool of read-only connections shared by all threads and reused across statements, so
+        # the page cache and the prepared statement cache stay warm; at most pool_size are ever open
+        self.pool_size = int(os.environ.get('SQLITE_POOL_SIZE', pool_size or Config.SQLITE_POOL_SIZE))
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._pool_generation = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=int(os.environ.get('SQLITE_STATEMENT_CACHE', Config.SQLITE_STATEMENT_CACHE)),
+        )
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA mmap_size = {int(os.environ.get('SQLITE_MMAP_SIZE', Config.SQLITE_MMAP_SIZE))}")
+        # Negative cache_size is in KiB rather than pages
+        conn.execute(f"PRAGMA cache_size = -{int(os.environ.get('SQLITE_CACHE_SIZE_KB', Config.SQLITE_CACHE_SIZE_KB))}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks out a pooled read-only connection, waiting while all pool_size are in use. The
+        connection is reopened when the database file has been replaced (e.g. rebuilt by
+        setup_db.py), detected by its inode. Threads own nothing, so short-lived threads
+        (Streamlit script runs, LangGraph executor workers) leave no connections behind.
+        """
+        with self._slots:
+            inode = os.stat(self.db_path).st_ino
+            try:
+                conn, conn_inode, generation = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+            if conn is not None and (conn_inode != inode or generation != self._pool_generation):
+                conn.close()
+                conn = None
+            if conn is None:
+                conn, conn_inode, generation = self._connect(), inode, self._pool_generation
+            try:
+                yield conn
+            finally:
+                if generation == self._pool_generation:
+                    self._idle.put((conn, conn_inode, generation))
+                else:
+                    conn.close()
+
+    def open_connections(self) -> int:
+        """Idle pooled connections (checked-out ones are in use by a query)."""
+        return self._idle.qsize()
 
-    def execute_query(self, sql: str) -> Tuple[List[Tuple], List[str]]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def close(self):
+        """Closes every idle pooled connection; ones in use are closed when returned."""
+        self._pool_generation += 1
+        while True:
+            try:
+                conn, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
+    def data_version(self) -> Tuple:
+        """Changes whenever the database (or its WAL) is rewritten."""
+        version = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                st = os.stat(path)
+                version.append((st.st_mtime_ns, st.st_size, st.st_ino))
+            except OSError:
+                version.append(None)
+        return tuple(version)
+
+    def _cached(self, key):
+        with self._cache_lock:
+            version = self.data_version()
+            if version != self._cache_version:
+                if self._cache:
+                    self.cache_invalidations += 1
+                    self._cache.clear()
+                self._cache_version = version
+            entry = self._cache.get(key)
+            if entry is None:
+                self.cache_misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return entry
+
+    def _store(self, key, results, columns, version):
+        with self._cache_lock:
+            if version != self._cache_version:
+                return
+            self._cache[key] = (results, columns)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+                self.cache_evictions += 1
+
+    def execute_query(self, sql: str, params: Sequence = ()) -> Tuple[List[Tuple], List[str]]:
+        params = tuple(params or ())
+        key = (normalize_sql(sql), params)
+        cacheable = self.cache_size > 0 and key[0].startswith(("select", "with"))
+        if cacheable:
+            entry = self._cached(key)
+            telemetry.cache_lookup("sql_result", entry is not None)
+            if entry is not None:
+                results, columns = entry
+                return list(results), list(columns)
+            version = self._cache_version
         try:
-            cursor.execute(sql)
-            results = cursor.fetchall()
-            columns = [description[0] for description in cursor.description] if cursor.description else []
-            return results, columns
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    with telemetry.span("sql", key[0].split(" ", 1)[0]) as attrs:
+                        cursor.execute(sql, params)
+                        results = cursor.fetchall()
+                        attrs["rows"] = len(results)
+                    columns = [description[0] for description in cursor.description] if cursor.description else []
+                finally:
+                    cursor.close()
+            if cacheable:
+                self._store(key, results, columns, version)
+            return list(results), list(columns)
         except Exception as e:
-            print(f"SQL Error: {e}")
-            print(f"Query: {sql}")
+            logger.error("SQL Error: %s\nQuery: %s | Params: %s", e, sql, params)
             return [], []
-        finally:
-            conn.close() 
\ No newline at end of file
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def cache_stats(self) -> dict:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "entries": len(self._cache),
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+            "evictions": self.cache_evictions,
+            "invalidations": self.cache_invalidations,
+        }
@@ -1,19 +1,28 @@
-from typing import TypedDict, List, Dict
+from typing import Annotated, Any, TypedDict, List, Dict
+
+# Reducers for fields that concurrent branches of the parallel graph mode can write in the same step
+def keep_latest(current, update):
+    return update
+
+def keep_non_empty(current, update):
+    # A branch that did not produce results must not clobber results written by another branch
+    return update if update else current
 
 class AgentState(TypedDict):
     query: str
     query_type: str
     needs_structured_data: bool
     needs_semantic_search: bool
-    structured_results: str
-    semantic_results: str
+    structured_results: Annotated[str, keep_non_empty]
+    semantic_results: Annotated[str, keep_non_empty]
     final_answer: str
     chat_history: List[Dict[str, str]]
     last_product_query: str
     last_product_answer: str
+    conversation_summary: str  # Questions of turns dropped from a capped Conversation
     is_product_question: bool
     is_product_followup: bool
-    last_node: str  # Track the last executed node
+    last_node: Annotated[str, keep_latest]  # Track the last executed node
     structured_complete: bool  # Track if structured query is done
     semantic_complete: bool    # Track if semantic search is done
     is_non_product: bool # New field for non-product classification
@@ -22,4 +31,5 @@ class AgentState(TypedDict):
     data_sufficiency: str  # Assessment of whether we have enough data
     next_action: str  # Recommended next action
     reasoning_notes: str  # Notes from reasoning process
-    iteration_count: int  # Track how many times we've been through reasoning 
\ No newline at end of file
+    iteration_count: int  # Track how many times we've been through reasoning
+    plan: Dict[str, Any]  # Retrievals and synthesis chosen up front in the plan execution mode 
\ No newline at end of file
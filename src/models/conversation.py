@@ -0,0 +1,82 @@
+import os
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+from src.config import Config
+
+PRODUCT_KEYWORDS = ["product", "price", "$", "cost", "expensive", "cheap", "item"]
+
+
+def is_product_message(message: Dict[str, str]) -> bool:
+    """Whether an assistant message answered a product question (its type, or product words in it)."""
+    content = message.get("content", "").lower()
+    return message.get("type", "").lower() == "product" or any(keyword in content for keyword in PRODUCT_KEYWORDS)
+
+
+class Conversation:
+    """
+    Chat history of one session, used in place of a plain list of messages by ask()/ask_stream().
+    The last product question and answer (what follow-ups like "is it in stock?" refer to) are
+    updated as each message is appended, so a turn never rescans the history. Only the last
+    max_messages messages are kept (CONVERSATION_MAX_MESSAGES; 0 keeps all). With summaries on,
+    the questions of dropped turns are folded into a short summary that the reasoning prompt
+    sees, capped at CONVERSATION_SUMMARY_MAX_CHARS.
+    """
+
+    def __init__(self, max_messages: int = None, summarize: bool = None, summary_max_chars: int = None):
+        max_messages = int(os.environ.get('CONVERSATION_MAX_MESSAGES', max_messages if max_messages is not None else Config.CONVERSATION_MAX_MESSAGES))
+        self.messages = deque(maxlen=max_messages or None)
+        self.summarize = str(os.environ.get('CONVERSATION_SUMMARY_ENABLED', summarize if summarize is not None else Config.CONVERSATION_SUMMARY_ENABLED)).lower() in ("1", "true", "yes")
+        self.summary_max_chars = int(os.environ.get('CONVERSATION_SUMMARY_MAX_CHARS', summary_max_chars or Config.CONVERSATION_SUMMARY_MAX_CHARS))
+        self.summary = ""
+        self.last_product_query = ""
+        self.last_product_answer = ""
+        self._last_user_message = ""
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[Dict[str, str]], **kwargs) -> "Conversation":
+        conversation = cls(**kwargs)
+        for message in messages:
+            conversation.append(message)
+        return conversation
+
+    def append(self, message: Dict[str, str]):
+        if self.messages.maxlen is not None and len(self.messages) == self.messages.maxlen:
+            self._forget(self.messages[0])
+        self.messages.append(message)
+        if message.get("role") == "user":
+            self._last_user_message = message.get("content", "")
+        elif message.get("role") == "assistant" and is_product_message(message):
+            self.last_product_query = self._last_user_message
+            self.last_product_answer = message.get("content", "")
+
+    def _forget(self, message: Dict[str, str]):
+        if not self.summarize or message.get("role") != "user":
+            return
+        question = " ".join(message.get("content", "").split())
+        summary = f"{self.summary} | {question[:120]}" if self.summary else question[:120]
+        if len(summary) > self.summary_max_chars:
+            # Drop the oldest questions first
+            summary = summary[len(summary) - self.summary_max_chars:]
+            summary = summary.split(" | ", 1)[-1]
+        self.summary = summary
+
+    def last_product_context(self) -> Tuple[str, str]:
+        return self.last_product_query, self.last_product_answer
+
+    def clear(self):
+        self.messages.clear()
+        self.summary = ""
+        self.last_product_query = self.last_product_answer = self._last_user_message = ""
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __getitem__(self, position):
+        return self.messages[position]
+
+    def to_list(self) -> List[Dict[str, str]]:
+        return list(self.messages)
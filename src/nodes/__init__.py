@@ -1,43 +1,187 @@
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from src.config import Config
 load_dotenv(dotenv_path=Config.DOTENV_PATH)
 
-from src.models.agent_state import AgentState
-from src.tools.query_processor import IntelligentQueryProcessor
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.prompts import ChatPromptTemplate
-import json
-import re
+# Shared clients and indexes are built on first use rather than at import time, so importing
+# the nodes (or the graph) costs no API clients, index loads or SQL queries. warmup() builds
+# them up front, e.g. once per server worker before the first request.
 
-llm = ChatOpenAI(model=os.environ.get('LLM_MODEL', Config.LLM_MODEL), temperature=float(os.environ.get('LLM_TEMPERATURE', Config.LLM_TEMPERATURE)))
-embeddings = OpenAIEmbeddings(model=os.environ.get('EMBEDDING_MODEL', Config.EMBEDDING_MODEL))
-vectorstore = FAISS.load_local(os.environ.get('VECTORSTORE_PATH', Config.VECTORSTORE_PATH), embeddings, allow_dangerous_deserialization=True)
-query_processor = IntelligentQueryProcessor()
+def _build_llm():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model=os.environ.get('LLM_MODEL', Config.LLM_MODEL), temperature=float(os.environ.get('LLM_TEMPERATURE', Config.LLM_TEMPERATURE)))
+
+def _build_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+    from src.utils.embedding_cache import CachedEmbeddings
+    embeddings = OpenAIEmbeddings(model=os.environ.get('EMBEDDING_MODEL', Config.EMBEDDING_MODEL))
+    if str(os.environ.get('EMBEDDING_CACHE_ENABLED', Config.EMBEDDING_CACHE_ENABLED)).lower() not in ("0", "false", "no"):
+        embeddings = CachedEmbeddings(embeddings)
+    return embeddings
+
+def _build_vectorstore():
+    from src.db.faiss_index import load_vectorstore
+    return load_vectorstore(os.environ.get('VECTORSTORE_PATH', Config.VECTORSTORE_PATH), get_embeddings())
+
+def _build_query_processor():
+    from src.tools.query_processor import IntelligentQueryProcessor
+    return IntelligentQueryProcessor()
+
+def _build_intent_classifier():
+    from src.tools.intent_classifier import FastIntentClassifier
+    return FastIntentClassifier()
+
+def _build_retriever():
+    from src.tools.hybrid_retriever import HybridRetriever
+    return HybridRetriever(get_vectorstore(), get_query_processor().sql_service)
+
+def _build_prompt_registry():
+    from src.utils.prompt_registry import get_prompt_registry
+    return get_prompt_registry()
+
+# In dependency order, which is also the order warmup() builds them in
+RESOURCES = {
+    "prompt_registry": _build_prompt_registry,
+    "llm": _build_llm,
+    "embeddings": _build_embeddings,
+    "vectorstore": _build_vectorstore,
+    "query_processor": _build_query_processor,
+    "intent_classifier": _build_intent_classifier,
+    "retriever": _build_retriever,
+}
+
+_resources = {}
+_init_seconds = {}
+_lock = threading.RLock()
+# Seconds spent building nested dependencies, per resource being built, so each is timed on its own
+_dependency_seconds = []
+
+def get_resource(name):
+    """The shared instance of a resource in RESOURCES, built on first use (once, even with concurrent callers)."""
+    resource = _resources.get(name)
+    if resource is not None:
+        return resource
+    with _lock:
+        if name not in _resources:
+            if name not in RESOURCES:
+                raise KeyError(f"Unknown resource: {name}. Expected one of {list(RESOURCES)}")
+            start = time.perf_counter()
+            _dependency_seconds.append(0.0)
+            try:
+                resource = RESOURCES[name]()
+            finally:
+                elapsed = time.perf_counter() - start
+                dependencies = _dependency_seconds.pop()
+                if _dependency_seconds:
+                    _dependency_seconds[-1] += elapsed
+            _init_seconds[name] = elapsed - dependencies
+            _resources[name] = resource
+        return _resources[name]
+
+def get_llm():
+    return get_resource("llm")
+
+def get_embeddings():
+    return get_resource("embeddings")
+
+def get_vectorstore():
+    return get_resource("vectorstore")
+
+def get_query_processor():
+    return get_resource("query_processor")
+
+def get_intent_classifier():
+    return get_resource("intent_classifier")
+
+def get_retriever():
+    return get_resource("retriever")
+
+def get_prompt_registry():
+    return get_resource("prompt_registry")
+
+def warmup(names=None):
+    """
+    Builds the given resources (all of RESOURCES by default) and returns the seconds each one
+    took to initialise, including those built by earlier calls.
+    """
+    for name in names or RESOURCES:
+        get_resource(name)
+    return {name: _init_seconds[name] for name in RESOURCES if name in _init_seconds}
+
+def init_timings():
+    return dict(_init_seconds)
+
+def override(name, value):
+    """Replaces a resource with the given instance, e.g. a fake LLM in scripts and benchmarks."""
+    if name not in RESOURCES:
+        raise KeyError(f"Unknown resource: {name}. Expected one of {list(RESOURCES)}")
+    with _lock:
+        _resources[name] = value
+        _init_seconds.pop(name, None)
+
+def reset():
+    """Drops every built resource; the next use builds them again."""
+    with _lock:
+        _resources.clear()
+        _init_seconds.clear()
+
+def __getattr__(name):
+    # Keeps `from src.nodes import llm` and `nodes.retriever` working: the first access builds it
+    if name in RESOURCES:
+        return get_resource(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def load_prompt(filename):
-    import os
-    with open(os.path.join(os.path.dirname(__file__), '../prompts', filename), 'r', encoding='utf-8') as f:
-        return f.read()
+    return get_prompt_registry().get_text(filename)
+
+def get_template(filename):
+    """Compiled prompt template from the shared registry; parsed once and reloaded when the file changes."""
+    return get_prompt_registry().get(filename)
 
-from .reasoning_node import reasoning_node
-from .reasoning_router import reasoning_router
-from .data_retrieval_node import data_retrieval_node
-from .knowledge_search_node import knowledge_search_node
-from .response_synthesis_node import response_synthesis_node
-from .general_chat_node import general_chat_node
+from .reasoning_node import reasoning_node, areasoning_node
+from .reasoning_router import reasoning_router, parallel_reasoning_router
+from .data_retrieval_node import data_retrieval_node, adata_retrieval_node
+from .knowledge_search_node import knowledge_search_node, aknowledge_search_node
+from .response_synthesis_node import response_synthesis_node, aresponse_synthesis_node
+from .general_chat_node import general_chat_node, ageneral_chat_node
+from .planning_node import planning_node, aplanning_node, plan_router
 
 __all__ = [
     'reasoning_node',
     'reasoning_router',
+    'parallel_reasoning_router',
     'data_retrieval_node',
     'knowledge_search_node',
     'response_synthesis_node',
     'general_chat_node',
+    'areasoning_node',
+    'adata_retrieval_node',
+    'aknowledge_search_node',
+    'aresponse_synthesis_node',
+    'ageneral_chat_node',
+    'planning_node',
+    'aplanning_node',
+    'plan_router',
     'llm',
     'embeddings',
     'vectorstore',
     'query_processor',
+    'intent_classifier',
+    'retriever',
     'load_prompt',
-] 
\ No newline at end of file
+    'get_template',
+    'prompt_registry',
+    'get_llm',
+    'get_embeddings',
+    'get_vectorstore',
+    'get_query_processor',
+    'get_intent_classifier',
+    'get_retriever',
+    'get_prompt_registry',
+    'warmup',
+    'init_timings',
+    'override',
+    'reset',
+]
@@ -1,19 +1,46 @@
-from . import query_processor
+from . import get_query_processor
+from src.tools.product_resolver import is_followup
+from src.utils.turn_budget import llm_call_allowed
+from src.utils.telemetry import get_logger
+
+logger = get_logger("data_retrieval")
+
+def build_retrieval_request(state):
+    """Returns (query, context) for the query processor, folding follow-up references into the query."""
+    context = {}
+    query_to_use = state["query"]
+    if state.get("is_product_followup") and state.get("last_product_query"):
+        context = {
+            "last_product_query": state.get("last_product_query", ""),
+            "last_product_answer": state.get("last_product_answer", "")
+        }
+        referenced_product = get_query_processor().product_resolver.resolve_reference(
+            context["last_product_answer"], context["last_product_query"])
+        if referenced_product:
+            # prepare_query() names the product next to the question; no need to replay the old query
+            context["referenced_product"] = referenced_product
+        elif is_followup(query_to_use, state["last_product_query"]):
+            query_to_use = f"{state['last_product_query']} {query_to_use}"
+    return query_to_use, context
 
 def data_retrieval_node(state):
-    if state.get("needs_structured_data", False):
-        context = {}
-        query_to_use = state["query"]
-        if state.get("is_product_followup") and state.get("last_product_query"):
-            context = {
-                "last_product_query": state.get("last_product_query", ""),
-                "last_product_answer": state.get("last_product_answer", "")
-            }
-            reference_words = ["it", "this", "that", "them", "these", "those"]
-            if any(word in query_to_use.lower() for word in reference_words) or len(query_to_use.split()) <= 5:
-                query_to_use = f"{state['last_product_query']} {query_to_use}"
-        result = query_processor.process_query(query_to_use, context)
+    if state.get("needs_structured_data", False) and not llm_call_allowed():
+        logger.info("Turn budget exhausted: skipping structured retrieval")
+    elif state.get("needs_structured_data", False):
+        query_to_use, context = build_retrieval_request(state)
+        result = get_query_processor().process_query(query_to_use, context)
+        state["structured_results"] = result
+    state["structured_complete"] = True
+    state["last_node"] = "data_retrieval"
+    return state
+
+async def adata_retrieval_node(state):
+    if state.get("needs_structured_data", False) and not llm_call_allowed():
+        logger.info("Turn budget exhausted: skipping structured retrieval")
+    elif state.get("needs_structured_data", False):
+        query_to_use, context = build_retrieval_request(state)
+        result = await get_query_processor().aprocess_query(query_to_use, context)
         state["structured_results"] = result
     state["structured_complete"] = True
     state["last_node"] = "data_retrieval"
-    return state 
\ No newline at end of file
+    return state
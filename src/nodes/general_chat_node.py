@@ -1,10 +1,26 @@
-from . import llm, load_prompt
+from . import get_llm, get_template
+from src.config import Config
+from src.utils.turn_budget import llm_call_allowed
+
+FALLBACK_CHAT_ANSWER = "Hi! I'm the King Arthur Baking product assistant. Ask me about products, prices, ingredients or recipes."
+
+def build_chat_prompt(state):
+    return get_template("non_product.txt").format(query=state["query"])
 
 def general_chat_node(state):
-    prompt_template = load_prompt("non_product.txt")
-    from langchain.prompts import ChatPromptTemplate
-    prompt = ChatPromptTemplate.from_template(prompt_template)
-    answer = llm.invoke(prompt.format(query=state["query"])).content
+    if llm_call_allowed():
+        answer = get_llm().invoke(build_chat_prompt(state), config={"tags": [Config.STREAM_ANSWER_TAG]}).content
+    else:
+        answer = FALLBACK_CHAT_ANSWER
+    state["final_answer"] = answer
+    state["last_node"] = "general_chat"
+    return state
+
+async def ageneral_chat_node(state):
+    if llm_call_allowed():
+        answer = (await get_llm().ainvoke(build_chat_prompt(state), config={"tags": [Config.STREAM_ANSWER_TAG]})).content
+    else:
+        answer = FALLBACK_CHAT_ANSWER
     state["final_answer"] = answer
     state["last_node"] = "general_chat"
-    return state 
\ No newline at end of file
+    return state
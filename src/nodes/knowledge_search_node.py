@@ -1,18 +1,42 @@
-from . import vectorstore
+from . import get_retriever
+from src.tools.product_resolver import is_followup
+from src.utils.turn_budget import deadline_passed
+from src.utils.telemetry import get_logger
+
+logger = get_logger("knowledge_search")
+
+# Documents retrieved per semantic search (ask_batch() prefetches vector hits for the same k)
+SEARCH_K = 5
+
+def build_search_query(state):
+    search_query = state["query"]
+    if state.get("is_product_followup") and is_followup(search_query, state.get("last_product_query")):
+        search_query = f"{state['last_product_query']} {search_query}"
+    return search_query
+
+def format_search_context(docs):
+    return "\n---\n".join([
+        f"Product: {doc.metadata.get('title', 'Unknown')}\n{doc.page_content}"
+        for doc in docs
+    ])
 
 def knowledge_search_node(state):
-    if state.get("needs_semantic_search", False):
-        search_query = state["query"]
-        if state.get("is_product_followup") and state.get("last_product_query"):
-            reference_words = ["it", "this", "that", "them", "these", "those"]
-            if any(word in search_query.lower() for word in reference_words) or len(search_query.split()) <= 5:
-                search_query = f"{state['last_product_query']} {search_query}"
-        docs = vectorstore.similarity_search(search_query, k=5)
-        context = "\n---\n".join([
-            f"Product: {doc.metadata.get('title', 'Unknown')}\n{doc.page_content}"
-            for doc in docs
-        ])
-        state["semantic_results"] = context
+    if state.get("needs_semantic_search", False) and deadline_passed():
+        logger.info("Turn deadline passed: skipping semantic search")
+    elif state.get("needs_semantic_search", False):
+        docs = get_retriever().retrieve(build_search_query(state), k=SEARCH_K)
+        state["semantic_results"] = format_search_context(docs)
+    state["semantic_complete"] = True
+    state["last_node"] = "knowledge_search"
+    return state
+
+async def aknowledge_search_node(state):
+    if state.get("needs_semantic_search", False) and deadline_passed():
+        logger.info("Turn deadline passed: skipping semantic search")
+    elif state.get("needs_semantic_search", False):
+        # Embeds with the async client; SQLite and FAISS run in the default executor
+        docs = await get_retriever().aretrieve(build_search_query(state), k=SEARCH_K)
+        state["semantic_results"] = format_search_context(docs)
     state["semantic_complete"] = True
     state["last_node"] = "knowledge_search"
-    return state 
\ No newline at end of file
+    return state
@@ -0,0 +1,84 @@
+from . import get_llm
+from .reasoning_node import (
+    build_reasoning_prompt,
+    apply_reasoning_decision,
+    apply_reasoning_response,
+    fast_path_decision,
+)
+from src.utils.turn_budget import llm_call_allowed
+from src.utils.telemetry import get_logger
+
+logger = get_logger("planning")
+
+# Decision used when the budget does not even allow the planning call: vector search needs no LLM
+# call and its results can be returned without synthesis.
+FALLBACK_DECISION = {
+    "next_action": "gather_semantic",
+    "reasoning_notes": "plan: no LLM budget for planning, falling back to semantic search",
+    "needs_structured_data": False,
+    "needs_semantic_search": True,
+    "is_product_question": True,
+}
+
+def build_plan(state):
+    """Turns the first reasoning decision into the complete plan for the turn."""
+    if state.get("is_non_product") or state.get("next_action") == "general_chat":
+        return {"retrievals": [], "synthesis": "general_chat"}
+    retrievals = []
+    if state.get("needs_structured_data") or state.get("next_action") == "gather_structured":
+        retrievals.append("structured")
+    if state.get("needs_semantic_search") or state.get("next_action") == "gather_semantic":
+        retrievals.append("semantic")
+    if retrievals == ["structured"]:
+        synthesis = "passthrough"  # formatted SQL results are the answer
+    elif retrievals == ["semantic"]:
+        synthesis = "semantic_search.txt"
+    elif retrievals:
+        synthesis = "synthesize_answer.txt"
+    else:
+        synthesis = "none"
+    return {"retrievals": retrievals, "synthesis": synthesis}
+
+def finish_planning(state):
+    plan = build_plan(state)
+    state["plan"] = plan
+    state["needs_structured_data"] = "structured" in plan["retrievals"]
+    state["needs_semantic_search"] = "semantic" in plan["retrievals"]
+    state["reasoning_step"] = "plan"
+    state["last_node"] = "planning"
+    logger.info("Plan: retrievals=%s synthesis=%s", plan["retrievals"], plan["synthesis"])
+    return state
+
+def planning_node(state):
+    state["iteration_count"] = state.get("iteration_count", 0) + 1
+    decision = fast_path_decision(state)
+    if decision:
+        apply_reasoning_decision(state, decision)
+    elif llm_call_allowed():
+        apply_reasoning_response(state, get_llm().invoke(build_reasoning_prompt(state)).content)
+    else:
+        apply_reasoning_decision(state, FALLBACK_DECISION)
+    return finish_planning(state)
+
+async def aplanning_node(state):
+    state["iteration_count"] = state.get("iteration_count", 0) + 1
+    decision = fast_path_decision(state)
+    if decision:
+        apply_reasoning_decision(state, decision)
+    elif llm_call_allowed():
+        apply_reasoning_response(state, (await get_llm().ainvoke(build_reasoning_prompt(state))).content)
+    else:
+        apply_reasoning_decision(state, FALLBACK_DECISION)
+    return finish_planning(state)
+
+def plan_router(state):
+    """Routes the plan straight to its retrievals (concurrently) or to the answer node; never back to planning."""
+    plan = state.get("plan", {})
+    if plan.get("synthesis") == "general_chat":
+        return "general_chat"
+    branches = []
+    if "structured" in plan.get("retrievals", []):
+        branches.append("data_retrieval")
+    if "semantic" in plan.get("retrievals", []):
+        branches.append("knowledge_search")
+    return branches or "response_synthesis"
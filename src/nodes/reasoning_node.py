@@ -1,31 +1,28 @@
-from . import llm, load_prompt
+from . import get_llm, get_template, get_intent_classifier
+from src.config import Config
+from src.utils.telemetry import get_logger
+import os
 import json
 import re
 
-def reasoning_node(state):
-    # If we already have a final answer from a previous node, skip processing
-    if state.get("final_answer") and state.get("last_node") in ["response_synthesis", "general_chat"]:
-        return state
-
-    # Increment iteration count
-    state["iteration_count"] = state.get("iteration_count", 0) + 1
+logger = get_logger("reasoning")
 
+def build_reasoning_prompt(state):
     last_product_query = state.get("last_product_query", "")
     last_product_answer = state.get("last_product_answer", "")
     query = state["query"]
     chat_context = ""
     if last_product_query:
         chat_context = f"Previous product question: {last_product_query}\nPrevious product answer: {last_product_answer[:200]}\n"
+    if state.get("conversation_summary"):
+        chat_context = f"Earlier questions in this conversation: {state['conversation_summary']}\n" + chat_context
 
     # Prepare data status for prompt
     has_structured_results = bool(state.get("structured_results"))
     has_semantic_results = bool(state.get("semantic_results"))
     structured_results = state.get("structured_results", "")
     semantic_results = state.get("semantic_results", "")
-    prompt_template = load_prompt("intelligent_reasoning.txt")
-    from langchain.prompts import ChatPromptTemplate
-    prompt = ChatPromptTemplate.from_template(prompt_template)
-    prompt_str = prompt.format(
+    return get_template("intelligent_reasoning.txt").format(
         query=query,
         reasoning_step=state.get("reasoning_step", "classify"),
         iteration_count=state["iteration_count"],
@@ -40,25 +37,69 @@ def reasoning_node(state):
         semantic_results=semantic_results,
         chat_context=chat_context
     )
-    response = llm.invoke(prompt_str).content
+
+def apply_reasoning_decision(state, data):
+    state["data_sufficiency"] = data.get("data_sufficiency", "NONE")
+    state["next_action"] = data.get("next_action", "synthesize")
+    state["reasoning_notes"] = data.get("reasoning_notes", "")
+    state["needs_structured_data"] = data.get("needs_structured_data", state.get("needs_structured_data", False))
+    state["needs_semantic_search"] = data.get("needs_semantic_search", state.get("needs_semantic_search", False))
+    state["is_product_question"] = data.get("is_product_question", False)
+    state["is_product_followup"] = data.get("is_product_followup", False)
+    state["is_non_product"] = data.get("is_non_product", False)
+    state["query_type"] = data.get("query_type", "general")
+    state["reasoning_step"] = "decision"
+    state["last_node"] = "reasoning"
+    return state
+
+def apply_reasoning_response(state, response):
     response_clean = re.sub(r"^```(?:json)?|```$", "", response.strip(), flags=re.IGNORECASE | re.MULTILINE).strip()
     try:
         data = json.loads(response_clean)
-        state["data_sufficiency"] = data.get("data_sufficiency", "NONE")
-        state["next_action"] = data.get("next_action", "synthesize")
-        state["reasoning_notes"] = data.get("reasoning_notes", "")
-        state["needs_structured_data"] = data.get("needs_structured_data", state.get("needs_structured_data", False))
-        state["needs_semantic_search"] = data.get("needs_semantic_search", state.get("needs_semantic_search", False))
-        state["is_product_question"] = data.get("is_product_question", False)
-        state["is_product_followup"] = data.get("is_product_followup", False)
-        state["is_non_product"] = data.get("is_non_product", False)
-        state["query_type"] = data.get("query_type", "general")
-        state["reasoning_step"] = "decision"
     except Exception as e:
-        print("reasoning_node JSON decode error:", e)
+        logger.warning("reasoning_node JSON decode error: %s", e)
         state["data_sufficiency"] = "NONE"
         state["next_action"] = "synthesize"
         state["reasoning_notes"] = f"LLM response parse error: {e}"
         state["reasoning_step"] = "decision"
-    state["last_node"] = "reasoning"
-    return state 
\ No newline at end of file
+        state["last_node"] = "reasoning"
+        return state
+    return apply_reasoning_decision(state, data)
+
+def fast_path_decision(state):
+    """On the first pass of a turn, returns the local classifier's decision when it is confident enough to skip the LLM."""
+    if state["iteration_count"] != 1:
+        return None
+    if str(os.environ.get('FAST_INTENT_ENABLED', Config.FAST_INTENT_ENABLED)).lower() in ("0", "false", "no"):
+        return None
+    decision = get_intent_classifier().decide(state["query"], state.get("last_product_query", ""))
+    if decision:
+        logger.info("Fast-path routing: %s (confidence %s)", decision["next_action"], decision["confidence"])
+    return decision
+
+def has_final_answer(state):
+    return bool(state.get("final_answer")) and state.get("last_node") in ["response_synthesis", "general_chat"]
+
+def reasoning_node(state):
+    # If we already have a final answer from a previous node, skip processing
+    if has_final_answer(state):
+        return state
+
+    # Increment iteration count
+    state["iteration_count"] = state.get("iteration_count", 0) + 1
+    decision = fast_path_decision(state)
+    if decision:
+        return apply_reasoning_decision(state, decision)
+    response = get_llm().invoke(build_reasoning_prompt(state)).content
+    return apply_reasoning_response(state, response)
+
+async def areasoning_node(state):
+    if has_final_answer(state):
+        return state
+
+    state["iteration_count"] = state.get("iteration_count", 0) + 1
+    decision = fast_path_decision(state)
+    if decision:
+        return apply_reasoning_decision(state, decision)
+    response = (await get_llm().ainvoke(build_reasoning_prompt(state))).content
+    return apply_reasoning_response(state, response)
@@ -1,8 +1,20 @@
+import os
+from src.config import Config
+from src.utils.telemetry import get_logger
+
+logger = get_logger("reasoning_router")
+
 def reasoning_router(state):
     # If we already have a final answer from synthesize or non_product, we should end
     if state.get("final_answer") and state.get("last_node") in ["response_synthesis", "general_chat"]:
         return "end"
 
+    # Stop gathering once the iteration cap is reached and answer with what we have
+    max_iterations = int(os.environ.get('MAX_REASONING_ITERATIONS', Config.MAX_REASONING_ITERATIONS))
+    if state.get("iteration_count", 0) >= max_iterations and state.get("next_action") in ["gather_structured", "gather_semantic"]:
+        logger.info("Reasoning iteration cap (%s) reached, synthesizing", max_iterations)
+        return "response_synthesis"
+
     # Use the new next_action field for routing
     next_action = state.get("next_action", "synthesize")
     action_map = {
@@ -12,4 +24,23 @@ def reasoning_router(state):
         "general_chat": "general_chat",
         "end": "end"
     }
-    return action_map.get(next_action, "response_synthesis") 
\ No newline at end of file
+    return action_map.get(next_action, "response_synthesis") 
+
+def parallel_reasoning_router(state):
+    """
+    Router for the parallel graph mode. When the reasoning step asks for data, every retrieval
+    the query needs is started at once, so structured and semantic retrieval run as concurrent
+    branches that join at response_synthesis instead of looping back through reasoning.
+    """
+    if state.get("final_answer") and state.get("last_node") in ["response_synthesis", "general_chat"]:
+        return "end"
+
+    next_action = state.get("next_action", "synthesize")
+    if next_action in ["gather_structured", "gather_semantic"]:
+        branches = []
+        if next_action == "gather_structured" or (state.get("needs_structured_data") and not state.get("structured_complete")):
+            branches.append("data_retrieval")
+        if next_action == "gather_semantic" or (state.get("needs_semantic_search") and not state.get("semantic_complete")):
+            branches.append("knowledge_search")
+        return branches
+    return reasoning_router(state)
@@ -1,49 +1,76 @@
-from . import llm, load_prompt
+from . import get_llm, get_template, get_query_processor
+from src.config import Config
+from src.utils.turn_budget import llm_call_allowed
+from src.utils.telemetry import get_logger
 import re
 
-def response_synthesis_node(state):
+logger = get_logger("response_synthesis")
+
+def build_synthesis_prompt(state):
+    """Returns (prompt, direct_answer). prompt is None when the answer needs no LLM call."""
     context_info = ""
     if state.get("is_product_followup") and state.get("last_product_query"):
-        # Extract the specific product name from the previous answer if possible
-        last_answer = state['last_product_answer']
-        specific_product = ""
-        
-        # Try to extract product name from the previous answer
-        if "**" in last_answer:
-            # Look for bold product names (format: **Product Name**: **$Price**)
-            product_matches = re.findall(r'\*\*([^*]+)\*\*: \*\*\$', last_answer)
-            if product_matches:
-                specific_product = product_matches[0].strip()
+        specific_product = get_query_processor().product_resolver.resolve_reference(
+            state.get('last_product_answer', ""), state['last_product_query'])
         
         context_info = f"\nPrevious question: {state['last_product_query']}\nPrevious answer: {state['last_product_answer']}\n"
         if specific_product:
             context_info += f"Specific product being referenced: {specific_product}\n"
     if state.get("structured_results") and not state.get("semantic_results"):
         # Do not call LLM here; just pass the raw SQL result to the formatter
-        state["final_answer"] = state["structured_results"]
+        return None, state["structured_results"]
     elif state.get("semantic_results") and not state.get("structured_results"):
         base_answer = state["semantic_results"]
-        prompt_template = load_prompt("semantic_search.txt")
-        from langchain.prompts import ChatPromptTemplate
-        prompt = ChatPromptTemplate.from_template(prompt_template)
-        answer = llm.invoke(prompt.format(
+        return get_template("semantic_search.txt").format(
             context_info=context_info,
             user_query=state["query"],
             raw_answer=base_answer
-        )).content
-        state["final_answer"] = answer.strip()
+        ), None
     elif state.get("structured_results") and state.get("semantic_results"):
-        prompt_template = load_prompt("synthesize_answer.txt")
-        from langchain.prompts import ChatPromptTemplate
-        prompt = ChatPromptTemplate.from_template(prompt_template)
-        answer = llm.invoke(prompt.format(
+        return get_template("synthesize_answer.txt").format(
             context_info=context_info,
             user_query=state["query"],
             structured=state["structured_results"],
             semantic=state["semantic_results"]
-        )).content
+        ), None
+    return None, "I'm sorry, I couldn't find relevant information to answer your question."
+
+def fallback_answer(state):
+    """Answer assembled without an LLM call, used when the turn budget is exhausted."""
+    if state.get("structured_results"):
+        return state["structured_results"]
+    products = []
+    for block in state.get("semantic_results", "").split("\n---\n"):
+        # Skip the "Product: <title>" header line added by knowledge_search and read the chunk itself
+        match = re.search(r"Product: (.+)", block.split("\n", 1)[-1])
+        if match and match.group(1).strip() not in products:
+            products.append(match.group(1).strip())
+    if products:
+        return "Here are the most relevant products I found:\n" + "\n".join(f"- **{name}**" for name in products)
+    return "I'm sorry, I couldn't find relevant information to answer your question."
+
+def response_synthesis_node(state):
+    prompt_str, direct_answer = build_synthesis_prompt(state)
+    if prompt_str is None:
+        state["final_answer"] = direct_answer
+    elif not llm_call_allowed():
+        logger.info("Turn budget exhausted: answering without synthesis")
+        state["final_answer"] = fallback_answer(state)
+    else:
+        answer = get_llm().invoke(prompt_str, config={"tags": [Config.STREAM_ANSWER_TAG]}).content
         state["final_answer"] = answer.strip()
+    state["last_node"] = "response_synthesis"
+    return state
+
+async def aresponse_synthesis_node(state):
+    prompt_str, direct_answer = build_synthesis_prompt(state)
+    if prompt_str is None:
+        state["final_answer"] = direct_answer
+    elif not llm_call_allowed():
+        logger.info("Turn budget exhausted: answering without synthesis")
+        state["final_answer"] = fallback_answer(state)
     else:
-        state["final_answer"] = "I'm sorry, I couldn't find relevant information to answer your question."
+        answer = (await get_llm().ainvoke(prompt_str, config={"tags": [Config.STREAM_ANSWER_TAG]})).content
+        state["final_answer"] = answer.strip()
     state["last_node"] = "response_synthesis"
-    return state 
\ No newline at end of file
+    return state
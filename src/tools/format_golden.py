@@ -0,0 +1,126 @@
+import os
+import re
+import json
+import argparse
+from typing import Any, Dict, List, Tuple
+
+from src.utils.result_formatter import ResultFormatter
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "data", "format_golden.jsonl")
+
+_PRICE = re.compile(r"\$\s?([\d,]+(?:\.\d+)?)")
+_NUMBER = re.compile(r"(?<![\w.$])\d+(?:\.\d+)?(?![\w.])")
+_BOLD = re.compile(r"\*\*([^*$]+?)\*\*")
+
+
+def facts(text: str) -> Dict[str, set]:
+    """Prices, bare numbers and bolded names stated in a formatted answer."""
+    prices = {float(value.replace(",", "")) for value in _PRICE.findall(text)}
+    without_prices = _PRICE.sub(" ", text)
+    return {
+        "prices": prices,
+        "numbers": {float(value) for value in _NUMBER.findall(without_prices)},
+        "names": {name.strip().lower() for name in _BOLD.findall(text)},
+    }
+
+
+def missing_facts(fast: str, llm: str) -> List[str]:
+    """Facts in the template output that the LLM formatter's answer does not state."""
+    fast_facts, llm_facts = facts(fast), facts(llm)
+    llm_numbers = llm_facts["numbers"] | llm_facts["prices"]
+    missing = [f"${price:.2f}" for price in fast_facts["prices"] - llm_facts["prices"]]
+    missing += [f"{number:g}" for number in fast_facts["numbers"] - llm_numbers]
+    missing += [name for name in fast_facts["names"] if name not in llm.lower()]
+    return missing
+
+
+def unstated_facts(text: str, expected: Dict[str, list]) -> List[str]:
+    """Expected facts of a case ({"prices", "numbers", "names", "phrases"}) that text does not state."""
+    stated = facts(text)
+    missing = [f"${price:.2f}" for price in expected.get("prices", []) if price not in stated["prices"]]
+    missing += [f"{number:g}" for number in expected.get("numbers", []) if number not in stated["numbers"] | stated["prices"]]
+    missing += [phrase for phrase in expected.get("names", []) + expected.get("phrases", []) if phrase.lower() not in text.lower()]
+    return missing
+
+
+def record_with_llm(formatter: ResultFormatter, case: Dict[str, Any]) -> Tuple[str, str]:
+    """The LLM formatter's answer for a case and the model that gave it."""
+    from src.nodes import get_llm
+    llm = get_llm()
+    # Bypass the fast path so the golden answer is the LLM formatter's own output
+    prompt = formatter.build_prompt(case["rows"], case["columns"], case["query"], {}, total_count=case.get("total_count"))
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+    return llm.invoke(prompt).content.strip(), model
+
+
+def check(cases: List[Dict[str, Any]], formatter: ResultFormatter) -> List[Dict[str, Any]]:
+    """
+    Every case needs hand-written "facts" that a correct answer states and an "llm" answer in the
+    LLM formatter's style. The template output and the "llm" answer must both state the facts,
+    and the "llm" answer must state everything the template output states. "llm_model" names
+    the model an answer was recorded with; answers without it are hand-written references,
+    which --record-with-llm replaces.
+    """
+    report = []
+    for case in cases:
+        fast = formatter.fast_format([tuple(row) for row in case["rows"]], case["columns"], case["query"], total_count=case.get("total_count"))
+        row = {"name": case["name"], "fast": fast, "problems": []}
+        if fast != case.get("expected"):
+            row["problems"].append(f"template output changed:\n    expected: {case.get('expected')!r}\n    got:      {fast!r}")
+        expected = case.get("facts")
+        if not expected:
+            row["problems"].append("no expected facts")
+        elif fast is not None:
+            missing = unstated_facts(fast, expected)
+            if missing:
+                row["problems"].append(f"not in the template output: {', '.join(missing)}")
+        if case.get("llm"):
+            missing = unstated_facts(case["llm"], expected or {})
+            if fast is not None:
+                missing += [fact for fact in missing_facts(fast, case["llm"]) if fact not in missing]
+            if missing:
+                row["problems"].append(f"not in the LLM formatter's answer: {', '.join(missing)}")
+        else:
+            row["problems"].append("no LLM answer recorded (run with --record-with-llm)")
+        report.append(row)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the fast template formatter against golden outputs and the LLM formatter.")
+    parser.add_argument("--golden", default=GOLDEN_PATH, help="JSONL file of result sets with expected template output, expected facts and, once recorded, the LLM formatter's output")
+    parser.add_argument("--record-with-llm", action="store_true", help="Record 'llm' answers by calling the LLM formatter, for cases that have none or only a hand-written reference, and write them back")
+    parser.add_argument("--update", action="store_true", help="Accept the current template output as the new 'expected' values")
+    args = parser.parse_args()
+
+    with open(args.golden, "r", encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    formatter = ResultFormatter()
+    if args.record_with_llm or args.update:
+        for case in cases:
+            if args.record_with_llm and not (case.get("llm") and case.get("llm_model")):
+                case["llm"], case["llm_model"] = record_with_llm(formatter, case)
+            if args.update:
+                case["expected"] = formatter.fast_format([tuple(row) for row in case["rows"]], case["columns"], case["query"], total_count=case.get("total_count"))
+        with open(args.golden, "w", encoding="utf-8") as f:
+            for case in cases:
+                f.write(json.dumps(case, ensure_ascii=False) + "\n")
+
+    report = check(cases, formatter)
+    handled = sum(1 for row in report if row["fast"] is not None)
+    failures = [row for row in report if row["problems"]]
+    recorded = sum(1 for case in cases if case.get("llm") and case.get("llm_model"))
+    references = sum(1 for case in cases if case.get("llm") and not case.get("llm_model"))
+    print(f"Cases: {len(report)}  handled without the LLM: {handled}  LLM answers recorded: {recorded}  hand-written: {references}  "
+          f"rules: {', '.join(formatter.fast_format_rules) or '(none)'}")
+    for row in report:
+        status = "FAIL" if row["problems"] else "ok"
+        print(f"{status:>4}  {row['name']:<32} {'template' if row['fast'] is not None else 'LLM'}")
+        for problem in row["problems"]:
+            print(f"      {problem}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
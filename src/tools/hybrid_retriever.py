@@ -0,0 +1,280 @@
+import os
+import asyncio
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.config import Config
+from src.db.faiss_index import load_vectorstore, search_parameters
+from src.db.sql_service import SQLService
+from src.tools.metadata_filter import MetadataFilterIndex
+from src.tools.product_resolver import STOP_WORDS, tokenize
+from src.utils import telemetry
+
+logger = telemetry.get_logger("hybrid_retriever")
+
+SEARCH_MODES = ("hybrid", "vector", "lexical")
+
+# Words too common in this catalog or in questions to narrow a full-text search
+LEXICAL_STOP_WORDS = STOP_WORDS | {
+    "mix", "mixes", "product", "products", "recommend", "suggest", "good", "best", "some", "something", "like",
+    "want", "need", "looking", "find", "me", "please", "there", "any", "has", "contain", "contains", "made",
+}
+
+# bm25() column weights, in products_fts column order (name, description, ingredients, diet, category)
+BM25_WEIGHTS = (10.0, 1.0, 2.0, 5.0, 3.0)
+
+PRODUCT_COLUMNS = ("id", "name", "price", "origin_price", "category", "type", "baking_category", "diet",
+                   "description", "ingredients", "review_rating", "review_count", "url")
+
+
+def product_document(row: Dict) -> Document:
+    """A search result built from a products row, in the same layout as the indexed chunks."""
+    content = "\n".join(
+        f"{label}: {prefix}{row[column]}" for label, column, prefix in (
+            ("Product", "name", ""), ("Price", "price", "$"), ("Original Price", "origin_price", "$"),
+            ("Category", "category", ""), ("Type", "type", ""), ("Baking Category", "baking_category", ""),
+            ("Diet", "diet", ""), ("Description", "description", ""), ("Ingredients", "ingredients", ""),
+            ("Review Rating", "review_rating", ""), ("Review Count", "review_count", ""), ("URL", "url", ""),
+        ) if row.get(column) not in (None, "")
+    )
+    metadata = {key: row.get(key) for key in ("name", "category", "type", "price", "origin_price", "diet", "baking_category", "url")}
+    metadata.update(product_id=row["id"], source="lexical")
+    return Document(page_content=content, metadata=metadata)
+
+
+class HybridRetriever:
+    """
+    Product search over the FAISS vector store and the products_fts (FTS5/BM25) table, merged
+    with reciprocal rank fusion per product. When the full-text search matches every query term
+    in only a handful of products, those are returned directly and the query is never embedded.
+
+    Diet/category/type/baking category terms and price ranges in the query restrict both legs:
+    the vector search only visits chunks set in the metadata bitmap, and lexical rows outside
+    the allowed products are dropped.
+
+    When setup_db.py --incremental publishes a new vector store generation, the next search
+    loads it and switches to it together with the database rows committed alongside it.
+    """
+
+    def __init__(self, vectorstore, sql_service: SQLService = None, mode: str = None):
+        self.sql_service = sql_service or SQLService()
+        self.mode = os.environ.get('SEARCH_MODE', mode or Config.SEARCH_MODE).lower()
+        if self.mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown SEARCH_MODE {self.mode!r}; expected one of {', '.join(SEARCH_MODES)}")
+        self.rrf_k = int(os.environ.get('RRF_K', Config.RRF_K))
+        self.confident_max_hits = int(os.environ.get('LEXICAL_CONFIDENT_MAX_HITS', Config.LEXICAL_CONFIDENT_MAX_HITS))
+        self.has_fts = bool(self.sql_service.execute_query(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'")[0])
+        if not self.has_fts and self.mode != "vector":
+            logger.warning("products_fts not found (re-run setup_db.py to build it): using vector search only")
+            self.mode = "vector"
+        self.embedding_calls_skipped = 0
+        self.use_metadata_filter = str(os.environ.get('METADATA_FILTER_ENABLED', Config.METADATA_FILTER_ENABLED)).lower() in ("1", "true", "yes")
+        self.generation = self.index_generation()
+        self._use(vectorstore)
+        # Vector hits computed ahead by prefetch(), keyed by (generation, query, k)
+        self._prefetched: Dict[Tuple, List[Document]] = {}
+        self._prefetch_lock = threading.Lock()
+
+    def _use(self, vectorstore):
+        metadata_filter = MetadataFilterIndex.from_vectorstore(vectorstore) if self.use_metadata_filter else None
+        # Swapped as one tuple so a concurrent search never pairs a store with another store's bitsets
+        self._snapshot = (vectorstore, metadata_filter)
+
+    @property
+    def vectorstore(self):
+        return self._snapshot[0]
+
+    @property
+    def metadata_filter(self) -> Optional[MetadataFilterIndex]:
+        return self._snapshot[1]
+
+    def index_generation(self) -> Optional[int]:
+        """Vector store generation recorded in products.db by setup_db.py, None for a database without index state."""
+        if not self.sql_service.execute_query("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'index_meta'")[0]:
+            return None
+        rows, _ = self.sql_service.execute_query("SELECT value FROM index_meta WHERE name = 'generation'")
+        return rows[0][0] if rows else None
+
+    def refresh(self):
+        """Loads the vector store generation committed to products.db if it is newer than the one in use."""
+        generation = self.index_generation()
+        if generation is None or generation == self.generation:
+            return
+        try:
+            vectorstore = load_vectorstore(embeddings=self.vectorstore.embeddings, generation=generation)
+        except (OSError, RuntimeError) as e:
+            logger.warning("Could not load vector store generation %s: %s", generation, e)
+            return
+        self._use(vectorstore)
+        self.generation = generation
+
+    def constraint_bits(self, query: str, filters: Dict = None,
+                        metadata_filter: MetadataFilterIndex = None) -> Tuple[Optional[np.ndarray], Optional[set]]:
+        """Bitmap of allowed chunks and their product ids, or (None, None) when the query is unconstrained."""
+        metadata_filter = metadata_filter or self.metadata_filter
+        if metadata_filter is None:
+            return None, None
+        constraints = filters if filters is not None else metadata_filter.parse(query)
+        bits = metadata_filter.select(constraints)
+        if bits is None:
+            return None, None
+        allowed = metadata_filter.count(bits)
+        if not allowed:
+            logger.info("No chunks match %s: searching without metadata filters", constraints)
+            return None, None
+        logger.info("Metadata filter %s: searching %s of %s chunks", constraints, allowed, metadata_filter.size)
+        return bits, metadata_filter.allowed_products(bits)
+
+    def vector_search(self, query_vector: List[float], k: int, bits: Optional[np.ndarray], vectorstore=None) -> List[Document]:
+        """Nearest chunks to query_vector, only among the FAISS ids set in bits when given."""
+        vectorstore = vectorstore or self.vectorstore
+        if bits is None:
+            with telemetry.span("faiss", "search", k=k):
+                return vectorstore.similarity_search_by_vector(query_vector, k=k)
+        index = vectorstore.index
+        vector = np.asarray([query_vector], dtype=np.float32)
+        with telemetry.span("faiss", "filtered_search", k=k):
+            _, ids = index.search(vector, k, params=search_parameters(index, bits))
+            return self.documents_for_ids(ids[0], vectorstore)
+
+    def documents_for_ids(self, ids, vectorstore) -> List[Document]:
+        hits = [int(id_) for id_ in ids if id_ != -1]
+        if hasattr(vectorstore.docstore, "documents"):
+            # SQLiteDocstore: fetch the hits' rows in one query
+            documents = vectorstore.docstore.documents(hits)
+            return [documents[id_] for id_ in hits if id_ in documents]
+        return [vectorstore.docstore.search(vectorstore.index_to_docstore_id[id_]) for id_ in hits]
+
+    def prefetch(self, queries: List[str], k: int = 5) -> int:
+        """
+        Runs the vector search of retrieve(query, k) for many queries as one FAISS matrix search
+        and keeps the hits for the retrieve() calls that follow (each is used once). Queries with
+        metadata constraints are left to search on their own. Embeds with embed_query, so prefill
+        the query embedding cache first. Returns the number of queries searched.
+        """
+        if self.mode == "lexical":
+            return 0
+        self.refresh()
+        vectorstore, metadata_filter = self._snapshot
+        vector_k = k if self.mode == "vector" else k * 2
+        queries = [query for query in dict.fromkeys(queries)
+                   if metadata_filter is None or metadata_filter.select(metadata_filter.parse(query)) is None]
+        if not queries:
+            return 0
+        vectors = np.asarray([vectorstore.embeddings.embed_query(query) for query in queries], dtype=np.float32)
+        with telemetry.span("faiss", "batch_search", k=vector_k, queries=len(queries)):
+            _, ids = vectorstore.index.search(vectors, vector_k)
+        with self._prefetch_lock:
+            for query, row in zip(queries, ids):
+                self._prefetched[(self.generation, query, vector_k)] = self.documents_for_ids(row, vectorstore)
+        return len(queries)
+
+    def take_prefetched(self, query: str, k: int) -> Optional[List[Document]]:
+        with self._prefetch_lock:
+            return self._prefetched.pop((self.generation, query, k), None)
+
+    def clear_prefetched(self):
+        with self._prefetch_lock:
+            self._prefetched.clear()
+
+    @staticmethod
+    def match_expression(query: str, operator: str) -> Optional[str]:
+        terms = []
+        for token, _, _ in tokenize(query):
+            if token not in LEXICAL_STOP_WORDS and token not in terms:
+                terms.append(token)
+        return f" {operator} ".join(f'"{term}"' for term in terms) if terms else None
+
+    def lexical_search(self, query: str, k: int, operator: str = "OR", allowed_products: Optional[set] = None) -> List[Dict]:
+        """Products ranked by BM25; operator "AND" requires every query term to match."""
+        expression = self.match_expression(query, operator)
+        if not expression:
+            return []
+        if allowed_products is not None:
+            # Over-fetch so rows dropped by the metadata constraints do not leave the list short
+            rows = self.lexical_search(query, k * 5, operator)
+            return [row for row in rows if row["id"] in allowed_products][:k]
+        columns = ", ".join(f"p.{column}" for column in PRODUCT_COLUMNS)
+        weights = ", ".join(str(weight) for weight in BM25_WEIGHTS)
+        sql = (f"SELECT {columns} FROM products_fts JOIN products p ON p.id = products_fts.rowid "
+               f"WHERE products_fts MATCH ? ORDER BY bm25(products_fts, {weights}) LIMIT ?")
+        results, result_columns = self.sql_service.execute_query(sql, (expression, k))
+        return [dict(zip(result_columns, row)) for row in results]
+
+    def confident_lexical(self, query: str, k: int, allowed_products: Optional[set] = None) -> Optional[List[Document]]:
+        """Documents for a query whose terms all match in at most LEXICAL_CONFIDENT_MAX_HITS products, else None."""
+        rows = self.lexical_search(query, self.confident_max_hits + 1, "AND", allowed_products)
+        if 0 < len(rows) <= self.confident_max_hits:
+            self.embedding_calls_skipped += 1
+            logger.info("Lexical search matched %s product(s) on every term: skipping the embedding call", len(rows))
+            return [product_document(row) for row in rows[:k]]
+        return None
+
+    def fuse(self, lexical_rows: List[Dict], vector_docs: List[Document], k: int) -> List[Document]:
+        """Reciprocal rank fusion per product; each product is represented by its best vector chunk when it has one."""
+        scores: Dict[object, float] = {}
+        representative: Dict[object, Document] = {}
+        for rank, row in enumerate(lexical_rows):
+            scores[row["id"]] = scores.get(row["id"], 0.0) + 1.0 / (self.rrf_k + rank + 1)
+            representative[row["id"]] = product_document(row)
+        seen = set()
+        for rank, doc in enumerate(vector_docs):
+            key = doc.metadata.get("product_id", id(doc))
+            if key in seen:
+                continue
+            seen.add(key)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+            representative[key] = doc
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        return [representative[key] for key in ranked[:k]]
+
+    def retrieve(self, query: str, k: int = 5, filters: Dict = None) -> List[Document]:
+        """
+        filters: {"terms": [...], "min_price": ..., "max_price": ...} chosen by the caller; by
+        default they are parsed from the query.
+        """
+        self.refresh()
+        vectorstore, metadata_filter = self._snapshot
+        bits, allowed_products = self.constraint_bits(query, filters, metadata_filter)
+        prefetched = self.take_prefetched(query, k if self.mode == "vector" else k * 2) if bits is None else None
+        if self.mode == "vector":
+            return prefetched if prefetched is not None else self.vector_search(vectorstore.embeddings.embed_query(query), k, bits, vectorstore)
+        if self.mode == "lexical":
+            return [product_document(row) for row in self.lexical_search(query, k, "OR", allowed_products)]
+        confident = self.confident_lexical(query, k, allowed_products)
+        if confident is not None:
+            return confident
+        lexical_rows = self.lexical_search(query, k * 2, "OR", allowed_products)
+        vector_docs = prefetched if prefetched is not None else self.vector_search(vectorstore.embeddings.embed_query(query), k * 2, bits, vectorstore)
+        return self.fuse(lexical_rows, vector_docs, k)
+
+    async def aretrieve(self, query: str, k: int = 5, filters: Dict = None) -> List[Document]:
+        """Async variant of retrieve(); SQLite and FAISS run in worker threads while the query is embedded."""
+        await asyncio.to_thread(self.refresh)
+        vectorstore, metadata_filter = self._snapshot
+        bits, allowed_products = self.constraint_bits(query, filters, metadata_filter)
+        prefetched = self.take_prefetched(query, k if self.mode == "vector" else k * 2) if bits is None else None
+        if self.mode == "vector":
+            if prefetched is not None:
+                return prefetched
+            query_vector = await vectorstore.embeddings.aembed_query(query)
+            return await asyncio.to_thread(self.vector_search, query_vector, k, bits, vectorstore)
+        if self.mode == "lexical":
+            rows = await asyncio.to_thread(self.lexical_search, query, k, "OR", allowed_products)
+            return [product_document(row) for row in rows]
+        confident = await asyncio.to_thread(self.confident_lexical, query, k, allowed_products)
+        if confident is not None:
+            return confident
+        if prefetched is not None:
+            lexical_rows = await asyncio.to_thread(self.lexical_search, query, k * 2, "OR", allowed_products)
+            return self.fuse(lexical_rows, prefetched, k)
+        lexical_rows, query_vector = await asyncio.gather(
+            asyncio.to_thread(self.lexical_search, query, k * 2, "OR", allowed_products),
+            vectorstore.embeddings.aembed_query(query),
+        )
+        vector_docs = await asyncio.to_thread(self.vector_search, query_vector, k * 2, bits, vectorstore)
+        return self.fuse(lexical_rows, vector_docs, k)
@@ -0,0 +1,185 @@
+import os
+import re
+import json
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import Config
+from src.tools.product_resolver import is_followup
+
+GREETING_PATTERN = re.compile(
+    r"^\s*(hi|hello|hey|yo|good (morning|afternoon|evening)|thanks|thank you|thx|bye|goodbye|"
+    r"how are you|who are you|what can you do|what's up|whats up)\b[\s!.?,]*\w{0,12}[\s!.?]*$",
+    re.IGNORECASE,
+)
+
+# (pattern, query_type, weight) cues that the question needs the products table
+STRUCTURED_CUES = [
+    (r"\bhow much\b|\bprice[sd]?\b|\bcost(s|ing)?\b|\$\s?\d", "pricing", 0.45),
+    (r"\bcheap(er|est)?\b|\bexpensive\b|\bpricier\b|\bpriciest\b|\baffordable\b", "comparing", 0.45),
+    (r"\bhow many\b|\bnumber of\b|\bcount\b", "counting", 0.5),
+    (r"\b(in stock|left|available|quantity|stock)\b", "counting", 0.4),
+    (r"\b(more|less|greater|fewer|cheaper) than\b|\bunder\b|\bover\b|\bbelow\b|\babove\b|\bbetween\b", "filtering", 0.3),
+    (r"\b(highest|lowest|best|top|worst)[- ]rated\b|\brating\b|\breviews?\b|\bdiscount(ed|s)?\b|\bon sale\b", "filtering", 0.4),
+    (r"\b(show|list|give) me (all|every|the)\b|\bwhich products\b|\bwhat products\b|\ball (the )?\w+ (mixes|products)\b", "filtering", 0.35),
+    (r"^(show|list|what|which)\b.*\b(gluten[- ]free|vegan|keto|organic|dairy[- ]free|nut[- ]free)\b.*\b(products|mixes|items)\b", "filtering", 0.35),
+]
+
+# Cues that the question needs descriptive/recommendation context from the vector store
+SEMANTIC_CUES = [
+    (r"\brecommend|\bsuggest|\bsuggestion|\bshould i (buy|get|try)\b", "recommendation", 0.5),
+    (r"\btell me about\b|\bdescribe\b|\bwhat is .* like\b|\bwhat does .* taste\b|\bdetails about\b", "explaining", 0.45),
+    (r"\bgood for\b|\bpair(s|ed)? with\b|\bsimilar to\b|\brelated\b|\bgo(es)? (well )?with\b", "recommendation", 0.4),
+    (r"\bhow (do|to|should) (i )?(make|bake|use|prepare)\b|\brecipe\b|\btips?\b", "explaining", 0.4),
+]
+
+
+class FastIntentClassifier:
+    """
+    Rule-based classifier that decides the first routing step locally. classify() returns a
+    decision in the same shape as the reasoning LLM's JSON, plus a confidence score; callers
+    should only trust it when the confidence clears the configured threshold.
+    """
+
+    def __init__(self, threshold: float = None):
+        self.threshold = float(os.environ.get('FAST_INTENT_THRESHOLD', threshold or Config.FAST_INTENT_THRESHOLD))
+
+    @staticmethod
+    def _score(query: str, cues) -> Tuple[float, Optional[str]]:
+        score, query_type, best = 0.0, None, 0.0
+        for pattern, cue_type, weight in cues:
+            if re.search(pattern, query, re.IGNORECASE):
+                score += weight
+                if weight > best:
+                    best, query_type = weight, cue_type
+        return min(score, 1.0), query_type
+
+    def classify(self, query: str, last_product_query: str = "") -> Dict[str, Any]:
+        if is_followup(query, last_product_query):
+            # Follow-ups depend on the conversation; leave them to the LLM
+            return {"confidence": 0.0, "reasoning_notes": "fast-path: possible follow-up"}
+
+        if GREETING_PATTERN.match(query):
+            return {
+                "confidence": 0.95,
+                "data_sufficiency": "NONE",
+                "next_action": "general_chat",
+                "reasoning_notes": "fast-path: greeting or small talk",
+                "needs_structured_data": False,
+                "needs_semantic_search": False,
+                "is_product_question": False,
+                "is_product_followup": False,
+                "is_non_product": True,
+                "query_type": "general",
+            }
+
+        structured_score, structured_type = self._score(query, STRUCTURED_CUES)
+        semantic_score, semantic_type = self._score(query, SEMANTIC_CUES)
+        if not structured_score and not semantic_score:
+            return {"confidence": 0.0, "reasoning_notes": "fast-path: no routing cues"}
+
+        # Confidence grows with the cue strength and shrinks when both kinds of cue compete
+        needs_structured = structured_score > 0
+        needs_semantic = semantic_score > 0
+        if needs_structured and needs_semantic:
+            confidence = 0.5 + abs(structured_score - semantic_score) / 2
+            next_action = "gather_structured" if structured_score >= semantic_score else "gather_semantic"
+        else:
+            confidence = 0.6 + max(structured_score, semantic_score) / 2
+            next_action = "gather_structured" if needs_structured else "gather_semantic"
+        query_type = structured_type if next_action == "gather_structured" else semantic_type
+        return {
+            "confidence": round(min(confidence, 0.99), 3),
+            "data_sufficiency": "NONE",
+            "next_action": next_action,
+            "reasoning_notes": f"fast-path: {query_type} cues (structured={structured_score:.2f}, semantic={semantic_score:.2f})",
+            "needs_structured_data": needs_structured,
+            "needs_semantic_search": needs_semantic,
+            "is_product_question": True,
+            "is_product_followup": False,
+            "is_non_product": False,
+            "query_type": query_type,
+        }
+
+    def decide(self, query: str, last_product_query: str = "") -> Optional[Dict[str, Any]]:
+        """Returns the decision when it is confident enough to skip the LLM, otherwise None."""
+        decision = self.classify(query, last_product_query)
+        if decision["confidence"] >= self.threshold:
+            return decision
+        return None
+
+
+def label_with_llm(query: str) -> Dict[str, Any]:
+    """Asks the reasoning LLM for its first routing decision on a fresh turn."""
+    from src.nodes.reasoning_node import build_reasoning_prompt
+    from src.nodes import get_llm
+    state = {"query": query, "iteration_count": 1}
+    response = get_llm().invoke(build_reasoning_prompt(state)).content
+    response_clean = re.sub(r"^```(?:json)?|```$", "", response.strip(), flags=re.IGNORECASE | re.MULTILINE).strip()
+    data = json.loads(response_clean)
+    return {key: data.get(key) for key in ("next_action", "needs_structured_data", "needs_semantic_search", "is_non_product")}
+
+
+def evaluate(items: List[Dict[str, Any]], classifier: FastIntentClassifier, thresholds: List[float]) -> List[Dict[str, Any]]:
+    """Agreement between the fast path and the LLM router labels, per confidence threshold."""
+    predictions = [classifier.classify(item["query"]) for item in items]
+    report = []
+    for threshold in thresholds:
+        covered = action_agree = flags_agree = 0
+        for item, prediction in zip(items, predictions):
+            if prediction["confidence"] < threshold:
+                continue
+            covered += 1
+            if prediction["next_action"] == item["next_action"]:
+                action_agree += 1
+                if (bool(prediction["needs_structured_data"]) == bool(item.get("needs_structured_data"))
+                        and bool(prediction["needs_semantic_search"]) == bool(item.get("needs_semantic_search"))):
+                    flags_agree += 1
+        report.append({
+            "threshold": threshold,
+            "coverage": covered / len(items) if items else 0.0,
+            "action_agreement": action_agree / covered if covered else None,
+            "full_agreement": flags_agree / covered if covered else None,
+            "covered": covered,
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the fast-path intent classifier against the LLM router.")
+    parser.add_argument("--eval", dest="eval_path", default=os.path.join(os.path.dirname(__file__), "data", "router_eval_queries.jsonl"),
+                        help="JSONL file with a 'query' per line and, once labelled, the LLM router's decision")
+    parser.add_argument("--label-with-llm", action="store_true",
+                        help="Label queries that have no next_action by calling the LLM router, and write the labels back")
+    parser.add_argument("--thresholds", default="0.6,0.7,0.8,0.85,0.9,0.95")
+    args = parser.parse_args()
+
+    with open(args.eval_path, "r", encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    if args.label_with_llm:
+        for item in items:
+            if not item.get("next_action"):
+                item.update(label_with_llm(item["query"]))
+        with open(args.eval_path, "w", encoding="utf-8") as f:
+            for item in items:
+                f.write(json.dumps(item) + "\n")
+    labelled = [item for item in items if item.get("next_action")]
+    if not labelled:
+        parser.error(f"No labelled queries in {args.eval_path}; run with --label-with-llm first")
+
+    classifier = FastIntentClassifier()
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+    print(f"Labelled queries: {len(labelled)} (current threshold {classifier.threshold})")
+    print(f"{'threshold':>9} {'coverage':>9} {'action':>8} {'full':>8} {'covered':>8}")
+    for row in evaluate(labelled, classifier, thresholds):
+        action = f"{row['action_agreement']:.1%}" if row["action_agreement"] is not None else "-"
+        full = f"{row['full_agreement']:.1%}" if row["full_agreement"] is not None else "-"
+        print(f"{row['threshold']:>9.2f} {row['coverage']:>9.1%} {action:>8} {full:>8} {row['covered']:>8}")
+    for item in labelled:
+        prediction = classifier.classify(item["query"])
+        if prediction["confidence"] >= classifier.threshold and prediction["next_action"] != item["next_action"]:
+            print(f"DISAGREE: {item['query']!r} fast={prediction['next_action']} llm={item['next_action']} ({prediction['confidence']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import re
+import json
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.tools.product_resolver import tokenize
+
+# Chunk metadata attributes that hold lists of catalog values
+FILTER_ATTRIBUTES = ("diet", "category", "type", "baking_category")
+
+# Catalog values too generic to constrain a search ("bread mix" means bread, not the "Mix" type)
+GENERIC_TERMS = {("mix",)}
+
+_PRICE_NUMBER = r"\$\s?(\d+(?:\.\d+)?)|(\d+(?:\.\d+)?)\s*(?:dollars?|bucks)"
+_PRICE_MAX = re.compile(rf"\b(?:under|below|less than|cheaper than|at most|no more than|up to)\s+(?:{_PRICE_NUMBER})", re.IGNORECASE)
+_PRICE_MIN = re.compile(rf"\b(?:over|above|more than|at least|pricier than)\s+(?:{_PRICE_NUMBER})", re.IGNORECASE)
+_PRICE_BETWEEN = re.compile(r"\bbetween\s+\$?\s?(\d+(?:\.\d+)?)\s*(?:dollars?)?\s+and\s+\$?\s?(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+
+def _singular(token: str) -> str:
+    return token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+
+
+def _phrase(text: str) -> Tuple[str, ...]:
+    return tuple(_singular(token) for token, _, _ in tokenize(text))
+
+
+def _values(raw) -> List[str]:
+    if isinstance(raw, str) and raw.startswith("["):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            pass
+    if raw in (None, "", "0"):
+        return []
+    return [str(value) for value in (raw if isinstance(raw, list) else [raw]) if value not in (None, "", "0")]
+
+
+def _price(raw) -> float:
+    try:
+        return float(re.sub(r"[^\d.]", "", raw) if isinstance(raw, str) else raw)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def parse_price_range(query: str) -> Tuple[Optional[float], Optional[float]]:
+    """(min_price, max_price) stated in the query, e.g. "under $10" -> (None, 10.0)."""
+    between = _PRICE_BETWEEN.search(query)
+    if between:
+        low, high = sorted(float(value) for value in between.groups())
+        return low, high
+    low = high = None
+    match = _PRICE_MAX.search(query)
+    if match:
+        high = float(match.group(1) or match.group(2))
+    match = _PRICE_MIN.search(query)
+    if match:
+        low = float(match.group(1) or match.group(2))
+    return low, high
+
+
+class MetadataFilterIndex:
+    """
+    Bitsets over the vector store's chunks, built once when the index loads: one per catalog
+    value of diet/category/type/baking_category (keyed by its singularised words, so "cookies"
+    and the Cookie/Cookies types share one), plus a price array. select() turns the attribute
+    terms and price range found in a query into a packed bitmap of allowed FAISS ids for
+    IDSelectorBitmap.
+    """
+
+    def __init__(self, metadatas: List[dict]):
+        self.size = len(metadatas)
+        masks: Dict[Tuple[str, ...], np.ndarray] = defaultdict(lambda: np.zeros(self.size, dtype=bool))
+        self.prices = np.full(self.size, np.nan, dtype=np.float32)
+        self.product_ids = np.full(self.size, -1, dtype=np.int64)
+        for position, metadata in enumerate(metadatas):
+            self.prices[position] = _price(metadata.get("price"))
+            if isinstance(metadata.get("product_id"), int):
+                self.product_ids[position] = metadata["product_id"]
+            for attribute in FILTER_ATTRIBUTES:
+                for value in _values(metadata.get(attribute)):
+                    # "Muffins & Quick Bread" is also findable as "muffin" and "quick bread"
+                    for part in [value] + (value.split("&") if "&" in value else []):
+                        phrase = _phrase(part)
+                        if phrase:
+                            masks[phrase][position] = True
+        self._bitsets = {phrase: np.packbits(mask, bitorder="little") for phrase, mask in masks.items()}
+        self._phrases_by_first = defaultdict(list)
+        for phrase in self._bitsets:
+            self._phrases_by_first[phrase[0]].append(phrase)
+        for phrases in self._phrases_by_first.values():
+            phrases.sort(key=len, reverse=True)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore) -> "MetadataFilterIndex":
+        # Bit i is FAISS id i: the position for a plain index, the chunk id for an id-mapped one
+        if hasattr(vectorstore.docstore, "metadatas"):
+            # SQLiteDocstore: one scan of the metadata column instead of a lookup per chunk
+            rows = list(vectorstore.docstore.metadatas())
+        else:
+            rows = [(vector_id, vectorstore.docstore.search(docstore_id).metadata)
+                    for vector_id, docstore_id in vectorstore.index_to_docstore_id.items()]
+        metadatas = [{} for _ in range(max((vector_id for vector_id, _ in rows), default=-1) + 1)]
+        for vector_id, metadata in rows:
+            metadatas[vector_id] = metadata
+        return cls(metadatas)
+
+    def parse(self, query: str) -> Dict[str, object]:
+        """Attribute terms (longest catalog phrases first) and price range mentioned in the query."""
+        words = [_singular(token) for token, _, _ in tokenize(query)]
+        terms, position = [], 0
+        while position < len(words):
+            match = next((phrase for phrase in self._phrases_by_first.get(words[position], ())
+                          if tuple(words[position:position + len(phrase)]) == phrase), None)
+            if match and match not in terms and match not in GENERIC_TERMS:
+                terms.append(match)
+            position += len(match) if match else 1
+        min_price, max_price = parse_price_range(query)
+        return {"terms": terms, "min_price": min_price, "max_price": max_price}
+
+    def select(self, constraints: Dict[str, object]) -> Optional[np.ndarray]:
+        """Packed little-endian bitmap of allowed chunks (AND across terms and price), or None if unconstrained."""
+        bits = None
+        for term in constraints.get("terms", []):
+            term_bits = self._bitsets.get(tuple(term))
+            if term_bits is None:
+                continue
+            bits = term_bits.copy() if bits is None else np.bitwise_and(bits, term_bits, out=bits)
+        min_price, max_price = constraints.get("min_price"), constraints.get("max_price")
+        if min_price is not None or max_price is not None:
+            with np.errstate(invalid="ignore"):
+                in_range = ~np.isnan(self.prices)
+                if min_price is not None:
+                    in_range &= self.prices >= min_price
+                if max_price is not None:
+                    in_range &= self.prices <= max_price
+            price_bits = np.packbits(in_range, bitorder="little")
+            bits = price_bits if bits is None else np.bitwise_and(bits, price_bits, out=bits)
+        return bits
+
+    def count(self, bits: np.ndarray) -> int:
+        return int(np.unpackbits(bits, count=self.size, bitorder="little").sum())
+
+    def allowed_products(self, bits: np.ndarray) -> set:
+        mask = np.unpackbits(bits, count=self.size, bitorder="little").astype(bool)
+        return set(self.product_ids[mask].tolist())
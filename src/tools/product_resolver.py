@@ -0,0 +1,148 @@
+import os
+import re
+import math
+import heapq
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from src.config import Config
+from src.db.sql_service import SQLService
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Words that say nothing about which product a question is about
+STOP_WORDS = {
+    "a", "an", "and", "are", "about", "any", "can", "cost", "costs", "do", "does", "for", "have", "how", "i",
+    "in", "is", "it", "me", "much", "of", "on", "or", "price", "show", "tell", "that", "the", "them", "these",
+    "this", "those", "to", "what", "which", "with", "you", "your",
+}
+
+# Words that point back at a product from the previous turn
+REFERENCE_WORDS = {"it", "this", "that", "them", "these", "those", "one"}
+
+# Questions this short right after a product question are read as follow-ups ("and the price?")
+FOLLOWUP_MAX_WORDS = 5
+
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """Lowercased alphanumeric tokens with their (start, end) offsets in the original text."""
+    return [(m.group(), m.start(), m.end()) for m in _TOKEN.finditer(text.lower())]
+
+
+def mentions_reference(text: str) -> bool:
+    return any(token in REFERENCE_WORDS for token, _, _ in tokenize(text))
+
+
+def is_followup(text: str, last_product_query: str) -> bool:
+    """
+    Whether text may refer back to last_product_query: it names a reference word or is short.
+    The one follow-up rule shared by routing, retrieval and the answer cache.
+    """
+    return bool(last_product_query) and (mentions_reference(text) or len(text.split()) <= FOLLOWUP_MAX_WORDS)
+
+
+def trigrams(token: str) -> List[str]:
+    padded = f" {token} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class ProductNameResolver:
+    """
+    In-memory index over product names, built from the products table and rebuilt when the
+    database file changes. top_k() ranks names against free text by idf-weighted character
+    trigrams, so misspellings and partial names still match; find_mentions() locates names
+    that appear verbatim in a text.
+    """
+
+    def __init__(self, sql_service: SQLService = None, top_k: int = None):
+        self.sql_service = sql_service or SQLService()
+        self.default_top_k = int(os.environ.get('PRODUCT_RESOLVER_TOP_K', top_k or Config.PRODUCT_RESOLVER_TOP_K))
+        self._lock = threading.Lock()
+        self._version = None
+        self.names: List[str] = []
+        self.refresh()
+
+    def refresh(self):
+        """Rebuilds the index if the products database changed since the last build."""
+        version = self.sql_service.data_version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            results, _ = self.sql_service.execute_query("SELECT name FROM products")
+            self._build(sorted({row[0] for row in results if row[0]}))
+            self._version = version
+
+    def _build(self, names: List[str]):
+        postings: Dict[str, List[int]] = defaultdict(list)
+        name_grams = []
+        # first token -> [(token tuple, name index)], longest names first for greedy matching
+        phrases: Dict[str, List[Tuple[Tuple[str, ...], int]]] = defaultdict(list)
+        for i, name in enumerate(names):
+            tokens = tuple(token for token, _, _ in tokenize(name))
+            grams = {gram for token in tokens for gram in trigrams(token)}
+            name_grams.append(grams)
+            for gram in grams:
+                postings[gram].append(i)
+            if tokens:
+                phrases[tokens[0]].append((tokens, i))
+        for candidates in phrases.values():
+            candidates.sort(key=lambda item: len(item[0]), reverse=True)
+        total = len(names) or 1
+        idf = {gram: math.log(1 + total / len(ids)) for gram, ids in postings.items()}
+        norms = [math.sqrt(sum(idf[gram] ** 2 for gram in grams)) or 1.0 for grams in name_grams]
+        # Swap everything in at once so concurrent readers never see a half-built index
+        self.names, self._postings, self._idf, self._norms, self._phrases = names, dict(postings), idf, norms, dict(phrases)
+
+    def top_k(self, text: str, k: int = None) -> List[Tuple[str, float]]:
+        """Up to k (name, score) pairs ranked by similarity to text; scores are in [0, 1]."""
+        self.refresh()
+        k = k or self.default_top_k
+        query_grams = {gram for token, _, _ in tokenize(text) if token not in STOP_WORDS for gram in trigrams(token)}
+        query_grams = [gram for gram in query_grams if gram in self._idf]
+        if not query_grams:
+            return []
+        scores: Dict[int, float] = defaultdict(float)
+        for gram in query_grams:
+            weight = self._idf[gram] ** 2
+            for i in self._postings[gram]:
+                scores[i] += weight
+        query_norm = math.sqrt(sum(self._idf[gram] ** 2 for gram in query_grams))
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1] / self._norms[item[0]])
+        return [(self.names[i], score / (self._norms[i] * query_norm)) for i, score in best]
+
+    def find_mentions(self, text: str) -> List[Tuple[int, int, str]]:
+        """Non-overlapping (start, end, name) spans of product names written out in text, in order."""
+        self.refresh()
+        tokens = tokenize(text)
+        words = [token for token, _, _ in tokens]
+        mentions, position = [], 0
+        while position < len(tokens):
+            match = None
+            for phrase, i in self._phrases.get(words[position], ()):
+                if tuple(words[position:position + len(phrase)]) == phrase:
+                    match = (phrase, i)
+                    break
+            if match:
+                phrase, i = match
+                mentions.append((tokens[position][1], tokens[position + len(phrase) - 1][2], self.names[i]))
+                position += len(phrase)
+            else:
+                position += 1
+        return mentions
+
+    def resolve_reference(self, last_answer: str = "", last_query: str = "") -> Optional[str]:
+        """
+        The product a follow-up like "how much is it?" refers to: the first product named in the
+        previous answer, else in the previous question, else its closest fuzzy match.
+        """
+        for text in (last_answer, last_query):
+            mentions = self.find_mentions(text or "")
+            if mentions:
+                return mentions[0][2]
+        matches = self.top_k(last_query or "", k=1)
+        if matches and matches[0][1] >= float(os.environ.get('PRODUCT_RESOLVER_MIN_SCORE', Config.PRODUCT_RESOLVER_MIN_SCORE)):
+            return matches[0][0]
+        return None
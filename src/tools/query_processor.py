@@ -6,11 +6,19 @@ load_dotenv(dotenv_path=Config.DOTENV_PATH)
 from src.utils.prompt_service import PromptService
 from src.db.sql_service import SQLService
 from src.utils.result_formatter import ResultFormatter
+from src.utils.turn_budget import llm_call_allowed
+from src.utils.example_selector import get_example_selector
+from src.tools.product_resolver import ProductNameResolver, mentions_reference
+from src.tools.sql_template_cache import SQLTemplateCache, prompt_fingerprint
+from src.utils import telemetry
+from src.utils.telemetry import get_logger
 from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
+import asyncio
 import json
 import re
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+logger = get_logger("query_processor")
 
 from src.config import Config
 
@@ -21,18 +29,31 @@ class IntelligentQueryProcessor:
         self.db_path = db_path or Config.DB_PATH
         self.sql_service = sql_service or SQLService(db_path or Config.DB_PATH)
         self.result_formatter = result_formatter or ResultFormatter()
-        self.product_names = self.get_all_product_names()
+        self.product_resolver = ProductNameResolver(self.sql_service)
+        self.sql_examples = get_example_selector("analyze_intent_and_generate_sql.txt")
+        self.template_cache = None
+        if os.environ.get('SQL_TEMPLATE_CACHE_ENABLED', str(Config.SQL_TEMPLATE_CACHE_ENABLED)).lower() in ("1", "true", "yes"):
+            prompt_version = prompt_fingerprint(self.prompt_service.get_prompt("analyze_intent_and_generate_sql.txt") + self.sql_examples.fingerprint)
+            self.template_cache = SQLTemplateCache(self.product_resolver, prompt_version=prompt_version)
 
     def get_all_product_names(self) -> List[str]:
-        sql = "SELECT name FROM products"
-        results, _ = self.sql_service.execute_query(sql)
-        return [row[0] for row in results]
+        self.product_resolver.refresh()
+        return list(self.product_resolver.names)
 
-    def analyze_intent_and_generate_sql(self, query: str) -> Dict[str, Any]:
-        product_names_str = "; ".join(self.product_names[:100])
-        prompt_template = self.prompt_service.get_prompt("analyze_intent_and_generate_sql.txt")
-        prompt = ChatPromptTemplate.from_template(prompt_template)
-        response = self.llm.invoke(prompt.format(product_names_str=product_names_str, query=query)).content
+    def candidate_product_names(self, query: str) -> List[str]:
+        """Names written out in the query, then the closest fuzzy matches, up to the resolver's top-k."""
+        candidates = [name for _, _, name in self.product_resolver.find_mentions(query)]
+        for name, _ in self.product_resolver.top_k(query):
+            if name not in candidates:
+                candidates.append(name)
+        return candidates[:self.product_resolver.default_top_k]
+
+    def build_intent_prompt(self, query: str) -> str:
+        product_names_str = "; ".join(self.candidate_product_names(query)) or "(no close matches)"
+        return self.prompt_service.get_template("analyze_intent_and_generate_sql.txt").format(
+            examples=self.sql_examples.render(query), product_names_str=product_names_str, query=query)
+
+    def parse_intent_response(self, response: str, query: str) -> Dict[str, Any]:
         try:
             json_match = re.search(r'\{.*\}', response, re.DOTALL)
             if json_match:
@@ -47,7 +68,7 @@ class IntelligentQueryProcessor:
                     "sql": ""
                 }
         except Exception as e:
-            print("Error parsing LLM response:", e)
+            logger.warning("Error parsing LLM response: %s", e)
             return {
                 "analysis": {
                 "intent": ["search"],
@@ -57,11 +78,44 @@ class IntelligentQueryProcessor:
                 "sql": ""
             }
 
-    def execute_query(self, sql: str) -> Tuple[List[Tuple], List[str]]:
-        print(f"[DEBUG] Executing SQL: {sql}")
-        results, columns = self.sql_service.execute_query(sql)
-        print(f"[DEBUG] SQL Results: {results}")
-        print(f"[DEBUG] SQL Columns: {columns}")
+    def cached_intent(self, query: str) -> Optional[Dict[str, Any]]:
+        """Intent + parameterised SQL from a previously seen query of the same shape, if any."""
+        if self.template_cache is None:
+            return None
+        cached = self.template_cache.lookup(query)
+        telemetry.cache_lookup("sql_template", bool(cached))
+        if cached:
+            logger.info("SQL template cache hit: %s %s", cached['sql'], cached['params'])
+        return cached
+
+    def remember_intent(self, query: str, intent_sql_data: Dict[str, Any]):
+        if self.template_cache is not None and intent_sql_data.get("sql"):
+            self.template_cache.store(query, intent_sql_data)
+
+    def analyze_intent_and_generate_sql(self, query: str) -> Dict[str, Any]:
+        cached = self.cached_intent(query)
+        if cached:
+            return cached
+        response = self.llm.invoke(self.build_intent_prompt(query)).content
+        intent_sql_data = self.parse_intent_response(response, query)
+        self.remember_intent(query, intent_sql_data)
+        return intent_sql_data
+
+    async def aanalyze_intent_and_generate_sql(self, query: str) -> Dict[str, Any]:
+        cached = self.cached_intent(query)
+        if cached:
+            return cached
+        prompt = await asyncio.to_thread(self.build_intent_prompt, query)
+        response = (await self.llm.ainvoke(prompt)).content
+        intent_sql_data = self.parse_intent_response(response, query)
+        await asyncio.to_thread(self.remember_intent, query, intent_sql_data)
+        return intent_sql_data
+
+    def execute_query(self, sql: str, params: Sequence = ()) -> Tuple[List[Tuple], List[str]]:
+        logger.debug("Executing SQL: %s %s", sql, list(params) if params else '')
+        results, columns = self.sql_service.execute_query(sql, params)
+        logger.debug("SQL Results: %s", results)
+        logger.debug("SQL Columns: %s", columns)
         return results, columns
 
     def is_count_query(self, sql: str) -> bool:
@@ -85,31 +139,35 @@ class IntelligentQueryProcessor:
         """
         Formats SQL query results using the unified format_results.txt prompt, which now includes all rules for single product, list, count, and follow-up queries.
         """
+        if not llm_call_allowed():
+            logger.info("Turn budget exhausted: formatting results without the LLM")
+            return self.result_formatter.format_without_llm(results, columns, total_count=total_count)
         return self.result_formatter.format_results(results, columns, query, intent_data, total_count=total_count, llm=self.llm, context_info=context_info)
 
-    def process_query(self, query: str, context: Dict[str, str] = None) -> str:
+    async def aformat_results(self, results: list, columns: list, query: str, intent_data: dict, total_count: int = None, context_info: str = "") -> str:
+        if not llm_call_allowed():
+            logger.info("Turn budget exhausted: formatting results without the LLM")
+            return self.result_formatter.format_without_llm(results, columns, total_count=total_count)
+        return await self.result_formatter.aformat_results(results, columns, query, intent_data, total_count=total_count, llm=self.llm, context_info=context_info)
+
+    def prepare_query(self, query: str, context: Dict[str, str] = None) -> Tuple[str, str, str]:
+        """Resolves follow-up references and returns (corrected_query, enhanced_query, context_info)."""
         corrected_query = query
-        print(f"Original: {query} | Corrected: {corrected_query}")
-        correction_note = ""
-        if corrected_query.lower() != query.lower():
-            correction_note = f"(Corrected: '{corrected_query}')\n"
+        logger.info("Original: %s | Corrected: %s", query, corrected_query)
         
         # Enhanced query processing for follow-up questions
         enhanced_query = corrected_query
         specific_product = None
         context_info = ""
         
-        if context and context.get("last_product_answer"):
-            last_answer = context.get("last_product_answer", "")
-            if "**" in last_answer:
-                product_matches = re.findall(r'\*\*([^*]+)\*\*: \*\*\\$', last_answer)
-                if product_matches:
-                    specific_product = product_matches[0].strip()
-                    print(f"Extracted specific product: {specific_product}")
+        if context and (context.get("last_product_answer") or context.get("last_product_query")):
+            specific_product = context.get("referenced_product") or self.product_resolver.resolve_reference(
+                context.get("last_product_answer", ""), context.get("last_product_query", ""))
+            if specific_product:
+                logger.info("Resolved referenced product: %s", specific_product)
         
         if context and context.get("last_product_query"):
-            reference_words = ["it", "this", "that", "them", "these", "those"]
-            if any(word in corrected_query.lower() for word in reference_words):
+            if mentions_reference(corrected_query):
                 if specific_product:
                     enhanced_query = f"{corrected_query} (referring to specific product: {specific_product})"
                 else:
@@ -117,55 +175,72 @@ class IntelligentQueryProcessor:
             context_info = f"Previous question: {context['last_product_query']}\nPrevious answer: {context.get('last_product_answer', '')}\n"
             if specific_product:
                 context_info += f"Specific product being referenced: {specific_product}\n"
-        
-        intent_sql_data = self.analyze_intent_and_generate_sql(enhanced_query)
-        sql = intent_sql_data.get("sql", "")
-        print(f"Generated SQL: {sql}")
-        
+        return corrected_query, enhanced_query, context_info
+
+    def fetch_results(self, sql: str, intent_sql_data: Dict[str, Any]) -> Tuple[List[Tuple], List[str], int]:
+        """Runs the generated SQL, plus the COUNT helpers around it, and returns (results, columns, total_count)."""
+        params = tuple(intent_sql_data.get("params", ()))
         # Check if this is a count query
         if self.is_count_query(sql):
-            print(f"[DEBUG] Detected COUNT query: {sql}")
-            count_results, count_columns = self.execute_query(sql)
+            logger.debug("Detected COUNT query: %s", sql)
+            count_results, count_columns = self.execute_query(sql, params)
             
             if count_results and len(count_results) > 0 and count_results[0][0] == 1:
-                print(f"[DEBUG] COUNT query returned 1 result, converting to SELECT *")
+                logger.debug("COUNT query returned 1 result, converting to SELECT *")
                 # Convert count query to select all query
                 select_all_sql = self.convert_count_to_select_all(sql)
-                print(f"[DEBUG] Converted to SELECT * query: {select_all_sql}")
+                logger.debug("Converted to SELECT * query: %s", select_all_sql)
                 
                 # Execute the SELECT * query
-                results, columns = self.execute_query(select_all_sql)
-                response = self.format_results(results, columns, corrected_query, intent_sql_data, total_count=1, context_info=context_info)
-            else:
-                # Execute the original count query
-                results, columns = count_results, count_columns
-                response = self.format_results(results, columns, corrected_query, intent_sql_data, total_count=None, context_info=context_info)
+                results, columns = self.execute_query(select_all_sql, params)
+                return results, columns, 1
+            # Execute the original count query
+            return count_results, count_columns, None
+
+        # Original logic for non-count queries
+        is_list_request = 'search' in intent_sql_data.get('analysis', {}).get('intent', []) and 'count' not in intent_sql_data.get('analysis', {}).get('intent', [])
+        total_count = None
+        if is_list_request:
+            list_sql = sql
+            count_sql = ""
+            if " from " in list_sql.lower():
+                from_part = list_sql.lower().split(" from ", 1)[1]
+                if " order by " in from_part:
+                    from_part = from_part.split(" order by ", 1)[0]
+                if " limit " in from_part:
+                    from_part = from_part.split(" limit ", 1)[0]
+                count_sql = f"SELECT COUNT(id) FROM {from_part}"
+            if count_sql:
+                # ORDER BY / LIMIT placeholders come last, so the WHERE params are a prefix
+                count_results, _ = self.execute_query(count_sql, params[:count_sql.count("?")])
+                if count_results and count_results[0]:
+                    total_count = count_results[0][0]
+        results, columns = self.execute_query(sql, params)
+        return results, columns, total_count
+
+    def process_query(self, query: str, context: Dict[str, str] = None) -> str:
+        corrected_query, enhanced_query, context_info = self.prepare_query(query, context)
+        intent_sql_data = self.analyze_intent_and_generate_sql(enhanced_query)
+        sql = intent_sql_data.get("sql", "")
+        logger.info("Generated SQL: %s", sql)
+        if sql:
+            results, columns, total_count = self.fetch_results(sql, intent_sql_data)
+            response = self.format_results(results, columns, corrected_query, intent_sql_data, total_count=total_count, context_info=context_info)
         else:
-            # Original logic for non-count queries
-            is_list_request = 'search' in intent_sql_data.get('analysis', {}).get('intent', []) and 'count' not in intent_sql_data.get('analysis', {}).get('intent', [])
-            total_count = None
-            results, columns = [], []
-            if is_list_request and sql:
-                list_sql = sql
-                count_sql = ""
-                if " from " in list_sql.lower():
-                    from_part = list_sql.lower().split(" from ", 1)[1]
-                    if " order by " in from_part:
-                        from_part = from_part.split(" order by ", 1)[0]
-                    if " limit " in from_part:
-                        from_part = from_part.split(" limit ", 1)[0]
-                    count_sql = f"SELECT COUNT(id) FROM {from_part}"
-                if count_sql:
-                    count_results, _ = self.execute_query(count_sql)
-                    if count_results and count_results[0]:
-                        total_count = count_results[0][0]
-                results, columns = self.execute_query(list_sql)
-                response = self.format_results(results, columns, corrected_query, intent_sql_data, total_count=total_count, context_info=context_info)
-            elif sql:
-                results, columns = self.execute_query(sql)
-                response = self.format_results(results, columns, corrected_query, intent_sql_data, total_count=total_count, context_info=context_info)
-            else:
-                response = "I couldn't find any matching products or information."
-        
-        print(f"[DEBUG] Final formatted response: {response}")
-        return response 
\ No newline at end of file
+            response = "I couldn't find any matching products or information."
+        logger.debug("Final formatted response: %s", response)
+        return response
+
+    async def aprocess_query(self, query: str, context: Dict[str, str] = None) -> str:
+        """Async variant of process_query(); LLM calls use the async client and SQL runs in a worker thread."""
+        corrected_query, enhanced_query, context_info = self.prepare_query(query, context)
+        intent_sql_data = await self.aanalyze_intent_and_generate_sql(enhanced_query)
+        sql = intent_sql_data.get("sql", "")
+        logger.info("Generated SQL: %s", sql)
+        if sql:
+            results, columns, total_count = await asyncio.to_thread(self.fetch_results, sql, intent_sql_data)
+            response = await self.aformat_results(results, columns, corrected_query, intent_sql_data, total_count=total_count, context_info=context_info)
+        else:
+            response = "I couldn't find any matching products or information."
+        logger.debug("Final formatted response: %s", response)
+        return response
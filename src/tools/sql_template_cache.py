@@ -0,0 +1,254 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import Config
+from src.tools.product_resolver import ProductNameResolver
+from src.utils.telemetry import get_logger
+
+logger = get_logger("sql_template_cache")
+
+_NUMBER = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+_SQL_LITERAL = re.compile(r"'((?:[^']|'')*)'")
+_SLOT_MARKER = "\u0000slot{}\u0000"
+# Bumped when templating rules change, so templates stored under the old rules are discarded
+TEMPLATE_FORMAT = 2
+# Text ending where a comparison operand starts: "price <", "BETWEEN", "BETWEEN 5 AND"
+_OPERAND = re.compile(r"(?:(?:<=|>=|<>|!=|==|=|<|>)\s*|\bBETWEEN\s+|\bBETWEEN\s+[\w.?]+\s+AND\s+)$", re.IGNORECASE)
+
+
+class SQLTemplateCache:
+    """
+    Caches LLM-generated intent + SQL as parameterised templates. A query is canonicalised by
+    replacing known product names and numbers with slots; when a later query has the same
+    canonical form, the stored SQL is reused with the new values bound as ? parameters instead of
+    asking the LLM again. Templates are persisted as JSON so they survive restarts, and are
+    discarded when the SQL generation prompt changes.
+    """
+
+    def __init__(self, resolver: ProductNameResolver, path: str = None, max_entries: int = None, prompt_version: str = ""):
+        self.path = os.environ.get('SQL_TEMPLATE_CACHE_PATH', path or Config.SQL_TEMPLATE_CACHE_PATH)
+        self.max_entries = int(os.environ.get('SQL_TEMPLATE_CACHE_MAX_ENTRIES', max_entries or Config.SQL_TEMPLATE_CACHE_MAX_ENTRIES))
+        self.prompt_version = prompt_version
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.resolver = resolver
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def canonicalize(self, query: str) -> Tuple[str, List[Tuple[str, Any]]]:
+        """Returns (key, slots); slots are ("product", name) or ("number", value) in query order."""
+        slots = []
+        spans = [(start, end, ("product", name)) for start, end, name in self.resolver.find_mentions(query)]
+        taken = [(start, end) for start, end, _ in spans]
+        for match in _NUMBER.finditer(query):
+            if not any(start <= match.start() < end for start, end in taken):
+                text = match.group()
+                spans.append((match.start(), match.end(), ("number", float(text) if "." in text else int(text))))
+        spans.sort()
+        parts, position = [], 0
+        for start, end, slot in spans:
+            parts.append(query[position:start])
+            parts.append(f" <{slot[0]}> ")
+            slots.append(slot)
+            position = end
+        parts.append(query[position:])
+        key = re.sub(r"\s+", " ", re.sub(r"[^\w<>\s%$.-]", " ", "".join(parts).lower())).strip()
+        return key, slots
+
+    def lookup(self, query: str) -> Optional[Dict[str, Any]]:
+        """Returns intent + SQL with "params" bound for this query, or None on a miss."""
+        key, slots = self.canonicalize(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or len(entry["slot_kinds"]) != len(slots) or entry["slot_kinds"] != [kind for kind, _ in slots]:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        values = [value for _, value in slots]
+        params = [param["pattern"].replace("{}", str(values[param["slot"]])) if param["pattern"] != "{}" else values[param["slot"]]
+                  for param in entry["params"]]
+        analysis = entry["analysis"]
+        for i, value in enumerate(values):
+            analysis = analysis.replace(_SLOT_MARKER.format(i), json.dumps(str(value))[1:-1])
+        return {"analysis": json.loads(analysis), "sql": entry["sql"], "params": params, "template_hit": True}
+
+    def store(self, query: str, intent_sql_data: Dict[str, Any]):
+        sql = intent_sql_data.get("sql", "")
+        if not sql or intent_sql_data.get("params"):
+            return
+        key, slots = self.canonicalize(query)
+        template = self._parameterize(sql, slots)
+        if template is None:
+            return
+        template_sql, params = template
+        analysis = json.dumps(intent_sql_data.get("analysis", {}))
+        for i, (kind, value) in enumerate(slots):
+            if kind == "product":
+                pattern = re.escape(json.dumps(value)[1:-1])
+            else:
+                pattern = rf"(?<![\w.]){re.escape(str(value))}(?![\w.])"
+            analysis = re.sub(pattern, lambda _, i=i: _SLOT_MARKER.format(i), analysis, flags=re.IGNORECASE)
+        with self._lock:
+            self._entries[key] = {
+                "sql": template_sql,
+                "params": params,
+                "slot_kinds": [kind for kind, _ in slots],
+                "analysis": analysis,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._save()
+
+    @staticmethod
+    def _parameterize(sql: str, slots: List[Tuple[str, Any]]) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Replaces every SQL literal that carries a slot value with ?, recording how to rebuild it.
+        Bare numbers are only bound where they are comparison operands ("price < 10", "BETWEEN 5
+        AND 10"); LIMIT/OFFSET and other structural numbers stay as written. Returns None when a
+        slot value cannot be located, or when a number slot cannot be told apart from another
+        occurrence of the same value, since the template would then bind the wrong literal.
+        """
+        if "?" in sql:
+            return None
+        numbers = [value for kind, value in slots if kind == "number"]
+        if len(numbers) != len(set(numbers)):
+            return None
+        params, used = [], []
+        pieces, position = [], 0
+        literal_matches = list(_SQL_LITERAL.finditer(sql))
+
+        def emit_unquoted(text):
+            out, last = [], 0
+            for match in _NUMBER.finditer(text):
+                if not _OPERAND.search(text[:match.start()]):
+                    continue
+                number = float(match.group()) if "." in match.group() else int(match.group())
+                slot = next((i for i, (kind, value) in enumerate(slots) if kind == "number" and value == number), None)
+                if slot is None:
+                    continue
+                out.append(text[last:match.start()] + "?")
+                params.append({"slot": slot, "pattern": "{}"})
+                used.append(slot)
+                last = match.end()
+            out.append(text[last:])
+            return "".join(out)
+
+        for match in literal_matches:
+            pieces.append(emit_unquoted(sql[position:match.start()]))
+            content = match.group(1).replace("''", "'")
+            slot = next((i for i, (kind, value) in enumerate(slots)
+                         if kind == "product" and value.lower() in content.lower()), None)
+            if slot is None:
+                slot = next((i for i, (kind, value) in enumerate(slots)
+                             if kind == "number" and re.search(rf"(?<![\d.]){re.escape(str(value))}(?![\d.])", content)), None)
+            if slot is None:
+                pieces.append(match.group())
+            else:
+                value = str(slots[slot][1])
+                start = content.lower().index(value.lower())
+                params.append({"slot": slot, "pattern": content[:start] + "{}" + content[start + len(value):]})
+                used.append(slot)
+                pieces.append("?")
+            position = match.end()
+        pieces.append(emit_unquoted(sql[position:]))
+        if set(used) != set(range(len(slots))):
+            return None
+        # A number bound in two places (e.g. "price < 10 OR origin_price < 10") is ambiguous
+        if any(used.count(i) > 1 for i, (kind, _) in enumerate(slots) if kind == "number"):
+            return None
+        return "".join(pieces), params
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("prompt_version") != self.prompt_version:
+            logger.info("SQL template cache discarded: SQL generation prompt changed")
+            return
+        if data.get("format") != TEMPLATE_FORMAT:
+            logger.info("SQL template cache discarded: stored with older templating rules")
+            return
+        self._entries = OrderedDict(data.get("entries", {}))
+
+    def _save(self):
+        with self._lock:
+            data = {"prompt_version": self.prompt_version, "format": TEMPLATE_FORMAT, "entries": self._entries}
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning("Could not persist SQL template cache: %s", e)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+def prompt_fingerprint(prompt_text: str) -> str:
+    return hashlib.sha1(prompt_text.encode("utf-8")).hexdigest()
+
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "data", "sql_template_golden.jsonl")
+
+
+class StaticNameResolver(ProductNameResolver):
+    """Resolver over a fixed list of product names, for checks that run without the database."""
+
+    def __init__(self, names: List[str]):
+        self.default_top_k = Config.PRODUCT_RESOLVER_TOP_K
+        self._lock = threading.Lock()
+        self._version = "static"
+        self._build(sorted(names))
+
+    def refresh(self):
+        pass
+
+
+def check(cases: List[Dict[str, Any]]) -> List[str]:
+    """Stores each case's query and SQL in an empty cache, looks up its second query and compares the bound SQL."""
+    import tempfile
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        for case in cases:
+            cache = SQLTemplateCache(StaticNameResolver(case.get("products", [])), path=os.path.join(directory, f"{len(failures)}.json"))
+            cache._entries.clear()
+            cache.store(case["store"]["query"], {"analysis": {}, "sql": case["store"]["sql"]})
+            hit = cache.lookup(case["lookup"])
+            got = {"sql": hit["sql"], "params": hit["params"]} if hit else None
+            if got != case["expected"]:
+                failures.append(f"{case['name']}:\n    expected: {case['expected']}\n    got:      {got}")
+    return failures
+
+
+def main():
+    import sys
+    import argparse
+    parser = argparse.ArgumentParser(description="Check SQL templating (which literals become parameters) against golden cases.")
+    parser.add_argument("--golden", default=GOLDEN_PATH, help="JSONL of {name, products, store: {query, sql}, lookup, expected: {sql, params} or null}")
+    args = parser.parse_args()
+
+    with open(args.golden, "r", encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    failures = check(cases)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print(f"{len(cases) - len(failures)}/{len(cases)} cases passed")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
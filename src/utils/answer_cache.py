@@ -0,0 +1,121 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import Config
+from src.db.sql_service import SQLService
+from src.utils.telemetry import get_logger
+
+logger = get_logger("answer_cache")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace so trivially different spellings share a key."""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s$.%-]", " ", query.lower())).strip()
+
+
+class SemanticAnswerCache:
+    """
+    Caches final answers keyed on query embeddings. A new query is served from the cache when its
+    cosine similarity to a cached query clears the threshold. Entries are evicted LRU-first once
+    max_entries is reached and expire after ttl_seconds. The whole cache is dropped when
+    data_version() changes: by default the SQLService's, which moves with every write to
+    products.db or its WAL, including setup_db.py publishing a new vector store generation.
+    """
+
+    def __init__(self, embed_query: Callable[[str], List[float]], threshold: float = None, max_entries: int = None,
+                 ttl_seconds: float = None, data_version: Callable[[], Any] = None):
+        self.embed_query = embed_query
+        self.threshold = float(os.environ.get('ANSWER_CACHE_SIMILARITY_THRESHOLD', threshold or Config.ANSWER_CACHE_SIMILARITY_THRESHOLD))
+        self.max_entries = int(os.environ.get('ANSWER_CACHE_MAX_ENTRIES', max_entries or Config.ANSWER_CACHE_MAX_ENTRIES))
+        self.ttl_seconds = float(os.environ.get('ANSWER_CACHE_TTL_SECONDS', ttl_seconds or Config.ANSWER_CACHE_TTL_SECONDS))
+        self.data_version = data_version or SQLService().data_version
+        # key -> (unit vector, answer, message_type, created_at)
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, str, str, float]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+        self._version = self.data_version()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_data_version(self):
+        version = self.data_version()
+        if version != self._version:
+            logger.info("Answer cache invalidated: products.db or the vector store generation changed")
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+
+    def _expire(self, now: float):
+        expired = [key for key, entry in self._entries.items() if now - entry[3] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query: str) -> Tuple[Optional[Tuple[str, str]], Optional[np.ndarray]]:
+        """
+        Returns ((answer, message_type), vector) on a hit and (None, vector) on a miss. The query vector is
+        returned so that a subsequent store() does not have to embed the same query again.
+        """
+        key = normalize_query(query)
+        with self._lock:
+            self._check_data_version()
+            self._expire(time.time())
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return (entry[1], entry[2]), entry[0]
+        vector = self._embed(query)
+        with self._lock:
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix_keys = list(self._entries.keys())
+                    self._matrix = np.stack([self._entries[k][0] for k in self._matrix_keys])
+                scores = self._matrix @ vector
+                best = int(np.argmax(scores))
+                best_key = self._matrix_keys[best]
+                if scores[best] >= self.threshold and best_key in self._entries:
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    _, answer, message_type, _ = self._entries[best_key]
+                    return (answer, message_type), vector
+            self.misses += 1
+            return None, vector
+
+    def store(self, query: str, answer: str, message_type: str, vector: np.ndarray = None):
+        if vector is None:
+            vector = self._embed(query)
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (vector, answer, message_type, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,226 @@
+import os
+import re
+import sqlite3
+import hashlib
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.config import Config
+from src.utils import telemetry
+
+logger = telemetry.get_logger("embedding_cache")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace; punctuation is kept since it can change the embedding."""
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+class EmbeddingStore:
+    """
+    Query embeddings on disk, shared by every process that opens the same directory: a float32
+    matrix file that readers memory-map, and a SQLite table mapping each key to its row. Writers
+    take SQLite's write lock, write the vector and only then insert its key, so a key is never
+    visible before its vector.
+    """
+
+    GROWTH_ROWS = 1024
+
+    def __init__(self, path: str, dim: int = None):
+        os.makedirs(path, exist_ok=True)
+        self.matrix_path = os.path.join(path, "vectors.f32")
+        self._conn = sqlite3.connect(os.path.join(path, "keys.sqlite"), timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.memmap] = None
+        self.dim = self._meta("dim") or dim
+
+    def _meta(self, name: str) -> Optional[int]:
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _map(self, rows_needed: int) -> Optional[np.memmap]:
+        """The matrix mapping, remapped when another process has grown the file past it."""
+        if self._matrix is None or self._matrix.shape[0] < rows_needed:
+            size = os.path.getsize(self.matrix_path) if os.path.exists(self.matrix_path) else 0
+            rows = size // (4 * self.dim) if self.dim else 0
+            self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(rows, self.dim)) if rows else None
+        return self._matrix
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._conn.execute("SELECT row FROM keys WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.dim = self.dim or self._meta("dim")
+            matrix = self._map(row[0] + 1)
+            return np.array(matrix[row[0]]) if matrix is not None and row[0] < matrix.shape[0] else None
+
+    def put(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._conn.execute("SELECT 1 FROM keys WHERE key = ?", (key,)).fetchone():
+                    self._conn.execute("COMMIT")
+                    return
+                self.dim = self._meta("dim") or self.dim or len(vector)
+                if len(vector) != self.dim:
+                    raise ValueError(f"Embedding has {len(vector)} dimensions but the store at {self.matrix_path} holds {self.dim}")
+                row = self._meta("rows") or 0
+                if self._map(row + 1) is None or self._matrix.shape[0] <= row:
+                    self._matrix = None
+                    with open(self.matrix_path, "ab") as f:
+                        f.truncate((row + self.GROWTH_ROWS) * self.dim * 4)
+                    self._map(row + 1)
+                self._matrix[row] = vector
+                self._matrix.flush()
+                self._conn.execute("INSERT INTO keys (key, row) VALUES (?, ?)", (key, row))
+                self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('rows', ?)", (row + 1,))
+                self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?)", (self.dim,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def __len__(self) -> int:
+        return self._meta("rows") or 0
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings client with a two-tier cache for embed_query: an in-process LRU in front
+    of an EmbeddingStore on disk. Keys are the normalised query text plus the model name, so a
+    query embedded by any worker is a disk hit for the others. embed_documents is passed through.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str = None, max_entries: int = None, path: str = None):
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.max_entries = int(os.environ.get('EMBEDDING_CACHE_SIZE', max_entries or Config.EMBEDDING_CACHE_SIZE))
+        path = os.environ.get('EMBEDDING_CACHE_DIR', path or Config.EMBEDDING_CACHE_DIR)
+        # One matrix per model, since models differ in dimension
+        self.store = EmbeddingStore(os.path.join(path, re.sub(r"[^\w.-]", "_", self.model))) if path else None
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def cached(self, text: str) -> Optional[List[float]]:
+        key = self.key(text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+        if self.store is not None:
+            stored = self.store.get(key)
+            if stored is not None:
+                vector = stored.tolist()
+                self._remember(key, vector)
+                self.disk_hits += 1
+                return vector
+        return None
+
+    def _store(self, text: str, vector: List[float]):
+        key = self.key(text)
+        self._remember(key, vector)
+        if self.store is not None:
+            try:
+                self.store.put(key, np.asarray(vector, dtype=np.float32))
+            except (sqlite3.Error, OSError, ValueError) as e:
+                logger.warning("Could not persist query embedding: %s", e)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cached(text)
+        telemetry.cache_lookup("embedding", vector is not None)
+        if vector is None:
+            self.misses += 1
+            with telemetry.span("embedding", "embed_query"):
+                vector = self.embeddings.embed_query(text)
+            self._store(text, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = await asyncio.to_thread(self.cached, text)
+        telemetry.cache_lookup("embedding", vector is not None)
+        if vector is None:
+            self.misses += 1
+            with telemetry.span("embedding", "embed_query"):
+                vector = await self.embeddings.aembed_query(text)
+            await asyncio.to_thread(self._store, text, vector)
+        return vector
+
+    def _missing(self, texts: List[str]) -> List[str]:
+        """Texts without a cached embedding, one per cache key."""
+        missing = {}
+        for text in texts:
+            key = self.key(text)
+            if key in missing:
+                continue
+            with self._lock:
+                in_memory = key in self._memory
+            if not in_memory and (self.store is None or self.store.get(key) is None):
+                missing[key] = text
+        return list(missing.values())
+
+    def _store_all(self, texts: List[str], vectors: List[List[float]]):
+        for text, vector in zip(texts, vectors):
+            self._store(text, vector)
+
+    def prefill(self, texts: List[str], batch_size: int = 512) -> int:
+        """
+        Embeds every uncached text with batched embed_documents calls and caches the vectors, so
+        the embed_query calls that follow are hits. Returns how many texts were embedded.
+        """
+        missing = self._missing(texts)
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            self._store_all(batch, self.embeddings.embed_documents(batch))
+        self.misses += len(missing)
+        return len(missing)
+
+    async def aprefill(self, texts: List[str], batch_size: int = 512) -> int:
+        missing = await asyncio.to_thread(self._missing, texts)
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            await asyncio.to_thread(self._store_all, batch, await self.embeddings.aembed_documents(batch))
+        self.misses += len(missing)
+        return len(missing)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self.store) if self.store is not None else 0,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
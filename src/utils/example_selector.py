@@ -0,0 +1,250 @@
+import os
+import re
+import json
+import math
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List
+
+import numpy as np
+
+from src.config import Config
+from src.utils.telemetry import get_logger
+
+logger = get_logger("example_selector")
+
+_TOKEN = re.compile(r"[a-z0-9$%]+")
+
+# Recent query vectors, shared by every selector so a repeated question is not embedded again
+_query_vectors: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+_query_vectors_lock = threading.Lock()
+_QUERY_VECTOR_CACHE_SIZE = 1024
+
+
+def _rescale(scores: np.ndarray) -> np.ndarray:
+    """Scores mapped onto [0, 1], so embedding and word-overlap scores can be added."""
+    spread = scores.max() - scores.min() if len(scores) else 0
+    return (scores - scores.min()) / spread if spread else np.zeros_like(scores, dtype=np.float32)
+
+
+def _unit(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class ExampleSelector:
+    """
+    Picks the k rules/examples from a prompt's example library (src/prompts/examples/<name>.jsonl)
+    that are most similar to the current query. Each library entry has an id, a few sample
+    "queries" it is meant for, and the "text" pasted into the prompt. Similarity is computed
+    with embeddings of the sample queries, which are cached on disk and recomputed only when
+    the library or the embedding model changes. Embeddings are the agent's shared ones
+    (src.nodes.get_embeddings()) unless given; a call whose embedding fails falls back to
+    idf-weighted word overlap, as does mode "lexical".
+    """
+
+    def __init__(self, name: str, k: int = 3, mode: str = None, embeddings=None, examples_dir: str = None, cache_dir: str = None):
+        self.name = name
+        self.k = int(k)
+        self.mode = os.environ.get('PROMPT_EXAMPLES_MODE', mode or Config.PROMPT_EXAMPLES_MODE)
+        self._embeddings = embeddings
+        examples_dir = os.environ.get('PROMPT_EXAMPLES_DIR', examples_dir or Config.PROMPT_EXAMPLES_DIR)
+        self.path = os.path.join(examples_dir, f"{name}.jsonl")
+        self.cache_dir = os.environ.get('PROMPT_EXAMPLES_CACHE_DIR', cache_dir or Config.PROMPT_EXAMPLES_CACHE_DIR)
+        self._lock = threading.Lock()
+        self._mtime_ns = None
+        self._vectors = None
+        self._vectors_model = None
+        self.fallbacks = 0
+        self._load()
+
+    def _load(self):
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        if mtime_ns == self._mtime_ns:
+            return
+        with self._lock:
+            if mtime_ns == self._mtime_ns:
+                return
+            with open(self.path, "r", encoding="utf-8") as f:
+                content = f.read()
+            examples = [json.loads(line) for line in content.splitlines() if line.strip()]
+            self.fingerprint = hashlib.sha1(content.encode("utf-8")).hexdigest()
+            # Row i of the sample-query matrix belongs to example owners[i]
+            self.examples = examples
+            self._samples = [sample for example in examples for sample in example["queries"]]
+            self._owners = np.array([i for i, example in enumerate(examples) for _ in example["queries"]])
+            self._build_lexical_index()
+            self._vectors = None
+            self._mtime_ns = mtime_ns
+
+    def _build_lexical_index(self):
+        documents = [set(_TOKEN.findall(" ".join(example["queries"] + [example["text"]]).lower())) for example in self.examples]
+        document_frequency = defaultdict(int)
+        for tokens in documents:
+            for token in tokens:
+                document_frequency[token] += 1
+        total = len(documents) or 1
+        self._idf = {token: math.log(1 + total / count) for token, count in document_frequency.items()}
+        self._documents = documents
+
+    @property
+    def embeddings(self):
+        if self._embeddings is not None:
+            return self._embeddings
+        # Looked up per use so that nodes.override("embeddings", ...) reaches existing selectors
+        from src import nodes
+        return nodes.get_embeddings()
+
+    @property
+    def embedding_model(self) -> str:
+        # Same model naming as CachedEmbeddings, so a different model never reuses cached vectors
+        embeddings = self.embeddings
+        return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+    def _sample_vectors(self, model: str) -> np.ndarray:
+        """Unit vectors of every sample query, read from the on-disk cache when it matches the library."""
+        vectors = self._vectors
+        if vectors is not None and self._vectors_model == model:
+            return vectors
+        digest = hashlib.sha1(f"{model}\n{self.fingerprint}".encode("utf-8")).hexdigest()[:16]
+        cache_path = os.path.join(self.cache_dir, f"{self.name}.{digest}.npy")
+        try:
+            vectors = np.load(cache_path)
+        except (OSError, ValueError):
+            vectors = _unit(self.embeddings.embed_documents(self._samples))
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                np.save(cache_path, vectors)
+            except OSError as e:
+                logger.warning("Could not cache example embeddings: %s", e)
+        self._vectors, self._vectors_model = vectors, model
+        return vectors
+
+    def _query_vector(self, text: str, model: str) -> np.ndarray:
+        key = (model, text)
+        with _query_vectors_lock:
+            if key in _query_vectors:
+                _query_vectors.move_to_end(key)
+                return _query_vectors[key]
+        vector = _unit(self.embeddings.embed_query(text))
+        with _query_vectors_lock:
+            _query_vectors[key] = vector
+            while len(_query_vectors) > _QUERY_VECTOR_CACHE_SIZE:
+                _query_vectors.popitem(last=False)
+        return vector
+
+    def _embedding_scores(self, text: str) -> np.ndarray:
+        model = self.embedding_model
+        similarities = self._sample_vectors(model) @ self._query_vector(text, model)
+        scores = np.full(len(self.examples), -1.0, dtype=np.float32)
+        np.maximum.at(scores, self._owners, similarities)
+        return scores
+
+    def _lexical_scores(self, text: str) -> np.ndarray:
+        tokens = set(_TOKEN.findall(text.lower()))
+        return np.array([sum(self._idf.get(token, 0.0) for token in tokens & document) for document in self._documents])
+
+    def select(self, text: str, k: int = None, hint: str = None) -> List[Dict[str, Any]]:
+        """
+        The k library entries most relevant to text, most relevant first. hint (e.g. the shape of
+        the SQL result) re-ranks by word overlap only, so only text is ever embedded and its
+        vector is shared with every other selection for the same question.
+        """
+        self._load()
+        k = k or self.k
+        scores = None
+        if self.mode == "embedding":
+            try:
+                scores = self._embedding_scores(text)
+            except Exception as e:
+                # Only this call falls back; the next one tries the embeddings again
+                self.fallbacks += 1
+                logger.warning("Example selection falling back to word overlap: %s", e)
+        if scores is None:
+            scores = self._lexical_scores(text)
+        if hint:
+            scores = _rescale(scores) + _rescale(self._lexical_scores(hint))
+        ranked = np.argsort(-scores, kind="stable")[:k]
+        return [self.examples[i] for i in ranked]
+
+    def render(self, text: str, k: int = None, hint: str = None) -> str:
+        return "\n\n".join(f"- {example['text']}" for example in self.select(text, k, hint))
+
+    def render_all(self) -> str:
+        self._load()
+        return "\n\n".join(f"- {example['text']}" for example in self.examples)
+
+
+_selectors: Dict[str, ExampleSelector] = {}
+_selectors_lock = threading.Lock()
+
+
+# prompt file -> (node that sends it, example library, k config attribute)
+PROMPT_LIBRARIES = {
+    "analyze_intent_and_generate_sql.txt": ("data_retrieval (SQL generation)", "analyze_intent_and_generate_sql", "SQL_PROMPT_EXAMPLES_K"),
+    "format_results.txt": ("data_retrieval (result formatting)", "format_results", "FORMAT_PROMPT_EXAMPLES_K"),
+}
+
+
+def get_example_selector(prompt_name: str) -> ExampleSelector:
+    """Shared selector for a prompt file's example library, with that prompt's configured k."""
+    _, library, k_attr = PROMPT_LIBRARIES[prompt_name]
+    with _selectors_lock:
+        if library not in _selectors:
+            _selectors[library] = ExampleSelector(library, k=int(os.environ.get(k_attr, getattr(Config, k_attr))))
+        return _selectors[library]
+
+
+def token_report(queries: List[str], mode: str = None, embeddings=None) -> List[Dict[str, Any]]:
+    """
+    Average template tokens per prompt with every example included vs with the selected ones,
+    and the mode that actually selected them (calls that fell back to word overlap are counted).
+    """
+    from src.utils.prompt_registry import count_tokens, get_prompt_registry
+    registry = get_prompt_registry()
+    report = []
+    for prompt_name, (node, library, k_attr) in PROMPT_LIBRARIES.items():
+        prompt = registry.get(prompt_name)
+        selector = ExampleSelector(library, k=int(os.environ.get(k_attr, getattr(Config, k_attr))), mode=mode, embeddings=embeddings)
+        # Per-call data (results, candidate names, history) is left empty so only the template is measured
+        empty = {variable: "" for variable in prompt.input_variables}
+        full_tokens = count_tokens(prompt.format(**dict(empty, examples=selector.render_all())))
+        selected = [count_tokens(prompt.format(**dict(empty, examples=selector.render(query), query=query))) for query in queries]
+        report.append({
+            "node": node,
+            "prompt": prompt_name,
+            "examples": len(selector.examples),
+            "k": selector.k,
+            "mode": selector.mode,
+            "fallbacks": selector.fallbacks,
+            "all_examples_tokens": full_tokens,
+            "selected_avg_tokens": sum(selected) / len(selected) if selected else 0.0,
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt token report: every example in the prompt vs the top-k selected per query.")
+    parser.add_argument("--queries", default=os.path.join(Config.PROJECT_ROOT, "src", "tools", "data", "router_eval_queries.jsonl"),
+                        help="JSONL file with a 'query' per line")
+    parser.add_argument("--mode", choices=["embedding", "lexical"], default=None, help="Override PROMPT_EXAMPLES_MODE")
+    parser.add_argument("--offline", action="store_true", help="Embed with the offline HashingEmbeddings instead of the configured model")
+    args = parser.parse_args()
+    embeddings = None
+    if args.offline:
+        from src.utils.offline_models import HashingEmbeddings
+        embeddings = HashingEmbeddings()
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = [json.loads(line)["query"] for line in f if line.strip()]
+    print(f"{'node':<36} {'prompt':<38} {'mode':<10} {'k':>3} {'all examples':>13} {'selected avg':>13} {'saved':>7} {'fallbacks':>9}")
+    for row in token_report(queries, mode=args.mode, embeddings=embeddings):
+        saved = 1 - row["selected_avg_tokens"] / row["all_examples_tokens"] if row["all_examples_tokens"] else 0.0
+        print(f"{row['node']:<36} {row['prompt']:<38} {row['mode']:<10} {row['k']:>3} {row['all_examples_tokens']:>13} "
+              f"{row['selected_avg_tokens']:>13.0f} {saved:>7.1%} {row['fallbacks']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import re
+import json
+import time
+import hashlib
+from typing import Any, Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.utils.embedding_cache import normalize_text
+from src.utils.prompt_registry import count_tokens
+
+# Deterministic stand-ins for ChatOpenAI and OpenAIEmbeddings, so the agent can run (and be
+# benchmarked) without API calls. Install them with src.nodes.override("llm"/"embeddings", ...).
+
+_WORD = re.compile(r"[a-z0-9]+")
+_REASONING_QUERY = re.compile(r"^Query: (.*)\nCurrent reasoning step:", re.MULTILINE)
+_REASONING_FLAG = re.compile(r"^- (Structured data needed|Structured data complete|Semantic search needed|Semantic search complete|"
+                             r"Has structured results|Has semantic results): (True|False)", re.MULTILINE)
+_SQL_QUERY = re.compile(r'^Query: "(.*)"\s*$', re.MULTILINE)
+_GREETING = re.compile(r"^(hi|hello|hey|thanks|thank you|who are you|good (morning|evening))\b|weather", re.IGNORECASE)
+_SEMANTIC = re.compile(r"\b(recommend|suggest|tell me about|how do i|goes well|similar|taste)\b", re.IGNORECASE)
+_STOP = {"what", "which", "show", "many", "much", "does", "have", "with", "that", "there", "the", "products", "product", "cost"}
+
+
+class HashingEmbeddings(Embeddings):
+    """Unit-norm bag-of-words vectors, each word hashed to a signed dimension: texts sharing words are close."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        # Names the vectors for caches keyed on the embedding model (CachedEmbeddings, ExampleSelector)
+        self.model = f"hashing-{dim}"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            digest = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def load_script(path: str) -> Dict[str, Dict[str, Any]]:
+    """Scripted LLM behaviour per question: {"query", "decision", "intent", "sql"} per .jsonl line, keyed by normalised query."""
+    script = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                script[normalize_text(entry["query"])] = entry
+    return script
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model that recognises the agent's prompts and replays scripted answers: the reasoning
+    decision for a question on its first pass (then gather whatever is still missing, then
+    synthesize), its SQL for analyze_intent_and_generate_sql, and short deterministic text for
+    formatting, synthesis and general chat. Questions missing from the script get a keyword
+    heuristic. Token usage is reported with count_tokens(), and latency adds a fixed delay per call.
+    """
+
+    script: Dict[str, Dict[str, Any]] = {}
+    latency: float = 0.0
+    model_name: str = "scripted"
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def entry(self, query: str) -> Dict[str, Any]:
+        query = normalize_text(query)
+        entry = self.script.get(query)
+        if entry is None:
+            # Follow-ups reach the SQL prompt as "<question> (referring to: ...)"
+            entry = next((self.script[key] for key in sorted(self.script, key=len, reverse=True) if query.startswith(key)), None)
+        return entry or self.heuristic(query)
+
+    @staticmethod
+    def heuristic(query: str) -> Dict[str, Any]:
+        if _GREETING.search(query):
+            return {"decision": {"next_action": "general_chat", "is_non_product": True, "query_type": "general"}}
+        if _SEMANTIC.search(query):
+            return {"decision": {"next_action": "gather_semantic", "needs_semantic_search": True, "is_product_question": True}}
+        words = [word for word in _WORD.findall(query) if len(word) > 3 and word not in _STOP]
+        keyword = max(words, key=len) if words else ""
+        return {"decision": {"next_action": "gather_structured", "needs_structured_data": True, "is_product_question": True},
+                "intent": ["search"], "sql": f"SELECT name, price FROM products WHERE name LIKE '%{keyword}%' ORDER BY name LIMIT 20"}
+
+    def reasoning(self, prompt: str, query: str) -> str:
+        flags = {name: value == "True" for name, value in _REASONING_FLAG.findall(prompt)}
+        if not flags.get("Has structured results") and not flags.get("Has semantic results"):
+            return json.dumps(dict({"data_sufficiency": "NONE"}, **self.entry(query)["decision"]))
+        decision = {"needs_structured_data": flags.get("Structured data needed", False),
+                    "needs_semantic_search": flags.get("Semantic search needed", False), "is_product_question": True}
+        if decision["needs_structured_data"] and not flags.get("Has structured results"):
+            return json.dumps(dict(decision, data_sufficiency="PARTIAL", next_action="gather_structured"))
+        if decision["needs_semantic_search"] and not flags.get("Has semantic results"):
+            return json.dumps(dict(decision, data_sufficiency="PARTIAL", next_action="gather_semantic"))
+        return json.dumps(dict(decision, data_sufficiency="COMPLETE", next_action="synthesize"))
+
+    def respond(self, prompt: str) -> str:
+        match = _REASONING_QUERY.search(prompt)
+        if match:
+            return self.reasoning(prompt, match.group(1))
+        queries = _SQL_QUERY.findall(prompt)
+        if queries and "Database Schema:" in prompt:
+            entry = self.entry(queries[-1])
+            return json.dumps({"analysis": {"intent": entry.get("intent", ["search"]), "entities": {}, "filters": []},
+                               "sql": entry.get("sql", "")})
+        if "Database results (JSON): " in prompt:
+            try:
+                rows, _ = json.JSONDecoder().raw_decode(prompt.rsplit("Database results (JSON): ", 1)[1])
+            except ValueError:
+                rows = []
+            rows = rows if isinstance(rows, list) else [rows]
+            names = [str(row.get("name", "")) for row in rows if isinstance(row, dict)][:5]
+            return f"Found {len(rows)} matching result(s): {', '.join(names) or 'none'}."
+        if "The user asked: " in prompt:
+            question = prompt.rsplit("The user asked: ", 1)[1].split("\n", 1)[0]
+            return f"Here is what I found about \"{question.strip()}\" in our catalog."
+        return "Happy to help! Ask me anything about our baking mixes."
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        if self.latency:
+            time.sleep(self.latency)
+        answer = self.respond(prompt)
+        input_tokens, output_tokens = count_tokens(prompt), count_tokens(answer)
+        message = AIMessage(content=answer, usage_metadata={
+            "input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens})
+        return ChatResult(generations=[ChatGeneration(message=message)])
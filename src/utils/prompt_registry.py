@@ -0,0 +1,124 @@
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict
+
+from langchain.prompts import ChatPromptTemplate
+
+from src.config import Config
+
+_PLACEHOLDER = re.compile(r"(?<!\{)\{[A-Za-z_][A-Za-z0-9_]*\}(?!\})")
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    # Resolved once per model, failures included: without a cached BPE file tiktoken tries a
+    # download, which would otherwise be retried (and time out offline) on every call
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Token count under the configured LLM's tokenizer, or a 4-characters-per-token estimate without tiktoken."""
+    encoding = _encoding(os.environ.get('LLM_MODEL', Config.LLM_MODEL))
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+
+class CompiledPrompt:
+    """A prompt file parsed once into a ChatPromptTemplate, with its token statistics."""
+
+    def __init__(self, name: str, path: str, text: str, mtime_ns: int):
+        self.name = name
+        self.path = path
+        self.text = text
+        self.mtime_ns = mtime_ns
+        self.template = ChatPromptTemplate.from_template(text)
+        self.input_variables = sorted(self.template.input_variables)
+        first_placeholder = _PLACEHOLDER.search(text)
+        # Text before the first placeholder is identical on every call and can hit the provider's prefix cache
+        self.static_prefix = text[:first_placeholder.start()] if first_placeholder else text
+        self._token_count = None
+        self._static_prefix_tokens = None
+
+    @property
+    def token_count(self) -> int:
+        if self._token_count is None:
+            self._token_count = count_tokens(self.text)
+        return self._token_count
+
+    @property
+    def static_prefix_tokens(self) -> int:
+        if self._static_prefix_tokens is None:
+            self._static_prefix_tokens = count_tokens(self.static_prefix)
+        return self._static_prefix_tokens
+
+    def format(self, **kwargs) -> str:
+        return self.template.format(**kwargs)
+
+
+class PromptRegistry:
+    """
+    Loads and compiles each prompt template once and shares it across nodes and services.
+    A template is recompiled when its file's mtime changes, so prompt edits are picked up
+    without restarting the app.
+    """
+
+    def __init__(self, prompts_dir: str = None):
+        self.prompts_dir = os.environ.get('PROMPTS_DIR', prompts_dir or Config.PROMPTS_DIR)
+        self._prompts: Dict[str, CompiledPrompt] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CompiledPrompt:
+        path = os.path.join(self.prompts_dir, name)
+        mtime_ns = os.stat(path).st_mtime_ns
+        prompt = self._prompts.get(name)
+        if prompt is None or prompt.mtime_ns != mtime_ns:
+            with self._lock:
+                prompt = self._prompts.get(name)
+                if prompt is None or prompt.mtime_ns != mtime_ns:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        prompt = CompiledPrompt(name, path, f.read(), mtime_ns)
+                    self._prompts[name] = prompt
+        return prompt
+
+    def get_text(self, name: str) -> str:
+        return self.get(name).text
+
+    def names(self):
+        return sorted(f for f in os.listdir(self.prompts_dir) if f.endswith(".txt"))
+
+    def token_counts(self) -> Dict[str, Dict[str, int]]:
+        counts = {}
+        for name in self.names():
+            prompt = self.get(name)
+            counts[name] = {"tokens": prompt.token_count, "static_prefix_tokens": prompt.static_prefix_tokens}
+        return counts
+
+
+_registries: Dict[str, PromptRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_prompt_registry(prompts_dir: str = None) -> PromptRegistry:
+    """Returns the shared registry for a prompts directory (the configured one by default)."""
+    key = os.path.abspath(os.environ.get('PROMPTS_DIR', prompts_dir or Config.PROMPTS_DIR))
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = PromptRegistry(key)
+        return _registries[key]
+
+
+if __name__ == "__main__":
+    registry = get_prompt_registry()
+    print(f"{'prompt':<40} {'tokens':>8} {'static prefix':>14}")
+    for name, counts in registry.token_counts().items():
+        print(f"{name:<40} {counts['tokens']:>8} {counts['static_prefix_tokens']:>14}")
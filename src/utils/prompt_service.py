@@ -1,13 +1,17 @@
 import os
 from src.config import Config
+from src.utils.prompt_registry import CompiledPrompt, get_prompt_registry
 
 class PromptService:
     def __init__(self, prompts_dir=None):
         # Use env var if set, else argument, else config
         prompts_dir = os.environ.get('PROMPTS_DIR', prompts_dir or Config.PROMPTS_DIR)
         self.prompts_dir = prompts_dir
+        self.registry = get_prompt_registry(prompts_dir)
 
     def get_prompt(self, name: str) -> str:
-        path = os.path.join(self.prompts_dir, name)
-        with open(path, 'r', encoding='utf-8') as f:
-            return f.read() 
\ No newline at end of file
+        return self.registry.get_text(name)
+
+    def get_template(self, name: str) -> CompiledPrompt:
+        """Compiled template for a prompt file, shared with every other user of the registry."""
+        return self.registry.get(name)
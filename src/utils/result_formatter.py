@@ -1,32 +1,171 @@
+import os
 import json
-from langchain.prompts import ChatPromptTemplate
 from src.utils.prompt_service import PromptService
+from src.utils.example_selector import get_example_selector
+from src.config import Config
+from src.utils.telemetry import get_logger
 import re
+import asyncio
+
+logger = get_logger("result_formatter")
+
+# Columns the fast formatter knows how to render; anything else (descriptions, ingredients, ...) goes to the LLM
+FAST_FORMAT_COLUMNS = {"id", "name", "price", "origin_price", "max_quantity", "url"}
+# Questions whose answer needs wording beyond the rows themselves
+LLM_ONLY_PATTERN = re.compile(r"\b(compare|comparison|difference|differ|better|recommend|suggest|why|describe|explain)\b", re.IGNORECASE)
+# Columns that count matching rows (COUNT(*), COUNT(id), COUNT(name) or an alias of one); other
+# aggregates such as SUM(review_count) or COUNT(DISTINCT category) are not product counts
+ROW_COUNT_COLUMN = re.compile(r"^(count\(\s*(\w+\.)?(\*|1|id|name)\s*\)|count|product_count|products_count|num_products|total_products)$", re.IGNORECASE)
+# Single-value columns -> sentence
+SINGLE_VALUE_SENTENCES = {
+    "price": "The price is **{price}**.",
+    "max_quantity": "There are {value} available.",
+    "review_count": "It has {value} reviews.",
+    "review_rating": "The review rating is {value}.",
+}
+
+
+def format_price(value) -> str:
+    return f"${value:,.2f}" if isinstance(value, (int, float)) else f"${value}"
+
 
 class ResultFormatter:
     def __init__(self, prompt_service=None):
         self.prompt_service = prompt_service or PromptService()
+        self.examples = get_example_selector("format_results.txt")
+        rules = os.environ.get('FAST_FORMAT_RULES')
+        self.fast_format_rules = [rule.strip() for rule in rules.split(",") if rule.strip()] if rules is not None else list(Config.FAST_FORMAT_RULES)
+        self.fast_format_max_rows = int(os.environ.get('FAST_FORMAT_MAX_LIST_ROWS', Config.FAST_FORMAT_MAX_LIST_ROWS))
 
-    def format_results(self, results: list, columns: list, query: str, intent_data: dict, total_count: int = None, llm=None, context_info: str = "") -> str:
-        """
-        Formats SQL query results using the unified format_results.txt prompt, which now includes all rules for single product, list, count, and follow-up queries.
-        """
-        if not results:
-            return "I couldn't find any matching products or information."
-        if llm is None:
-            raise ValueError("LLM instance must be provided for formatting results.")
+    @staticmethod
+    def describe_results(results: list, columns: list) -> str:
+        """Short description of the result shape, used with the query to pick formatting rules."""
+        if len(results) == 1 and len(columns) == 1:
+            if "count" in columns[0].lower():
+                return "single count value" + (" of zero" if not results[0][0] else "")
+            return "single value"
+        if len(results) == 1:
+            return "single product details"
+        if columns and all(isinstance(row[0], str) and row[0].startswith("[") for row in results[:5]):
+            return "distinct values from stringified list fields" if len(columns) == 1 else "grouped counts by array field"
+        return f"list of {len(results)} products"
+
+    def build_prompt(self, results: list, columns: list, query: str, intent_data: dict, total_count: int = None, context_info: str = "") -> str:
         formatted_data_list = [dict(zip(columns, row)) for row in results[:20]]
         formatted_data = json.dumps(formatted_data_list, indent=2)
 
         intent = intent_data.get("intent", []) if "intent" in intent_data else intent_data.get("analysis", {}).get("intent", [])
-        prompt_template = self.prompt_service.get_prompt("format_results.txt")
-        prompt = ChatPromptTemplate.from_template(prompt_template)
-        response = llm.invoke(prompt.format(
+        # Embeds the bare query (already cached from SQL example selection); the shape only re-ranks
+        examples = self.examples.render(query, hint=f"result shape: {self.describe_results(results, columns)}")
+        return self.prompt_service.get_template("format_results.txt").format(
+            examples=examples,
             context_info=context_info,
             query=query,
             raw_answer=formatted_data,
             intent=intent,
             total_count=total_count
-        )).content.strip()
+        )
+
+    @staticmethod
+    def product_line(record: dict) -> str:
+        """'**Name**: **$Price**' plus the original price and stock when present."""
+        parts = [f"**{record['name']}**"] if record.get("name") else []
+        if record.get("price") is not None:
+            price = f"**{format_price(record['price'])}**"
+            origin_price = record.get("origin_price")
+            if origin_price and origin_price != record["price"]:
+                price += f" ~~{format_price(origin_price)}~~ original price"
+            parts.append(price)
+        line = ": ".join(parts)
+        if record.get("max_quantity") is not None:
+            stock = f"{record['max_quantity']} available" if record["max_quantity"] else "Currently out of stock"
+            line = f"{line} — {stock}" if line else stock
+        return line
+
+    def fast_format(self, results: list, columns: list, query: str, total_count: int = None):
+        """
+        Renders simple result shapes (a count, a single value, one product's price/stock, a short
+        price/stock list) without the LLM. Returns None when no enabled rule applies.
+        """
+        if not results or LLM_ONLY_PATTERN.search(query or ""):
+            return None
+        records = [dict(zip(columns, row)) for row in results]
+        single_cell = len(results) == 1 and len(columns) == 1
+        simple = set(columns) <= FAST_FORMAT_COLUMNS and "name" in columns and ("price" in columns or "max_quantity" in columns)
+        for rule in self.fast_format_rules:
+            if rule == "count" and single_cell and ROW_COUNT_COLUMN.match(columns[0].strip()) and isinstance(results[0][0], int):
+                count = results[0][0]
+                if count == 0:
+                    return "There are no products that match your criteria."
+                return "There is 1 product that matches your criteria." if count == 1 else f"There are {count} products that match your criteria."
+            if rule == "single_value" and single_cell and columns[0] in SINGLE_VALUE_SENTENCES and results[0][0] is not None:
+                value = results[0][0]
+                if columns[0] == "max_quantity" and value == 0:
+                    return "It is currently out of stock."
+                return SINGLE_VALUE_SENTENCES[columns[0]].format(value=value, price=format_price(value))
+            if rule == "single_price" and simple and len(records) == 1:
+                return self.product_line(records[0])
+            if rule == "stock_list" and simple and 1 < len(records) <= self.fast_format_max_rows:
+                total = total_count if total_count and total_count > len(records) else len(records)
+                # "available" only when stock was queried; a price list says nothing about stock
+                header = f"There are {total} products available:" if "max_quantity" in columns else f"There are {total} matching products:"
+                lines = [header] + [f"- {self.product_line(record)}" for record in records]
+                if total > len(records):
+                    lines.append(f"\nShowing the first {len(records)}.")
+                return "\n".join(lines)
+        return None
+
+    def format_without_llm(self, results: list, columns: list, total_count: int = None) -> str:
+        """Plain markdown rendering of SQL rows, used when no LLM call is available for formatting."""
+        if not results:
+            return "I couldn't find any matching products or information."
+        fast = self.fast_format(results, columns, "", total_count=total_count)
+        if fast is not None:
+            return fast
+        if len(results) == 1 and len(columns) == 1:
+            return f"**{results[0][0]}**"
+        lines = []
+        for row in results[:20]:
+            record = dict(zip(columns, row))
+            name = record.pop("name", None)
+            price = record.pop("price", None)
+            line = f"**{name}**" if name else ""
+            if price is not None:
+                line = f"{line}: **${price}**" if line else f"**${price}**"
+            if not line:
+                line = ", ".join(f"{key}: {value}" for key, value in record.items())
+            lines.append(f"- {line}")
+        if total_count and total_count > len(lines):
+            lines.append(f"\nShowing {len(lines)} of {total_count} results.")
+        return "\n".join(lines)
+
+    def format_results(self, results: list, columns: list, query: str, intent_data: dict, total_count: int = None, llm=None, context_info: str = "") -> str:
+        """
+        Formats SQL query results using the unified format_results.txt prompt, which now includes all rules for single product, list, count, and follow-up queries.
+        """
+        if not results:
+            return "I couldn't find any matching products or information."
+        fast = self.fast_format(results, columns, query, total_count=total_count)
+        if fast is not None:
+            logger.info("Formatted results without the LLM (fast formatter)")
+            return fast
+        if llm is None:
+            raise ValueError("LLM instance must be provided for formatting results.")
+        prompt_str = self.build_prompt(results, columns, query, intent_data, total_count=total_count, context_info=context_info)
+        response = llm.invoke(prompt_str, config={"tags": [Config.STREAM_ANSWER_TAG]}).content.strip()
         # print(f"[DEBUG] Formatter LLM response: {response}")
-        return response 
\ No newline at end of file
+        return response
+
+    async def aformat_results(self, results: list, columns: list, query: str, intent_data: dict, total_count: int = None, llm=None, context_info: str = "") -> str:
+        """Async variant of format_results()."""
+        if not results:
+            return "I couldn't find any matching products or information."
+        fast = self.fast_format(results, columns, query, total_count=total_count)
+        if fast is not None:
+            logger.info("Formatted results without the LLM (fast formatter)")
+            return fast
+        if llm is None:
+            raise ValueError("LLM instance must be provided for formatting results.")
+        prompt_str = await asyncio.to_thread(self.build_prompt, results, columns, query, intent_data, total_count=total_count, context_info=context_info)
+        response = await llm.ainvoke(prompt_str, config={"tags": [Config.STREAM_ANSWER_TAG]})
+        return response.content.strip()
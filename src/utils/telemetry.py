@@ -0,0 +1,377 @@
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.config import Config
+
+# Histogram bucket upper bounds (seconds, tokens)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+METRIC_HELP = {
+    "agent_turn_seconds": "Wall time of a whole ask() turn",
+    "agent_node_seconds": "Wall time per graph node",
+    "agent_llm_seconds": "Wall time per chat model call",
+    "agent_llm_tokens": "Tokens per chat model call",
+    "agent_sql_seconds": "Wall time per executed SQL statement",
+    "agent_faiss_seconds": "Wall time per FAISS search",
+    "agent_embedding_seconds": "Wall time per query embedding request",
+    "agent_cache_lookups_total": "Cache lookups by cache and result",
+    "agent_routes_total": "Completed turns by the sequence of nodes they ran",
+}
+
+_current_trace: ContextVar[Optional["TurnTrace"]] = ContextVar("turn_trace", default=None)
+
+
+def telemetry_enabled() -> bool:
+    return str(os.environ.get('TELEMETRY_ENABLED', Config.TELEMETRY_ENABLED)).lower() not in ("0", "false", "no")
+
+
+_logging_configured = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Logger under "agent" writing to stdout at LOG_LEVEL. Pass arguments instead of f-strings
+    (logger.debug("rows: %s", rows)) so nothing is formatted when the level is disabled.
+    """
+    global _logging_configured
+    if not _logging_configured:
+        root = logging.getLogger("agent")
+        if not root.handlers:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            root.addHandler(handler)
+            root.propagate = False
+        root.setLevel(os.environ.get('LOG_LEVEL', Config.LOG_LEVEL).upper())
+        _logging_configured = True
+    return logging.getLogger(f"agent.{name}")
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        cumulative, buckets = 0, {}
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _prometheus_labels(key: Tuple, extra: Tuple = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """Process-wide histograms and counters, plus the traces of the most recent turns."""
+
+    def __init__(self, max_traces: int = None):
+        self._histograms: Dict[str, Dict[Tuple, Histogram]] = defaultdict(dict)
+        self._counters: Dict[str, Dict[Tuple, float]] = defaultdict(dict)
+        self._lock = threading.Lock()
+        self.traces = deque(maxlen=int(os.environ.get('TELEMETRY_MAX_TRACES', max_traces or Config.TELEMETRY_MAX_TRACES)))
+
+    def observe(self, metric: str, value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            histogram = self._histograms[metric].get(key)
+            if histogram is None:
+                histogram = self._histograms[metric][key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, metric: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._counters[metric][key] = self._counters[metric].get(key, 0) + value
+
+    def add_trace(self, trace: Dict[str, Any]):
+        with self._lock:
+            self.traces.append(trace)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "histograms": {name: [dict(labels=dict(key), **histogram.to_dict()) for key, histogram in series.items()]
+                               for name, series in self._histograms.items()},
+                "counters": {name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                             for name, series in self._counters.items()},
+                "traces": list(self.traces),
+            }
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name in sorted(self._histograms):
+                lines += [f"# HELP {name} {METRIC_HELP.get(name, name)}", f"# TYPE {name} histogram"]
+                for key, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_prometheus_labels(key, (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{_prometheus_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_prometheus_labels(key)} {histogram.count}")
+            for name in sorted(self._counters):
+                lines += [f"# HELP {name} {METRIC_HELP.get(name, name)}", f"# TYPE {name} counter"]
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_prometheus_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.traces.clear()
+
+
+metrics = MetricsRegistry()
+
+
+class TurnTrace:
+    """Spans recorded while one turn runs: nodes in route order, LLM calls, SQL, FAISS and cache lookups."""
+
+    def __init__(self, query: str):
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.route: List[str] = []
+        self.iterations = 0
+        self.cache: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._lock = threading.Lock()
+
+    def add_span(self, kind: str, name: str, seconds: float, attrs: Dict[str, Any]):
+        with self._lock:
+            self.spans.append({"kind": kind, "name": name, "offset": time.perf_counter() - self._start - seconds,
+                               "seconds": seconds, **attrs})
+            if kind == "node":
+                self.route.append(name)
+                self.iterations = max(self.iterations, attrs.get("iteration_count") or 0)
+
+    def cache_lookup(self, cache: str, hit: bool):
+        with self._lock:
+            self.cache[cache]["hits" if hit else "misses"] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        totals = defaultdict(lambda: {"calls": 0, "seconds": 0.0})
+        for span in spans:
+            totals[span["kind"]]["calls"] += 1
+            totals[span["kind"]]["seconds"] += span["seconds"]
+        llm_spans = [span for span in spans if span["kind"] == "llm"]
+        return {
+            "id": self.id,
+            "query": self.query,
+            "started_at": self.started_at,
+            "seconds": time.perf_counter() - self._start,
+            "route": list(self.route),
+            "iterations": self.iterations,
+            "llm_calls": totals["llm"]["calls"],
+            "llm_seconds": totals["llm"]["seconds"],
+            "prompt_tokens": sum(span.get("prompt_tokens") or 0 for span in llm_spans),
+            "completion_tokens": sum(span.get("completion_tokens") or 0 for span in llm_spans),
+            "sql_queries": totals["sql"]["calls"],
+            "sql_seconds": totals["sql"]["seconds"],
+            "faiss_searches": totals["faiss"]["calls"],
+            "faiss_seconds": totals["faiss"]["seconds"],
+            "embedding_calls": totals["embedding"]["calls"],
+            "embedding_seconds": totals["embedding"]["seconds"],
+            "node_seconds": {span["name"]: span["seconds"] for span in spans if span["kind"] == "node"},
+            "cache": {cache: dict(counts) for cache, counts in self.cache.items()},
+            "spans": spans,
+        }
+
+
+def current_trace() -> Optional[TurnTrace]:
+    return _current_trace.get()
+
+
+def record(kind: str, name: str, seconds: float, **attrs):
+    """Adds a finished span to the histograms and to the current turn's trace."""
+    metrics.observe(f"agent_{kind}_seconds", seconds, name=name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(kind, name, seconds, attrs)
+
+
+@contextmanager
+def span(kind: str, name: str, **attrs):
+    """
+    Times the block as a span of the given kind ("node", "sql", "faiss", ...). The yielded dict
+    can be filled with attributes (row counts, ...) before the block ends.
+    """
+    if not telemetry_enabled():
+        yield attrs
+        return
+    start = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        record(kind, name, time.perf_counter() - start, **attrs)
+
+
+def cache_lookup(cache: str, hit: bool):
+    if not telemetry_enabled():
+        return
+    metrics.increment("agent_cache_lookups_total", cache=cache, result="hit" if hit else "miss")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.cache_lookup(cache, hit)
+
+
+@contextmanager
+def turn(query: str):
+    """Collects a TurnTrace for everything run inside the block (threads started with asyncio.to_thread included)."""
+    if not telemetry_enabled():
+        yield None
+        return
+    trace = TurnTrace(query)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # A streaming generator closed from another context; the trace is still recorded
+            _current_trace.set(None)
+        finish_turn(trace)
+
+
+def finish_turn(trace: TurnTrace):
+    summary = trace.summary()
+    metrics.observe("agent_turn_seconds", summary["seconds"])
+    if summary["route"]:
+        metrics.increment("agent_routes_total", route=">".join(summary["route"]))
+    metrics.add_trace(summary)
+    trace_path = os.environ.get('TELEMETRY_TRACE_PATH', Config.TELEMETRY_TRACE_PATH)
+    metrics_path = os.environ.get('TELEMETRY_METRICS_PATH', Config.TELEMETRY_METRICS_PATH)
+    try:
+        if trace_path:
+            with open(trace_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(summary, default=str) + "\n")
+        if metrics_path:
+            # Written whole and renamed, as the Prometheus node_exporter textfile collector expects
+            with open(metrics_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(metrics.to_prometheus())
+            os.replace(metrics_path + ".tmp", metrics_path)
+    except OSError as e:
+        get_logger("telemetry").warning("Could not write telemetry: %s", e)
+
+
+def export_json() -> str:
+    return json.dumps(metrics.to_dict(), indent=2, default=str)
+
+
+def export_prometheus() -> str:
+    return metrics.to_prometheus()
+
+
+def traced_node(name: str, node):
+    """Wraps a graph node so each run is a "node" span carrying the route decision and iteration count."""
+    import inspect
+
+    def attributes(state):
+        return {"iteration_count": state.get("iteration_count"), "next_action": state.get("next_action")}
+
+    if inspect.iscoroutinefunction(node):
+        async def async_traced(state):
+            with span("node", name) as attrs:
+                result = await node(state)
+                attrs.update(attributes(result))
+            return result
+        async_traced.__name__ = node.__name__
+        return async_traced
+
+    def traced(state):
+        with span("node", name) as attrs:
+            result = node(state)
+            attrs.update(attributes(result))
+        return result
+    traced.__name__ = node.__name__
+    return traced
+
+
+class LLMTelemetry(BaseCallbackHandler):
+    """Callback recording each chat model call's wall time and token usage as an "llm" span."""
+
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[Any, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, serialized, kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or (serialized or {}).get("name") or "llm"
+        with self._lock:
+            self._started[run_id] = (time.perf_counter(), model)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id=None, **kwargs):
+        self._start(run_id, serialized, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id=None, **kwargs):
+        self._start(run_id, serialized, kwargs)
+
+    @staticmethod
+    def usage(response) -> Tuple[Optional[int], Optional[int]]:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            return usage.get("prompt_tokens"), usage.get("completion_tokens")
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if metadata:
+                    return metadata.get("input_tokens"), metadata.get("output_tokens")
+        return None, None
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is None or not telemetry_enabled():
+            return
+        start, model = started
+        prompt_tokens, completion_tokens = self.usage(response)
+        for kind, tokens in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+            if tokens is not None:
+                metrics.observe("agent_llm_tokens", tokens, TOKEN_BUCKETS, model=model, type=kind)
+        record("llm", model, time.perf_counter() - start, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def on_llm_error(self, error, *, run_id=None, **kwargs):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is not None and telemetry_enabled():
+            record("llm", started[1], time.perf_counter() - started[0], error=type(error).__name__)
+
+
+llm_telemetry = LLMTelemetry()
@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.config import Config
+
+_current_budget: ContextVar[Optional["TurnBudget"]] = ContextVar("turn_budget", default=None)
+
+
+class TurnBudget(BaseCallbackHandler):
+    """
+    Per-turn budget of LLM calls and wall-clock seconds. Registered as a callback on the graph run
+    so every chat model call made by any node is counted, and exposed through a context variable
+    so nodes can check what is left before starting an expensive step.
+    """
+
+    run_inline = True
+
+    def __init__(self, max_llm_calls: int = None, max_seconds: float = None):
+        self.max_llm_calls = int(os.environ.get('TURN_MAX_LLM_CALLS', max_llm_calls or Config.TURN_MAX_LLM_CALLS))
+        self.max_seconds = float(os.environ.get('TURN_MAX_SECONDS', max_seconds or Config.TURN_MAX_SECONDS))
+        self.started_at = time.monotonic()
+        self.llm_calls = 0
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        with self._lock:
+            self.llm_calls += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        with self._lock:
+            self.llm_calls += 1
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def time_left(self) -> float:
+        return self.max_seconds - self.elapsed()
+
+    def allows_llm_calls(self, count: int = 1) -> bool:
+        return self.llm_calls + count <= self.max_llm_calls and self.time_left() > 0
+
+    def summary(self) -> str:
+        return f"{self.llm_calls}/{self.max_llm_calls} LLM calls, {self.elapsed():.1f}/{self.max_seconds:.0f}s"
+
+
+def get_turn_budget() -> Optional[TurnBudget]:
+    """Returns the budget of the turn being executed, or None when the turn is unbudgeted."""
+    return _current_budget.get()
+
+
+def llm_call_allowed(count: int = 1) -> bool:
+    budget = get_turn_budget()
+    return budget is None or budget.allows_llm_calls(count)
+
+
+def deadline_passed() -> bool:
+    budget = get_turn_budget()
+    return budget is not None and budget.time_left() <= 0
+
+
+@contextmanager
+def active_budget(budget: Optional[TurnBudget]):
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)